@@ -8,8 +8,9 @@ import lazy_loader as lazy
 
 __getattr__, __dir__, __all__ = lazy.attach(
     __name__,
-    submodules=['get_armfiles', 'get_cropscape', 'get_airnow', 'get_noaa_psl', 'get_neon', 'get_surfrad'],
+    submodules=['cache', 'get_arm', 'get_armfiles', 'get_cropscape', 'get_airnow', 'get_noaa_psl', 'get_neon', 'get_surfrad'],
     submod_attrs={
+        'cache': ['clear_download_cache', 'set_download_cache'],
         'get_arm': ['download_arm_data'],
         'get_armfiles': ['download_data', 'download_arm_data', 'get_arm_doi'],
         'get_asos': ['get_asos'],
@@ -0,0 +1,398 @@
+"""
+This module contains a local download cache shared by the act.discovery
+fetchers. Downloads are stored once by the SHA-256 hash of their content and
+looked up by the URL or query they were fetched with, so the same file or
+query result fetched by another job on the node is read from disk.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.request import urlopen
+
+try:
+    import fcntl
+
+    _FCNTL_AVAILABLE = True
+except ImportError:
+    _FCNTL_AVAILABLE = False
+
+# Seconds a cached download is used before it is fetched again
+DOWNLOAD_CACHE_TTL = 86400
+# Cache settings used by the act.discovery fetchers
+_CACHE_CONFIG = {
+    'cache_dir': os.environ.get('ACT_CACHE_DIR'),
+    'ttl': DOWNLOAD_CACHE_TTL,
+    'max_size': None,
+    'offline': os.environ.get('ACT_OFFLINE', '').lower() in ['1', 'true', 'yes'],
+}
+# Locks for threads of this process, file locks only exclude other processes
+_THREAD_LOCKS = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def set_download_cache(cache_dir=None, ttl=DOWNLOAD_CACHE_TTL, max_size=None, offline=False):
+    """
+    Sets the download cache used by the act.discovery fetchers. The default
+    cache directory is read from the ACT_CACHE_DIR environment variable and
+    offline mode is set if the ACT_OFFLINE environment variable is 1 or true.
+
+    Parameters
+    ----------
+    cache_dir : str, pathlib.Path or None
+        Directory to store cached downloads. Will be created if it does not
+        exist. Can be shared by processes on the same node. If None downloads
+        are not cached. ARM Live downloads are cached by user name, not token,
+        and any user able to read the directory can read the cached files, so
+        do not share the directory with users without the same data access.
+    ttl : int, float or None
+        Number of seconds a cached download is used before it is fetched
+        again. If None cached downloads do not expire.
+    max_size : int or None
+        Maximum number of bytes of downloads kept in the cache. The least
+        recently used downloads are removed when the cache is larger. If None
+        the cache size is not limited.
+    offline : bool
+        If true, downloads are only read from the cache and a FileNotFoundError
+        is raised for downloads not in the cache.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        act.discovery.set_download_cache('/scratch/act_cache', max_size=50e9)
+        files = act.discovery.download_surfrad('tbl', startdate='20230601')
+
+    """
+    if offline and cache_dir is None:
+        raise ValueError('A cache_dir must be set to use offline mode.')
+
+    _CACHE_CONFIG['cache_dir'] = None if cache_dir is None else str(cache_dir)
+    _CACHE_CONFIG['ttl'] = ttl
+    _CACHE_CONFIG['max_size'] = None if max_size is None else int(max_size)
+    _CACHE_CONFIG['offline'] = offline
+
+
+def clear_download_cache():
+    """
+    Removes all downloads from the cache directory set with set_download_cache.
+
+    """
+    cache_dir = _CACHE_CONFIG['cache_dir']
+    if cache_dir is None:
+        return
+
+    with _lock(Path(cache_dir, 'cache.lock')):
+        for name in ['keys', 'objects', 'tmp']:
+            shutil.rmtree(Path(cache_dir, name), ignore_errors=True)
+
+
+def fetch_bytes(url, key=None, timeout=None, validate=None):
+    """
+    Returns the content of a url from the download cache, downloading it if
+    not cached or expired.
+
+    Parameters
+    ----------
+    url : str
+        URL to download.
+    key : str or None
+        Cache key of the content. Set to a key without credentials or
+        signatures when the URL has them. If None the URL is used.
+    timeout : float or None
+        Seconds to wait for the server.
+    validate : callable or None
+        Function called with the downloaded bytes. If it returns False the
+        content is returned but not cached.
+
+    Returns
+    -------
+    data : bytes
+        Content of the url.
+
+    """
+    if _CACHE_CONFIG['cache_dir'] is None:
+        return _read_url(url, timeout=timeout)
+
+    def download(url, temp_file):
+        data = _read_url(url, timeout=timeout)
+        if validate is not None and validate(data) is False:
+            result.append(data)
+            return
+        with open(temp_file, 'wb') as fh:
+            fh.write(data)
+
+    key = key if key is not None else url
+    for _ in range(2):
+        result = []
+        path = _cached_path(url, key, download)
+        if path is None:
+            return result[0]
+        try:
+            with open(path, 'rb') as fh:
+                return fh.read()
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the read
+            continue
+
+    raise FileNotFoundError(f'Cached download of {key} was removed while reading.')
+
+
+def fetch_file(url, output_file, key=None, download=None, timeout=None):
+    """
+    Writes the content of a url to output_file from the download cache,
+    downloading it if not cached or expired.
+
+    Parameters
+    ----------
+    url : str
+        URL to download.
+    output_file : str or pathlib.Path
+        Name of file to write.
+    key : str or None
+        Cache key of the content. Set to a key without credentials or
+        signatures when the URL has them. If None the URL is used.
+    download : callable or None
+        Function called with the url and a file name to download the url to
+        the file. If the file is not written nothing is cached and None is
+        returned. If None the url is streamed to the file.
+    timeout : float or None
+        Seconds to wait for the server.
+
+    Returns
+    -------
+    output_file : str or None
+        Name of the file written, or None if the download did not write a file.
+
+    """
+    output_file = str(output_file)
+    if download is None:
+        def download(url, temp_file):
+            _stream_url(url, temp_file, timeout=timeout)
+
+    if _CACHE_CONFIG['cache_dir'] is None:
+        part_file = output_file + '.part'
+        download(url, part_file)
+        if not os.path.isfile(part_file):
+            return None
+        os.replace(part_file, output_file)
+        return output_file
+
+    key = key if key is not None else url
+    for _ in range(2):
+        path = _cached_path(url, key, download)
+        if path is None:
+            return None
+        try:
+            if os.path.isfile(output_file) and os.path.getsize(output_file) == os.path.getsize(path):
+                return output_file
+            temp_file = output_file + '.part'
+            shutil.copyfile(path, temp_file)
+            os.replace(temp_file, output_file)
+            return output_file
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the copy
+            continue
+
+    raise FileNotFoundError(f'Cached download of {key} was removed while reading.')
+
+
+def _cached_path(url, key, download):
+    """
+    Returns the path of the cached content of key, calling download(url, temp_file)
+    under a lock on the key if the content is not cached or expired. Returns None
+    if download did not write the temporary file.
+
+    """
+    cache_dir = Path(_CACHE_CONFIG['cache_dir'])
+    key_hash = hashlib.sha256(key.encode()).hexdigest()
+    key_file = cache_dir / 'keys' / (key_hash + '.json')
+
+    entry = _read_entry(cache_dir, key_file)
+    if entry is not None and (_CACHE_CONFIG['offline'] or not _expired(entry)):
+        return entry['path']
+    if _CACHE_CONFIG['offline']:
+        raise FileNotFoundError(f'{key} is not in the download cache {cache_dir} with offline set.')
+
+    with _lock(cache_dir / 'locks' / (key_hash + '.lock')):
+        # Another process may have downloaded the key while waiting for the lock
+        entry = _read_entry(cache_dir, key_file)
+        if entry is not None and not _expired(entry):
+            return entry['path']
+
+        # The temporary file is named by the key, which is locked. A file left by
+        # an interrupted download may be partial so is removed, downloads that
+        # write to temp_file + '.part' and rename it when complete can resume
+        # the .part file on the next attempt.
+        temp_dir = cache_dir / 'tmp'
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = str(temp_dir / key_hash)
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+        try:
+            download(url, temp_file)
+        except OSError as error:
+            if entry is None:
+                raise
+            warnings.warn(f'Unable to download {key}, using cached download: {error}', UserWarning)
+            return entry['path']
+        if not os.path.isfile(temp_file):
+            return None
+
+        path, size = _store_object(cache_dir, temp_file)
+        key_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_key_file = str(key_file) + '.' + uuid.uuid4().hex + '.tmp'
+        with open(temp_key_file, 'w') as fh:
+            json.dump({'object': Path(path).name, 'size': size, 'fetched': time.time()}, fh)
+        os.replace(temp_key_file, key_file)
+
+    _evict(cache_dir, keep=key_file)
+
+    return path
+
+
+def _read_entry(cache_dir, key_file):
+    """
+    Returns the cache entry of a key file with the path of its content, or None
+    if the key or its content is not cached. Marks the entry as recently used.
+
+    """
+    try:
+        with open(key_file) as fh:
+            entry = json.load(fh)
+        path = str(cache_dir / 'objects' / entry['object'][:2] / entry['object'])
+        if not os.path.isfile(path):
+            return None
+        os.utime(key_file)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    entry['path'] = path
+
+    return entry
+
+
+def _expired(entry):
+    """
+    Returns True if a cache entry is older than the cache ttl.
+
+    """
+    ttl = _CACHE_CONFIG['ttl']
+
+    return ttl is not None and time.time() - entry['fetched'] >= ttl
+
+
+def _store_object(cache_dir, temp_file):
+    """
+    Moves a downloaded file into the content addressed store and returns its
+    path and size. Content already stored is kept and the file is removed.
+
+    """
+    sha256 = hashlib.sha256()
+    with open(temp_file, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1048576), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+
+    path = cache_dir / 'objects' / digest[:2] / digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    size = os.path.getsize(temp_file)
+    if path.is_file():
+        os.remove(temp_file)
+    else:
+        os.replace(temp_file, path)
+
+    return str(path), size
+
+
+def _evict(cache_dir, keep=None):
+    """
+    Removes the least recently used keys, except keep, until the content of the
+    remaining keys is not larger than the cache max_size. Content is removed
+    with its last key.
+
+    """
+    max_size = _CACHE_CONFIG['max_size']
+    if max_size is None:
+        return
+
+    with _lock(cache_dir / 'cache.lock'):
+        entries = []
+        for key_file in (cache_dir / 'keys').glob('*.json'):
+            try:
+                with open(key_file) as fh:
+                    entry = json.load(fh)
+                entries.append((key_file.stat().st_mtime, key_file, entry['object'], entry['size']))
+            except (OSError, ValueError, KeyError):
+                continue
+
+        entries.sort(key=lambda entry: entry[0])
+        sizes = {entry[2]: entry[3] for entry in entries}
+        references = {}
+        for entry in entries:
+            references[entry[2]] = references.get(entry[2], 0) + 1
+
+        total_size = sum(sizes.values())
+        for _, key_file, digest, _ in entries:
+            if total_size <= max_size:
+                break
+            if key_file == keep:
+                continue
+            key_file.unlink(missing_ok=True)
+            references[digest] -= 1
+            if references[digest] == 0:
+                Path(cache_dir, 'objects', digest[:2], digest).unlink(missing_ok=True)
+                total_size -= sizes[digest]
+
+
+@contextmanager
+def _lock(lock_file):
+    """
+    Context manager holding an exclusive lock on lock_file for the threads of
+    this process and, where fcntl is available, for other processes.
+
+    """
+    lock_file = str(lock_file)
+    with _THREAD_LOCKS_LOCK:
+        thread_lock = _THREAD_LOCKS.setdefault(lock_file, threading.Lock())
+
+    with thread_lock:
+        if not _FCNTL_AVAILABLE:
+            yield
+            return
+
+        Path(lock_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_file, 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read_url(url, timeout=None):
+    """
+    Returns the content of a url.
+
+    """
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    with urlopen(url, **kwargs) as response:
+        return response.read()
+
+
+def _stream_url(url, output_file, timeout=None):
+    """
+    Streams the content of a url to output_file.
+
+    """
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    with urlopen(url, **kwargs) as response, open(output_file, 'wb') as fh:
+        shutil.copyfileobj(response, fh, 1048576)
@@ -7,23 +7,31 @@ import argparse
 import json
 import os
 import sys
+import threading
+import time as timer
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 import requests
 import textwrap
 import warnings
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib import urlopen
-
+from act.discovery.cache import _CACHE_CONFIG, fetch_bytes, fetch_file
 from act.utils import date_parser
 
+# Base URL of the ARM Live Data Webservice
+_LIVE_DATA_URL = 'https://adc.arm.gov/armlive/livedata/'
+# Body returned instead of a file that is not on disk at the archive
+_NOT_AVAILABLE_MESSAGE = b'This data file is not available'
+
 
-def download_arm_data(username, token, datastream, startdate, enddate, time=None, output=None):
+def download_arm_data(username, token, datastream, startdate, enddate, time=None, output=None,
+                      num_workers=4, retries=3, backoff=1.0, timeout=60, progress=True):
     """
     This tool will help users utilize the ARM Live Data Webservice to download
-    ARM data.
+    ARM data. Files are downloaded concurrently and streamed to a .part file
+    that is renamed when complete, so an interrupted download is resumed where
+    it stopped. Files already downloaded with the same size as on the archive
+    are not downloaded again.
 
     Parameters
     ----------
@@ -50,11 +58,25 @@ def download_arm_data(username, token, datastream, startdate, enddate, time=None
         The output directory for the data. Set to None to make a folder in the
         current working directory with the same name as *datastream* to place
         the files in.
+    num_workers : int
+        Number of files to download at the same time.
+    retries : int
+        Number of times to retry a download after a connection error or server
+        error before giving up on the file.
+    backoff : float
+        Seconds to wait before the first retry. The wait is doubled for each
+        following retry.
+    timeout : float
+        Seconds to wait for the server to respond or send data.
+    progress : boolean
+        Option to print each file downloaded and a summary of the number of
+        files, bytes and throughput.
 
     Returns
     -------
     files : list
-        Returns list of files retrieved
+        Returns list of files retrieved. Files skipped because they were
+        already downloaded are included.
 
     Notes
     -----
@@ -110,12 +132,15 @@ def download_arm_data(username, token, datastream, startdate, enddate, time=None
         end = f'&end={end}'
     # build the url to query the web service using the arguments provided
     query_url = (
-        'https://adc.arm.gov/armlive/livedata/query?' + 'user={0}&ds={1}{2}{3}&wt=json'
+        _LIVE_DATA_URL + 'query?' + 'user={0}&ds={1}{2}{3}&wt=json'
     ).format(':'.join([username, token]), datastream, start, end)
 
     # get url response, read the body of the message,
-    # and decode from bytes type to utf-8 string
-    response_body = urlopen(query_url).read().decode('utf-8')
+    # and decode from bytes type to utf-8 string. The
+    # query is cached by user without the token.
+    query_key = (_LIVE_DATA_URL + 'query?' + 'user={0}&ds={1}{2}{3}&wt=json').format(
+        username, datastream, start, end)
+    response_body = fetch_bytes(query_url, key=query_key).decode('utf-8')
     # if the response is an html doc, then there was an error with the user
     if response_body[1:14] == '!DOCTYPE html':
         raise ConnectionRefusedError('Error with user. Check username or token.')
@@ -140,28 +165,39 @@ def download_arm_data(username, token, datastream, startdate, enddate, time=None
     num_files = len(response_body_json['files'])
     file_names = []
     if response_body_json['status'] == 'success' and num_files > 0:
-        for fname in response_body_json['files']:
-            if time is not None:
-                if time not in fname:
-                    continue
-            # construct link to web service saveData function
-            save_data_url = (
-                'https://adc.arm.gov/armlive/livedata/' + 'saveData?user={0}&file={1}'
-            ).format(':'.join([username, token]), fname)
-            output_file = os.path.join(output_dir, fname)
-            # make directory if it doesn't exist
-            if not os.path.isdir(output_dir):
-                os.makedirs(output_dir)
-            # create file and write bytes to file
-            with open(output_file, 'wb') as open_bytes_file:
-                data = urlopen(save_data_url).read()
-                if 'This data file is not available' in str(data):
-                    print(fname + ' is not available for download')
-                    continue
-                else:
-                    print(f'[DOWNLOADING] {fname}')
-                    open_bytes_file.write(data)
-            file_names.append(output_file)
+        # Remove files listed more than once, keeping the order
+        fnames = list(dict.fromkeys(response_body_json['files']))
+        if time is not None:
+            fnames = [fname for fname in fnames if time in fname]
+        # make directory if it doesn't exist
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        # construct links to web service saveData function
+        save_data_urls = [
+            (_LIVE_DATA_URL + 'saveData?user={0}&file={1}').format(':'.join([username, token]), fname)
+            for fname in fnames
+        ]
+        output_files = [os.path.join(output_dir, fname) for fname in fnames]
+        # Files are cached by user without the token so restricted files are not
+        # read from the cache by other users
+        cache_keys = [(_LIVE_DATA_URL + 'saveData?user={0}&file={1}').format(username, fname)
+                      for fname in fnames]
+        results = _download_files(
+            save_data_urls, output_files, cache_keys=cache_keys, num_workers=num_workers,
+            retries=retries, backoff=backoff, timeout=timeout, progress=progress)
+
+        failed = []
+        for fname, output_file, (status, _) in zip(fnames, output_files, results):
+            if status == 'unavailable':
+                print(fname + ' is not available for download')
+            elif status == 'failed':
+                failed.append(fname)
+            else:
+                file_names.append(output_file)
+        if len(failed) > 0:
+            warnings.warn(f'Files could not be downloaded: {failed}', RuntimeWarning)
+
         # Get ARM DOI and print it out
         doi = get_arm_doi(datastream, start_datetime.strftime('%Y-%m-%d'), end_datetime.strftime('%Y-%m-%d'))
         print('\nIf you use these data to prepare a publication, please cite:\n')
@@ -175,6 +211,131 @@ def download_arm_data(username, token, datastream, startdate, enddate, time=None
     return file_names
 
 
+def _download_files(urls, output_files, cache_keys=None, num_workers=4, retries=3, backoff=1.0,
+                    timeout=60, progress=True):
+    """
+    Downloads urls to output_files with a pool of num_workers threads, each
+    reusing the connections of its own requests.Session. If the download cache
+    is set the files are read from and added to the cache with cache_keys.
+    Returns list of (status, number of bytes downloaded) in the order of urls
+    where status is 'downloaded', 'cached', 'skipped', 'unavailable' or 'failed'.
+
+    """
+    local = threading.local()
+    if cache_keys is None or _CACHE_CONFIG['cache_dir'] is None:
+        cache_keys = [None] * len(urls)
+
+    def download(url, output_file, cache_key):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        for attempt in range(retries + 1):
+            try:
+                if cache_key is None:
+                    return _download_file(local.session, url, output_file, timeout=timeout,
+                                          progress=progress)
+
+                result = ['cached', 0]
+
+                def fetch(url, temp_file):
+                    result[:] = _download_file(local.session, url, temp_file, timeout=timeout,
+                                               progress=progress)
+
+                if fetch_file(url, output_file, key=cache_key, download=fetch) is None:
+                    return 'unavailable', 0
+                return tuple(result)
+            except requests.HTTPError as err:
+                # Client errors are not resolved by retrying
+                error = err
+                break
+            except FileNotFoundError as err:
+                # Not in the download cache with offline set
+                error = err
+                break
+            except (requests.RequestException, OSError) as err:
+                error = err
+                if attempt < retries:
+                    timer.sleep(backoff * 2 ** attempt)
+
+        if progress:
+            print(f'[FAILED] {os.path.basename(output_file)}: {error}')
+        return 'failed', 0
+
+    start = timer.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+        results = list(executor.map(download, urls, output_files, cache_keys))
+
+    if progress:
+        elapsed = timer.perf_counter() - start
+        num_bytes = sum(result[1] for result in results)
+        num_downloaded = sum(result[0] == 'downloaded' for result in results)
+        num_skipped = sum(result[0] == 'skipped' for result in results)
+        num_cached = sum(result[0] == 'cached' for result in results)
+        print(f'[DOWNLOADED] {num_downloaded} files, {num_bytes / 1e6:.1f} MB in {elapsed:.1f} s '
+              f'({num_bytes / 1e6 / max(elapsed, 1e-6):.2f} MB/s), '
+              f'{num_skipped} files already downloaded, {num_cached} files from cache')
+
+    return results
+
+
+def _download_file(session, url, output_file, timeout=60, progress=True, chunk_size=65536):
+    """
+    Streams url to output_file + '.part' and renames it to output_file when
+    complete. A .part file left by an interrupted download is resumed with a
+    range request. Returns tuple of status and number of bytes downloaded.
+
+    """
+    # Check the size of a file already downloaded without requesting the data
+    if os.path.isfile(output_file):
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        size = response.headers.get('Content-Length')
+        if response.status_code == 200 and size is not None and \
+                os.path.getsize(output_file) == int(size):
+            return 'skipped', 0
+
+    part_file = output_file + '.part'
+    offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        # The .part file is complete or no longer matches the file on the archive
+        if response.status_code == 416:
+            os.remove(part_file)
+            raise requests.RequestException(f'Range not satisfiable for {url}')
+        if response.status_code >= 500:
+            raise requests.RequestException(f'Server error {response.status_code} for {url}')
+        response.raise_for_status()
+
+        if response.status_code != 206:
+            offset = 0
+            size = response.headers.get('Content-Length')
+            if size is not None and os.path.isfile(output_file) and \
+                    os.path.getsize(output_file) == int(size):
+                return 'skipped', 0
+
+        chunks = response.iter_content(chunk_size=chunk_size)
+        first_chunk = next(chunks, b'')
+        if offset == 0 and _NOT_AVAILABLE_MESSAGE in first_chunk:
+            return 'unavailable', 0
+
+        if progress:
+            print(f'[DOWNLOADING] {os.path.basename(output_file)}')
+        num_bytes = len(first_chunk)
+        with open(part_file, 'ab' if offset > 0 else 'wb') as open_bytes_file:
+            open_bytes_file.write(first_chunk)
+            for chunk in chunks:
+                open_bytes_file.write(chunk)
+                num_bytes += len(chunk)
+
+        # Keep the .part file to resume if the connection closed early
+        size = response.headers.get('Content-Length')
+        if size is not None and num_bytes < int(size):
+            raise requests.RequestException(f'Incomplete download of {url}')
+
+    os.replace(part_file, output_file)
+
+    return 'downloaded', num_bytes
+
+
 def get_arm_doi(datastream, startdate, enddate):
     """
     This function will return a citation with DOI, if available, for specified
@@ -201,12 +362,14 @@ def get_arm_doi(datastream, startdate, enddate):
     doi_url += '&startDate=' + startdate
     doi_url += '&endDate=' + enddate
     try:
-        doi = requests.get(url=doi_url)
+        doi = fetch_bytes(doi_url).decode('utf-8')
     except ValueError as err:
-        return "Webservice potentially down or arguments are not valid: " + err
+        return "Webservice potentially down or arguments are not valid: " + str(err)
+    except FileNotFoundError:
+        return 'DOI not found in the download cache with offline set'
 
-    if len(doi.text) > 0:
-        doi = doi.json()['citation']
+    if len(doi) > 0:
+        doi = json.loads(doi)['citation']
     else:
         doi = 'Please check your arguments. No DOI Found'
 
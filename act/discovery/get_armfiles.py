@@ -3,24 +3,14 @@ Script for downloading data from ARM's Live Data Webservice
 
 """
 
-import argparse
-import json
-import os
-import sys
-from datetime import timedelta
 import requests
-import textwrap
 import warnings
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib import urlopen
+from act.discovery.get_arm import download_arm_data
 
-from act.utils import date_parser
 
-
-def download_data(username, token, datastream, startdate, enddate, time=None, output=None):
+def download_data(username, token, datastream, startdate, enddate, time=None, output=None,
+                  **kwargs):
     """
     This tool will help users utilize the ARM Live Data Webservice to download
     ARM data.
@@ -50,6 +40,9 @@ def download_data(username, token, datastream, startdate, enddate, time=None, ou
         The output directory for the data. Set to None to make a folder in the
         current working directory with the same name as *datastream* to place
         the files in.
+    **kwargs : keywords
+        Keywords to pass through to act.discovery.get_arm.download_arm_data()
+        to set the number of concurrent downloads, retries and progress output.
 
     Returns
     -------
@@ -96,86 +89,8 @@ def download_data(username, token, datastream, startdate, enddate, time=None, ou
     message = 'act.discovery.get_armfiles.download_data will be retired in version 2.0.0.  Please use act.discovery.get_arm.download_arm_data instead.'
     warnings.warn(message, DeprecationWarning, 2)
 
-    # default start and end are empty
-    start, end = '', ''
-    # start and end strings for query_url are constructed
-    # if the arguments were provided
-    if startdate:
-        start_datetime = date_parser(startdate, return_datetime=True)
-        start = start_datetime.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-        start = f'&start={start}'
-    if enddate:
-        end_datetime = date_parser(enddate, return_datetime=True)
-        # If the start and end date are the same, and a day to the end date
-        if start_datetime == end_datetime:
-            end_datetime += timedelta(hours=23, minutes=59, seconds=59)
-        end = end_datetime.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-        end = f'&end={end}'
-    # build the url to query the web service using the arguments provided
-    query_url = (
-        'https://adc.arm.gov/armlive/livedata/query?' + 'user={0}&ds={1}{2}{3}&wt=json'
-    ).format(':'.join([username, token]), datastream, start, end)
-
-    # get url response, read the body of the message,
-    # and decode from bytes type to utf-8 string
-    response_body = urlopen(query_url).read().decode('utf-8')
-    # if the response is an html doc, then there was an error with the user
-    if response_body[1:14] == '!DOCTYPE html':
-        raise ConnectionRefusedError('Error with user. Check username or token.')
-
-    # parse into json object
-    response_body_json = json.loads(response_body)
-
-    # construct output directory
-    if output:
-        # output files to directory specified
-        output_dir = os.path.join(output)
-    else:
-        # if no folder given, add datastream folder
-        # to current working dir to prevent file mix-up
-        output_dir = os.path.join(os.getcwd(), datastream)
-
-    # not testing, response is successful and files were returned
-    if response_body_json is None:
-        print('ARM Data Live Webservice does not appear to be functioning')
-        return []
-
-    num_files = len(response_body_json['files'])
-    file_names = []
-    if response_body_json['status'] == 'success' and num_files > 0:
-        for fname in response_body_json['files']:
-            if time is not None:
-                if time not in fname:
-                    continue
-            # construct link to web service saveData function
-            save_data_url = (
-                'https://adc.arm.gov/armlive/livedata/' + 'saveData?user={0}&file={1}'
-            ).format(':'.join([username, token]), fname)
-            output_file = os.path.join(output_dir, fname)
-            # make directory if it doesn't exist
-            if not os.path.isdir(output_dir):
-                os.makedirs(output_dir)
-            # create file and write bytes to file
-            with open(output_file, 'wb') as open_bytes_file:
-                data = urlopen(save_data_url).read()
-                if 'This data file is not available' in str(data):
-                    print(fname + ' is not available for download')
-                    continue
-                else:
-                    print(f'[DOWNLOADING] {fname}')
-                    open_bytes_file.write(data)
-            file_names.append(output_file)
-        # Get ARM DOI and print it out
-        doi = get_arm_doi(datastream, start_datetime.strftime('%Y-%m-%d'), end_datetime.strftime('%Y-%m-%d'))
-        print('\nIf you use these data to prepare a publication, please cite:\n')
-        print(textwrap.fill(doi, width=80))
-        print('')
-    else:
-        print(
-            'No files returned or url status error.\n' 'Check datastream name, start, and end date.'
-        )
-
-    return file_names
+    return download_arm_data(username, token, datastream, startdate, enddate, time=time,
+                             output=output, **kwargs)
 
 
 def get_arm_doi(datastream, startdate, enddate):
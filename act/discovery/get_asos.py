@@ -13,10 +13,7 @@ import pandas as pd
 import xarray as xr
 from six import StringIO
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib2 import urlopen
+from act.discovery.cache import fetch_bytes
 
 
 def get_asos(time_window, lat_range=None, lon_range=None, station=None):
@@ -92,8 +89,7 @@ def get_asos(time_window, lat_range=None, lon_range=None, station=None):
         for network in networks:
             # Get metadata
             uri = ('https://mesonet.agron.iastate.edu/' 'geojson/network/%s.geojson') % (network,)
-            data = urlopen(uri)
-            jdict = json.load(data)
+            jdict = json.loads(fetch_bytes(uri))
             for site in jdict['features']:
                 lat = site['geometry']['coordinates'][1]
                 lon = site['geometry']['coordinates'][0]
@@ -113,8 +109,7 @@ def get_asos(time_window, lat_range=None, lon_range=None, station=None):
         for network in networks:
             # Get metadata
             uri = ('https://mesonet.agron.iastate.edu/' 'geojson/network/%s.geojson') % (network,)
-            data = urlopen(uri)
-            jdict = json.load(data)
+            jdict = json.loads(fetch_bytes(uri))
             for site in jdict['features']:
                 lat = site['geometry']['coordinates'][1]
                 lon = site['geometry']['coordinates'][0]
@@ -272,9 +267,13 @@ def _download_data(uri):
     attempt = 0
     while attempt < 6:
         try:
-            data = urlopen(uri, timeout=300).read().decode('utf-8')
+            data = fetch_bytes(uri, timeout=300, validate=lambda data: not data.startswith(b'ERROR'))
+            data = data.decode('utf-8')
             if data is not None and not data.startswith('ERROR'):
                 return data
+        except FileNotFoundError:
+            # Not in the download cache with offline set
+            raise
         except Exception as exp:
             print(f'download_data({uri}) failed with {exp}')
             time.sleep(5)
@@ -7,12 +7,14 @@ https://www.neonscience.org/field-sites/explore-field-sites
 
 """
 
+import functools
 import json
 import requests
 import os
-import shutil
 import pandas as pd
 
+from act.discovery.cache import _CACHE_CONFIG, _read_url, _stream_url, fetch_bytes, fetch_file
+
 
 def get_site_products(site_code, print_to_screen=False):
     """
@@ -144,8 +146,21 @@ def download_neon_data(site_code, product_code, start_date, end_date=None, outpu
     files = []
     for date in date_range:
         # Make Request
-        data_request = requests.get(server + 'data/' + product_code + '/' + site_code + '/' + date)
-        data_json = data_request.json()
+        data_url = server + 'data/' + product_code + '/' + site_code + '/' + date
+        data_json = json.loads(fetch_bytes(data_url))
+
+        # The file urls in the listing are signed and expire before the cached
+        # listing, so the listing is fetched again for current urls when a file
+        # is not in the download cache.
+        current_urls = {}
+        if _CACHE_CONFIG['cache_dir'] is None:
+            current_urls.update({ii['name']: ii['url'] for ii in data_json['data']['files']})
+
+        def download(url, temp_file, name=None):
+            if len(current_urls) == 0:
+                current_json = json.loads(_read_url(data_url))
+                current_urls.update({ii['name']: ii['url'] for ii in current_json['data']['files']})
+            _stream_url(current_urls.get(name, url), temp_file)
 
         if output_dir is None:
             output_dir = os.path.join(os.getcwd(), site_code + '_' + product_code)
@@ -155,9 +170,9 @@ def download_neon_data(site_code, product_code, start_date, end_date=None, outpu
         for file in data_json['data']['files']:
             print('[DOWNLOADING] ', file['name'])
             output_filename = os.path.join(output_dir, file['name'])
-            with requests.get(file['url'], stream=True) as r:
-                with open(output_filename, 'wb') as f:
-                    shutil.copyfileobj(r.raw, f)
-                    files.append(output_filename)
+            # File urls are signed so the files are cached by name
+            fetch_file(file['url'], output_filename, key=data_url + '/' + file['name'],
+                       download=functools.partial(download, name=file['name']))
+            files.append(output_filename)
 
     return files
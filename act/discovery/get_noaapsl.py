@@ -4,14 +4,12 @@ Function for downloading data from NOAA PSL Profiler Network
 """
 import json
 from datetime import datetime
+from io import StringIO
 import pandas as pd
 import numpy as np
 import os
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib import urlopen
+from act.discovery.cache import fetch_bytes, fetch_file
 
 
 def download_noaa_psl_data(site=None, instrument=None, startdate=None, enddate=None,
@@ -147,7 +145,7 @@ def download_noaa_psl_data(site=None, instrument=None, startdate=None, enddate=N
 
         # User pandas to get a list of filenames to download
         # Exclude the first and last records which are "parent directory" and "nan"
-        files = pd.read_html(new_url, skiprows=[1])[0]['Name']
+        files = pd.read_html(StringIO(fetch_bytes(new_url).decode('utf-8')), skiprows=[1])[0]['Name']
         files = list(files[1:-1])
 
         # Write each file out to a file with same name as online
@@ -159,8 +157,7 @@ def download_noaa_psl_data(site=None, instrument=None, startdate=None, enddate=N
             output_file = os.path.join(output_dir, f)
             try:
                 print('Downloading ' + f)
-                with open(output_file, 'wb') as open_bytes_file:
-                    open_bytes_file.write(urlopen(new_url + f).read())
+                fetch_file(new_url + f, output_file)
                 filenames.append(output_file)
             except Exception:
                 pass
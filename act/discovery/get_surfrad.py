@@ -11,10 +11,7 @@ import os
 import re
 import requests
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib import urlopen
+from act.discovery.cache import fetch_file
 
 
 def download_surfrad(site=None, startdate=None, enddate=None, output=None):
@@ -105,8 +102,7 @@ def download_surfrad(site=None, startdate=None, enddate=None, output=None):
         output_file = os.path.join(output_dir, file)
         try:
             print('Downloading ' + file)
-            with open(output_file, 'wb') as open_bytes_file:
-                open_bytes_file.write(urlopen(new_url).read())
+            fetch_file(new_url, output_file)
             filenames.append(output_file)
         except Exception:
             pass
@@ -8,16 +8,20 @@ import lazy_loader as lazy
 __getattr__, __dir__, __all__ = lazy.attach(
     __name__,
 
-    submodules=['armfiles', 'csvfiles', 'icartt', 'mpl', 'neon', 'noaagml', 'noaapsl', 'pysp2'],
+    submodules=['armfiles', 'catalog', 'csvfiles', 'icartt', 'mpl', 'neon', 'noaagml', 'noaapsl', 'parquetfiles', 'pysp2', 'references', 'zarrfiles'],
     submod_attrs={
         'armfiles': [
             'WriteDataset',
             'check_arm_standards',
             'create_ds_from_arm_dod',
+            'prefetch_dods',
             'read_netcdf',
+            'iter_netcdf',
             'check_if_tar_gz_file',
+            'open_tar_gz_members',
             'read_mmcr',
         ],
+        'catalog': ['DatastreamCatalog'],
         'csvfiles': ['read_csv'],
         'icartt': ['read_icartt'],
         'mpl': ['proc_sigma_mplv5_read', 'read_sigma_mplv5'],
@@ -37,9 +41,12 @@ __getattr__, __dir__, __all__ = lazy.attach(
             'read_psl_parsivel',
             'read_psl_radar_fmcw_moment',
         ],
-        'pysp2': ['read_hk_file', 'read_sp2', 'read_sp2_dat'
+        'parquetfiles': ['read_parquet', 'write_parquet'],
+        'pysp2': ['read_hk_file', 'read_sp2', 'read_sp2_dat', 'read_sp2_mmap'
         ],
+        'references': ['create_reference_index', 'open_reference_index'],
         'sodar' : [
-            'read_mfas_sodar']
+            'read_mfas_sodar'],
+        'zarrfiles': ['read_zarr', 'write_zarr'],
     },
 )
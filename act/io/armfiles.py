@@ -4,10 +4,18 @@ Atmospheric Radiation Measurement program supported by the Department of Energy
 Office of Science.
 """
 
+import collections
+import contextlib
 import copy
+import functools
 import glob
+import gzip
+import hashlib
+import io
 import json
+import os
 import re
+import shutil
 import urllib
 import warnings
 from pathlib import Path, PosixPath
@@ -15,18 +23,35 @@ from netCDF4 import Dataset
 from os import PathLike
 import tarfile
 import tempfile
-import warnings
+import threading
+import time
 
-from cftime import num2date
+import dask
 import numpy as np
+import pandas as pd
 import xarray as xr
 import datetime as dt
+from xarray.backends import NetCDF4DataStore
+from xarray.backends.netCDF4_ import NETCDF4_PYTHON_LOCK, NetCDF4BackendEntrypoint
+from xarray.backends.store import StoreBackendEntrypoint
 
 import act
 import act.utils as utils
 from act.config import DEFAULT_DATASTREAM_NAME
+from act.utils.data_utils import DatastreamParserARM
 from act.utils.io_utils import unpack_tar, unpack_gzip, cleanup_files, is_gunzip_file
 
+try:
+    import fcntl
+
+    _FCNTL_AVAILABLE = True
+except ImportError:
+    _FCNTL_AVAILABLE = False
+
+# Regular expression matching ARM-standard filenames. The groups are the datastream
+# name, data level, date (YYYYMMDD), time (hhmmss) and file extension.
+ARM_FILENAME_REGEX = r'(^[a-zA-Z0-9]+)\.([0-9a-z]{2})\.([\d]{8})\.([\d]{6})\.([a-z]{2,3}$)'
+
 
 def read_netcdf(
     filenames,
@@ -39,6 +64,16 @@ def read_netcdf(
     combine_attrs='override',
     cleanup_qc=False,
     keep_variables=None,
+    start_time=None,
+    end_time=None,
+    catalog=None,
+    parallel=False,
+    num_workers=None,
+    scheduler='processes',
+    target_chunk_size=128 * 2**20,
+    schema_cache_file=None,
+    stream_tar=True,
+    reference_index=None,
     **kwargs,
 ):
     """
@@ -64,11 +99,13 @@ def read_netcdf(
         Appears the default is to do this anyway but need this option to allow correct usage
         of use_base_time.
     use_cftime : boolean
-        Option to use cftime library to parse the time units string and correctly
-        establish the time values with a units string containing timezone offset.
-        This is used because the Pandas units string parser does not correctly recognize
-        time zone offset. Code will automatically detect cftime object and convert to datetime64
-        in returned Dataset.
+        Option to correctly establish the time values with a units string containing
+        timezone offset. This is used because the Pandas units string parser does not
+        correctly recognize time zone offset. When set with decode_times, each file is
+        decoded with act.utils.datetime_utils.decode_time_values() directly to datetime64
+        using integer arithmetic. Variables with a non-standard calendar or units string
+        not recognized are decoded with the cftime library, and the code will automatically
+        detect cftime object and convert to datetime64 in returned Dataset.
     use_base_time : boolean
         Option to use ARM time variables base_time and time_offset. Useful when the time variable
         is not included (older files) or when the units attribute is incorrectly formatted. Will use
@@ -85,6 +122,53 @@ def read_netcdf(
         to exclude from reading and passing into open_mfdataset() via drop_variables keyword.
         Still allows use of drop_variables keyword for variables not listed in first file to
         read.
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Start of the time window to return. ARM-standard filenames are parsed for the file
+        start date and time, and files ending before start_time are removed from the list
+        before opening. The returned Dataset is trimmed to start_time.
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        End of the time window to return (inclusive). Files starting after end_time are
+        removed from the list before opening. The returned Dataset is trimmed to end_time.
+    catalog : act.io.catalog.DatastreamCatalog or None
+        File catalog to look up files in place of globbing. When set, filenames is the
+        datastream name to query (i.e. sgpmetE13.b1) and start_time and end_time are used
+        to select the files from the catalog.
+    parallel : boolean
+        Option to open and preprocess the files in parallel using a Dask
+        process or thread pool. See scheduler.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default, usually the number of cores.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'processes' or 'threads'.
+        With 'processes' the files are opened concurrently. The netCDF4 library is not
+        thread safe, so with 'threads' the netCDF4 files are opened and decoded one at
+        a time while holding the xarray netCDF4 lock, and only the preprocessing runs
+        concurrently. The scheduler is only used to open the files, set the scheduler
+        with dask.config.set() when computing the returned Dataset.
+    target_chunk_size : int
+        Target chunk size in bytes used when chunks='auto-time' is passed through kwargs.
+        The time chunk length is chosen from the variable shapes and data types in the
+        header of the first file, so the largest variable chunk is close to this size.
+        The chosen chunks are reported in the returned Dataset _chunk_plan attribute.
+    schema_cache_file : str, pathlib.Path or None
+        JSON file used to persist the header schema cache used with keep_variables.
+        See keep_variables_to_drop_variables().
+    stream_tar : boolean
+        Option to read the netCDF members of a TAR, TAR gunzip or gunzip file directly
+        from the archive without extracting to a temporary directory. Members of an
+        uncompressed TAR file are read in place. Members of a compressed file are
+        decompressed into memory up to a total size limit and into temporary files
+        after. When start_time or end_time is set only members with a filename date in
+        the time window are read. If the members can not be read from the archive the
+        archive is extracted to a temporary directory. An open tarfile.TarFile can be
+        passed as filenames to read members of an archive without reopening it.
+    reference_index : str, pathlib.Path, dict or None
+        Byte range reference index created with
+        act.io.references.create_reference_index(). When set the files in the index
+        are opened from the index without reading each file header and filenames is
+        not used, so can be None. start_time, end_time, keep_variables and drop_variables
+        select the files and variables to read.
     **kwargs : keywords
         Keywords to pass through to xarray.open_mfdataset().
 
@@ -108,9 +192,38 @@ def read_netcdf(
     message = 'act.io.armfiles.read_netcdf will be replaced in version 2.0.0 by act.io.arm.read_netcdf()'
     warnings.warn(message, DeprecationWarning, 2)
 
-
     ds = None
-    filenames, cleanup_temp_directory = check_if_tar_gz_file(filenames)
+    if catalog is not None:
+        filenames = catalog.query(filenames, start_time=start_time, end_time=end_time)
+
+    if reference_index is not None:
+        from act.io.references import load_reference_index, open_reference_index, reference_index_files
+        reference_index = load_reference_index(reference_index)
+        filenames = reference_index_files(reference_index)
+
+    # Read members of TAR and gunzip files from the archive if possible, else
+    # extract to a temporary directory.
+    member_names = None
+    member_files = []
+    cleanup_temp_directory = False
+    if stream_tar:
+        tar_members = open_tar_gz_members(
+            filenames, start_time=start_time, end_time=end_time, engine=kwargs.get('engine'))
+        if tar_members is not None:
+            member_names, filenames, kwargs['engine'], tar = tar_members
+            member_files = filenames + [tar]
+
+    if member_names is None:
+        if isinstance(filenames, tarfile.TarFile):
+            raise ValueError(
+                f'The members of {filenames.name} can not be read from the archive, '
+                'set stream_tar=False to extract the archive.')
+        filenames, cleanup_temp_directory = check_if_tar_gz_file(filenames)
+
+    # If a time window is requested remove files outside the window using the
+    # dates and times in the ARM-standard filenames before opening any file.
+    if catalog is None and member_names is None and (start_time is not None or end_time is not None):
+        filenames = filter_files_by_time(filenames, start_time=start_time, end_time=end_time)
 
     file_dates = []
     file_times = []
@@ -128,6 +241,22 @@ def read_netcdf(
     kwargs['concat_dim'] = concat_dim
     kwargs['decode_times'] = decode_times
     kwargs['use_cftime'] = use_cftime
+
+    # Decode the time variables of each file before combining using the ACT time
+    # decoder instead of converting to cftime objects and back to datetime64.
+    if decode_times and use_cftime:
+        kwargs['decode_times'] = False
+        kwargs['use_cftime'] = None
+        kwargs.setdefault('decode_timedelta', True)
+        kwargs['preprocess'] = functools.partial(
+            _decode_time_variables, preprocess=kwargs.get('preprocess'))
+
+    # Record the first time of each file while it is opened so file dates and
+    # times for non-ARM filenames do not need to be read from the combined Dataset.
+    file_start_times = {}
+    kwargs['preprocess'] = functools.partial(
+        _record_file_start_time, file_start_times=file_start_times,
+        preprocess=kwargs.get('preprocess'))
     if len(filenames) > 1 and not isinstance(filenames, str):
         kwargs['combine_attrs'] = combine_attrs
 
@@ -137,7 +266,23 @@ def read_netcdf(
         if 'drop_variables' in kwargs.keys():
             drop_variables = kwargs['drop_variables']
         kwargs['drop_variables'] = keep_variables_to_drop_variables(
-            filenames, keep_variables, drop_variables=drop_variables)
+            filenames, keep_variables, drop_variables=drop_variables,
+            schema_cache_file=schema_cache_file)
+
+    # Set the time chunk size from the first file header if requested
+    if kwargs.get('chunks') == 'auto-time':
+        kwargs['chunks'] = plan_time_chunks(
+            filenames, target_chunk_size=target_chunk_size,
+            drop_variables=kwargs.get('drop_variables'))
+
+    kwargs['parallel'] = parallel
+    dask_config = {}
+    if parallel:
+        dask_config['scheduler'] = scheduler
+        if num_workers is not None:
+            dask_config['num_workers'] = num_workers
+        if scheduler == 'threads' and kwargs.get('engine') in [None, 'netcdf4']:
+            kwargs['engine'] = _LockedNetCDF4BackendEntrypoint
 
     # Create an exception tuple to use with try statements. Doing it this way
     # so we can add the FileNotFoundError if requested. Can add more error
@@ -146,40 +291,61 @@ def read_netcdf(
     if return_None:
         except_tuple = except_tuple + (FileNotFoundError, OSError)
 
+    # Close the archive members if not read
     try:
-        # Read data file with Xarray function
-        ds = xr.open_mfdataset(filenames, **kwargs)
-
-    except except_tuple as exception:
-        # If requested return None for File not found error
-        if type(exception).__name__ == 'FileNotFoundError':
-            return None
+        try:
+            # Read data file with Xarray function
+            if reference_index is not None:
+                ds = open_reference_index(
+                    reference_index, start_time=start_time, end_time=end_time,
+                    drop_variables=kwargs.get('drop_variables'), decode_times=decode_times)
+                del ds.attrs['_files']
+            else:
+                with dask.config.set(dask_config):
+                    ds = xr.open_mfdataset(filenames, **kwargs)
+
+        except except_tuple as exception:
+            # If requested return None for File not found error
+            if type(exception).__name__ == 'FileNotFoundError':
+                ds = None
+
+            # If requested return None for File not found error
+            elif type(exception).__name__ == 'OSError' and exception.args[0] == 'no files to open':
+                ds = None
+
+            # Look at error message and see if could be nested error message. If so
+            # update combine keyword and try again. This should allow reading files
+            # without a time variable but base_time and time_offset variables.
+            elif (
+                kwargs['combine'] != 'nested'
+                and type(exception).__name__ == 'ValueError'
+                and exception.args[0] == 'Could not find any dimension coordinates '
+                'to use to order the datasets for concatenation'
+            ):
+                kwargs['combine'] = 'nested'
+                with dask.config.set(dask_config):
+                    ds = xr.open_mfdataset(filenames, **kwargs)
 
-        # If requested return None for File not found error
-        if type(exception).__name__ == 'OSError' and exception.args[0] == 'no files to open':
-            return None
+            else:
+                # When all else fails raise the orginal exception
+                raise exception
+    except BaseException:
+        _close_files(member_files)
+        raise
 
-        # Look at error message and see if could be nested error message. If so
-        # update combine keyword and try again. This should allow reading files
-        # without a time variable but base_time and time_offset variables.
-        if (
-            kwargs['combine'] != 'nested'
-            and type(exception).__name__ == 'ValueError'
-            and exception.args[0] == 'Could not find any dimension coordinates '
-            'to use to order the datasets for concatenation'
-        ):
-            kwargs['combine'] = 'nested'
-            ds = xr.open_mfdataset(filenames, **kwargs)
+    if ds is None:
+        _close_files(member_files)
+        return None
 
-        else:
-            # When all else fails raise the orginal exception
-            raise exception
+    # Close the archive members with the Dataset
+    if len(member_files) > 0:
+        ds.set_close(functools.partial(_close_files, [ds._close] + member_files))
 
     # If requested use base_time and time_offset to derive time. Assumes that the units
     # of both are in seconds and that the value is number of seconds since epoch.
     if use_base_time:
-        time = num2date(ds['base_time'].values + ds['time_offset'].values, ds['base_time'].attrs['units'])
-        time = time.astype('datetime64[ns]')
+        time = utils.datetime_utils.decode_time_values(
+            ds['base_time'].values + ds['time_offset'].values, ds['base_time'].attrs['units'])
 
         # Need to use a new Dataset creation to correctly index time for use with
         # .group and .resample methods in Xarray Datasets.
@@ -201,7 +367,13 @@ def read_netcdf(
     desired_time_precision = 'datetime64[ns]'
     for var_name in ['time', 'time_offset']:
         try:
-            if 'time' in ds.dims and type(ds[var_name].values[0]).__module__.startswith('cftime.'):
+            # Only object arrays can hold cftime values. Checking the dtype first
+            # keeps from computing the time values of lazy loaded files.
+            if (
+                'time' in ds.dims
+                and ds[var_name].dtype.kind == 'O'
+                and type(ds[var_name].values[0]).__module__.startswith('cftime.')
+            ):
                 # If we just convert time to datetime64 the group, sel, and other Xarray
                 # methods will not work correctly because time is not indexed. Need to
                 # use the formation of a Dataset to correctly set the time indexing.
@@ -233,6 +405,14 @@ def read_netcdf(
         except (KeyError, ValueError):
             pass
 
+    # Trim the boundary files to the requested time window
+    if (start_time is not None or end_time is not None) and 'time' in ds.dims:
+        ds = ds.sel(time=slice(_to_datetime64(start_time), _to_datetime64(end_time)))
+
+    # Use the archive member names for file dates and times
+    if member_names is not None:
+        filenames = list(member_names)
+
     # Adding support for wildcards
     if isinstance(filenames, str):
         filenames = glob.glob(filenames)
@@ -241,14 +421,20 @@ def read_netcdf(
 
     # Get file dates and times that were read in to the dataset
     filenames.sort()
-    for f in filenames:
-        f = Path(f).name
-        pts = re.match(r'(^[a-zA-Z0-9]+)\.([0-9a-z]{2})\.([\d]{8})\.([\d]{6})\.([a-z]{2,3}$)', f)
+    for filename in filenames:
+        f = Path(filename).name
+        pts = re.match(ARM_FILENAME_REGEX, f)
         # If Not ARM format, read in first time for info
         if pts is not None:
             pts = pts.groups()
             file_dates.append(pts[2])
             file_times.append(pts[3])
+        elif os.path.abspath(str(filename)) in file_start_times:
+            dummy = file_start_times[os.path.abspath(str(filename))]
+            file_dates.append(utils.numpy_to_arm_date(dummy))
+            file_times.append(utils.numpy_to_arm_date(dummy, returnTime=True))
+        elif ds['time'].size == 0:
+            continue
         else:
             if ds['time'].size > 1:
                 dummy = ds['time'].values[0]
@@ -271,6 +457,10 @@ def read_netcdf(
 
     ds.attrs['_arm_standards_flag'] = is_arm_file_flag
 
+    if isinstance(kwargs.get('chunks'), dict) and len(kwargs['chunks']) > 0:
+        ds.attrs['_chunk_plan'] = ', '.join(
+            [f'{dim}: {size}' for dim, size in kwargs['chunks'].items()])
+
     if cleanup_qc:
         ds.clean.cleanup()
 
@@ -280,10 +470,471 @@ def read_netcdf(
     return ds
 
 
+class _LockedNetCDF4BackendEntrypoint(NetCDF4BackendEntrypoint):
+    """
+    netCDF4 backend holding the xarray netCDF4 lock while the file is opened and
+    decoded so files can be opened from a thread pool. xarray only holds the
+    lock when reading data.
+
+    """
+
+    def open_dataset(self, filename_or_obj, *, lock=None, group=None, mode='r',
+                     format='NETCDF4', clobber=True, diskless=False, persist=False,
+                     autoclose=False, **kwargs):
+        with NETCDF4_PYTHON_LOCK:
+            # The lock is not reentrant so data read while decoding uses no lock
+            store = NetCDF4DataStore.open(
+                os.fspath(filename_or_obj), mode=mode, format=format, group=group,
+                clobber=clobber, diskless=diskless, persist=persist, lock=False,
+                autoclose=autoclose)
+            try:
+                ds = StoreBackendEntrypoint().open_dataset(store, **kwargs)
+            except Exception:
+                store.close()
+                raise
+            store.lock = NETCDF4_PYTHON_LOCK if lock is None else lock
+
+        return ds
+
+
+def _decode_time_variables(ds, preprocess=None):
+    """
+    Decodes variables with a CF time units string to datetime64[ns] using
+    act.utils.datetime_utils.decode_time_values(). Used as the preprocess function
+    for xarray.open_mfdataset() so each file is decoded with its own units before
+    combining. Variables with a non-standard calendar or units string not recognized
+    are decoded by Xarray using cftime. The units and calendar attributes are moved
+    to the variable encoding the same as Xarray decoding.
+
+    """
+    coords = {}
+    data_vars = {}
+    for var_name, var in ds.variables.items():
+        units = var.attrs.get('units')
+        if not isinstance(units, str) or ' since ' not in units:
+            continue
+
+        calendar = var.attrs.get('calendar', 'standard')
+        var_names = [var_name]
+        bounds = var.attrs.get('bounds')
+        if bounds in ds.variables and 'units' not in ds[bounds].attrs:
+            var_names.append(bounds)
+
+        for name in var_names:
+            attrs = {key: value for key, value in ds[name].attrs.items() if key not in ['units', 'calendar']}
+            encoding = dict(ds[name].encoding)
+            encoding['units'] = units
+            encoding['calendar'] = calendar
+            try:
+                if calendar.lower() not in ['standard', 'gregorian', 'proleptic_gregorian']:
+                    raise ValueError(calendar)
+                data = utils.datetime_utils.decode_time_values(ds[name].variable.data, units)
+                new_var = xr.Variable(ds[name].dims, data, attrs, encoding)
+            except ValueError:
+                new_var = xr.decode_cf(xr.Dataset({name: ds[name].variable}), use_cftime=True)[name].variable
+
+            if name in ds.coords:
+                coords[name] = new_var
+            else:
+                data_vars[name] = new_var
+
+    ds = ds.assign_coords(coords).assign(data_vars)
+
+    if preprocess is not None:
+        ds = preprocess(ds)
+
+    return ds
+
+
+def _record_file_start_time(ds, file_start_times, preprocess=None):
+    """
+    Records the first time value of a single file in file_start_times keyed by
+    the absolute filename. Used as the preprocess function for
+    xarray.open_mfdataset() where the time index of each file is already in memory,
+    so no data values need to be read. Files opened in a separate process, or
+    with time not decoded to datetime64, are not recorded.
+
+    """
+    if preprocess is not None:
+        ds = preprocess(ds)
+
+    source = ds.encoding.get('source')
+    if (
+        isinstance(source, str)
+        and 'time' in ds.indexes
+        and ds['time'].size > 0
+        and np.issubdtype(ds['time'].dtype, np.datetime64)
+    ):
+        file_start_times[os.path.abspath(source)] = ds.indexes['time'][0].to_datetime64()
+
+    return ds
+
+
+def iter_netcdf(filenames, window='1D', overlap=None, start_time=None, end_time=None, **kwargs):
+    """
+    Generator returning `xarray.Dataset` time windows one at a time from a
+    query of ARM-standard netCDF files from a single datastream. Each window is
+    read with read_netcdf() using the start_time and end_time keywords, so only the
+    files covering the window are opened and memory use is bounded by the window
+    size instead of the total record length. Files without ARM-standard filenames
+    are opened once to read their time range. Members of a TAR file are read from
+    the archive, which is opened once for all windows.
+
+    Parameters
+    ----------
+    filenames : str, pathlib.PosixPath, list of str, list of pathlib.PosixPath
+        Name of file(s) to read.
+    window : str or pandas.Timedelta
+        Length of each time window. Windows are aligned to multiples of window
+        length, i.e. '1D' windows start at midnight.
+    overlap : str, pandas.Timedelta or None
+        Length of additional data before and after each window to include in the
+        returned Dataset. Useful for windowed QC tests to behave the same at window
+        boundaries. The window without the overlap is stored in the _window global
+        attribute as a list of start and end time strings. End time is exclusive.
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Start time of the first window. If None will start with the first file.
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        End time of the last window. If None will end after the last data read.
+    **kwargs : keywords
+        Keywords to pass through to read_netcdf().
+
+    Yields
+    ------
+    ds : xarray.Dataset
+        ACT Xarray dataset for each window containing data.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+        for ds in act.io.armfiles.iter_netcdf(
+                '/data/sgpmetE13.b1/sgpmetE13.b1.2019*.cdf', window='1D', overlap='10min'):
+            ds.qcfilter.add_persistence_test('temp_mean', window=10)
+
+    """
+    window = pd.Timedelta(window).to_timedelta64()
+    if overlap is None:
+        overlap = np.timedelta64(0, 'ns')
+    else:
+        overlap = pd.Timedelta(overlap).to_timedelta64()
+
+    # Read the members of a TAR file from the archive opened once for all windows
+    archive = None
+    cleanup_temp_directory = False
+    if kwargs.get('stream_tar', True) and _is_tar_file(filenames):
+        archive = tarfile.open(str(filenames), 'r:*')
+        names = [Path(member.name).name for member in archive.getmembers() if member.isfile()]
+
+    if archive is None:
+        filenames, cleanup_temp_directory = check_if_tar_gz_file(filenames)
+        if isinstance(filenames, str):
+            filenames = glob.glob(filenames)
+        elif isinstance(filenames, PathLike):
+            filenames = [filenames]
+        names = filenames
+
+    try:
+        names = filter_files_by_time(names, start_time=start_time, end_time=end_time)
+        if len(names) == 0:
+            return
+
+        # Determine time range of files from ARM-standard filenames. If not ARM-standard
+        # filenames read the time range of each file once to select the files of
+        # each window.
+        file_ranges = None
+        file_starts = []
+        for f in names:
+            pts = re.match(ARM_FILENAME_REGEX, Path(f).name)
+            if pts is None:
+                file_starts = []
+                break
+            pts = pts.groups()
+            file_starts.append(np.datetime64(dt.datetime.strptime(pts[2] + pts[3], '%Y%m%d%H%M%S'), 'ns'))
+
+        if len(file_starts) > 0:
+            first_time = min(file_starts)
+            last_file_start = max(file_starts)
+        elif archive is not None:
+            ds = read_netcdf(archive, **kwargs)
+            first_time = ds['time'].values.min()
+            last_file_start = ds['time'].values.max()
+            ds.close()
+        else:
+            file_ranges = _file_time_ranges(names, **kwargs)
+            if len(file_ranges) == 0:
+                return
+            first_time = min(file_range[1] for file_range in file_ranges)
+            last_file_start = max(file_range[2] for file_range in file_ranges)
+
+        start_time = _to_datetime64(start_time)
+        end_time = _to_datetime64(end_time)
+        if start_time is not None:
+            first_time = max(first_time, start_time)
+
+        window_start = pd.Timestamp(first_time).floor(pd.Timedelta(window)).to_datetime64()
+        while end_time is None or window_start <= end_time:
+            window_end = window_start + window
+            core_start, core_end = window_start, window_end
+            if start_time is not None:
+                core_start = max(core_start, start_time)
+            read_end = core_end - np.timedelta64(1, 'ns')
+            if end_time is not None and end_time < read_end:
+                core_end = read_end = end_time
+
+            if archive is not None:
+                window_files = archive
+            elif file_ranges is not None:
+                # Past the end of the data in the files
+                if core_start > last_file_start:
+                    break
+                window_files = [
+                    f for f, file_start, file_end in file_ranges
+                    if file_start <= read_end + overlap and file_end >= core_start - overlap]
+            else:
+                window_files = names
+
+            ds = None
+            if not isinstance(window_files, list) or len(window_files) > 0:
+                ds = read_netcdf(
+                    window_files, start_time=core_start - overlap, end_time=read_end + overlap, **kwargs)
+
+            if ds is not None and np.any((ds['time'].values >= core_start) & (ds['time'].values <= read_end)):
+                ds.attrs['_window'] = [str(core_start), str(core_end)]
+                yield ds
+            else:
+                if ds is not None:
+                    ds.close()
+                # Past the end of the data in the last file
+                if window_start > last_file_start:
+                    break
+
+            window_start = window_end
+
+    finally:
+        if archive is not None:
+            archive.close()
+        if cleanup_temp_directory:
+            cleanup_files(files=filenames)
+
+
+def _is_tar_file(filename):
+    """
+    Returns True if filename is the name of a TAR or TAR gunzip file.
+
+    """
+    if not isinstance(filename, (str, PathLike)) or not Path(filename).is_file():
+        return False
+
+    try:
+        return tarfile.is_tarfile(str(filename))
+    except OSError:
+        return False
+
+
+def _file_time_ranges(filenames, **kwargs):
+    """
+    Returns list of tuples of file name, first time and last time of each file with
+    time values, sorted by first time. Each file is read with read_netcdf().
+
+    """
+    file_ranges = []
+    for f in filenames:
+        ds = read_netcdf(f, **kwargs)
+        time = ds['time'].values
+        ds.close()
+        if time.size > 0:
+            file_ranges.append((f, time.min(), time.max()))
+
+    file_ranges.sort(key=lambda file_range: file_range[1])
+
+    return file_ranges
+
+
+def _to_datetime64(time):
+    """
+    Converts a user provided time to numpy datetime64 or returns None if not set.
+
+    """
+    if time is None:
+        return None
+
+    return np.datetime64(time, 'ns')
+
+
+def filter_files_by_time(filenames, start_time=None, end_time=None):
+    """
+    Returns a sorted list of filenames with data possibly within the requested time
+    window. Uses the date and time in ARM-standard filenames so no file is opened.
+    A file is assumed to contain data from its filename time up to the filename time
+    of the next file in the list. Filenames not matching the ARM standard are kept.
+
+    Parameters
+    ----------
+    filenames : str, pathlib.PosixPath, list of str, list of pathlib.PosixPath
+        Name of file(s) to filter. A string will be expanded with shell syntax globbing.
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Start of the time window. If None no lower limit is used.
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        End of the time window. If None no upper limit is used.
+
+    Returns
+    -------
+    filenames : list
+        Filenames that may contain data within the time window.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+        files = act.io.armfiles.filter_files_by_time(
+            '/data/sgpmetE13.b1/sgpmetE13.b1.2019*.cdf',
+            start_time='2019-01-02', end_time='2019-01-03T12:00:00')
+
+    """
+    if isinstance(filenames, str):
+        filenames = glob.glob(filenames)
+    elif isinstance(filenames, PathLike):
+        filenames = [filenames]
+
+    filenames = sorted(filenames, key=lambda f: Path(f).name)
+    start_time = _to_datetime64(start_time)
+    end_time = _to_datetime64(end_time)
+
+    file_starts = []
+    for f in filenames:
+        pts = re.match(ARM_FILENAME_REGEX, Path(f).name)
+        if pts is None:
+            file_starts.append(None)
+            continue
+
+        pts = pts.groups()
+        file_start = '-'.join([pts[2][:4], pts[2][4:6], pts[2][6:]])
+        file_start += 'T' + ':'.join([pts[3][:2], pts[3][2:4], pts[3][4:]])
+        file_starts.append(np.datetime64(file_start, 'ns'))
+
+    # A file ends where the next ARM-standard file in the sorted list starts.
+    file_ends = [None] * len(file_starts)
+    next_start = None
+    for ii in range(len(file_starts) - 1, -1, -1):
+        if file_starts[ii] is not None:
+            file_ends[ii] = next_start
+            next_start = file_starts[ii]
+
+    keep_files = []
+    for f, file_start, file_end in zip(filenames, file_starts, file_ends):
+        if file_start is not None:
+            if end_time is not None and file_start > end_time:
+                continue
+
+            if start_time is not None and file_end is not None and file_end <= start_time:
+                continue
+
+        keep_files.append(f)
+
+    return keep_files
+
+
+def _first_filename(filenames):
+    """
+    Returns the first file name from a list of file names or from expanding
+    a string with shell syntax globbing. Returns None if no files are found.
+
+    """
+    # If filenames is a list subset to first file name.
+    if isinstance(filenames, (list, tuple)):
+        if len(filenames) == 0:
+            return None
+        filename = filenames[0]
+    # If filenames is a string, check if it needs to be expanded in shell
+    # first. Then use first returned file name. Else use the string filename.
+    elif isinstance(filenames, str):
+        filename = glob.glob(filenames)
+        if len(filename) == 0:
+            return None
+        else:
+            filename.sort()
+            filename = filename[0]
+    else:
+        filename = filenames
+
+    return filename
+
+
+def plan_time_chunks(filenames, target_chunk_size=128 * 2**20, drop_variables=None):
+    """
+    Returns a chunks dictionary for opening files with Dask where the time
+    dimension is chunked so the largest variable chunk is close to the target
+    size in bytes. Uses the netCDF4 library to read only the header of the first
+    file for variable shapes and data types.
+
+    Parameters
+    ----------
+    filenames : str, pathlib.PosixPath or list of str
+        Name of file(s) to read. If more than one filename is provided or string is
+        used for shell syntax globbing, will use the first file in the list.
+    target_chunk_size : int
+        Target size in bytes of the largest variable chunk.
+    drop_variables : str or list of str
+        Variable names to exclude from the size calculation.
+
+    Returns
+    -------
+    chunks : dict
+        Dictionary of dimension name and chunk length to pass into the
+        chunks keyword of xarray.open_mfdataset(). Empty if no time dimension
+        or no file is found.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+        chunks = act.io.armfiles.plan_time_chunks(
+            '/data/sgpkazrgeC1.a1/sgpkazrgeC1.a1.20190101.*.nc', target_chunk_size=64 * 2**20)
+
+    """
+    chunks = {}
+    filename = _first_filename(filenames)
+    if filename is None:
+        return chunks
+
+    if isinstance(drop_variables, str):
+        drop_variables = [drop_variables]
+    elif drop_variables is None:
+        drop_variables = []
+
+    header = _read_header(filename)
+    if 'time' not in header['dimensions']:
+        return chunks
+
+    bytes_per_time = 0
+    for var_name, (dims, dtype) in header['variables'].items():
+        if var_name in drop_variables or 'time' not in dims:
+            continue
+        try:
+            itemsize = dtype.itemsize
+        except AttributeError:
+            # Variable length strings
+            itemsize = 8
+        size = itemsize * int(np.prod([header['dimensions'][dim] for dim in dims if dim != 'time']))
+        bytes_per_time = max(bytes_per_time, size)
+
+    if bytes_per_time == 0:
+        return chunks
+
+    chunks['time'] = int(max(target_chunk_size // bytes_per_time, 1))
+
+    return chunks
+
+
 def keep_variables_to_drop_variables(
         filenames,
         keep_variables,
-        drop_variables=None):
+        drop_variables=None,
+        schema_cache_file=None):
     """
     Returns a list of variable names to exclude from reading by passing into
     `Xarray.open_dataset` drop_variables keyword. This can greatly help reduce
@@ -294,6 +945,15 @@ def keep_variables_to_drop_variables(
     netCDF4 library than Xarray. If more than one filename is provided or string is
     used for shell syntax globbing, will use the first file in the list.
 
+    The header schema signature of each file is cached in memory keyed by file name,
+    size and modification time, and the variable names and dimensions of the header
+    schema are keyed by the datastream name and a hash of the header signature. The
+    least recently used entries are removed after 1024 files or schemas. Repeated
+    calls with the same file do not reopen the file, and calls with a file with the
+    same schema do not recompute the list. The schema signature of each file and the
+    schemas can optionally be saved to disk, so other processes do not open a file
+    already read unless it was modified.
+
     Parameters
     ----------
     filenames : str, pathlib.PosixPath or list of str
@@ -304,6 +964,12 @@ def keep_variables_to_drop_variables(
     drop_variables : str or list of str
         Variable names to explicitly add to returned list. May be helpful if a variable
         exists in a file that is not in the first file in the list.
+    schema_cache_file : str, pathlib.Path or None
+        JSON file used to persist the header schemas between processes. The header
+        schema signature of each file is saved with the file size and modification
+        time and only one entry is saved per schema. Entries saved by other processes
+        are merged under a file lock. Will be created if it does not exist. If None
+        only the in memory cache is used.
 
     Returns
     -------
@@ -322,7 +988,6 @@ def keep_variables_to_drop_variables(
             drop_variables='variable_name_that_only_exists_in_last_file_of_the_day')
 
     """
-    read_variables = []
     return_variables = []
 
     if isinstance(keep_variables, str):
@@ -331,41 +996,323 @@ def keep_variables_to_drop_variables(
     if isinstance(drop_variables, str):
         drop_variables = [drop_variables]
 
-    # If filenames is a list subset to first file name.
-    if isinstance(filenames, (list, tuple)):
-        filename = filenames[0]
-    # If filenames is a string, check if it needs to be expanded in shell
-    # first. Then use first returned file name. Else use the string filename.
-    elif isinstance(filenames, str):
-        filename = glob.glob(filenames)
-        if len(filename) == 0:
-            return return_variables
-        else:
-            filename.sort()
-            filename = filename[0]
+    filename = _first_filename(filenames)
+    if filename is None:
+        return return_variables
+
+    signature = _file_schema_signature(filename, schema_cache_file=schema_cache_file)
+    return_variables = _schema_drop_variables(signature, tuple(keep_variables))
+
+    # Add drop_variables to list
+    if drop_variables is not None:
+        return_variables = set(return_variables) | set(drop_variables)
+
+    return list(return_variables)
+
+
+# Maximum number of header schemas, file signatures and drop lists cached in memory
+_SCHEMA_CACHE_SIZE = 1024
+# Header schemas keyed by signature in least recently used order. Each schema is a
+# tuple of the datastream name and a tuple of (variable name, dimension names) for
+# each variable in the file.
+_SCHEMAS = collections.OrderedDict()
+# Contents of each persisted schema cache file keyed by file name, with the file
+# size and modification time when read
+_SCHEMA_CACHE_FILES = {}
+_SCHEMA_CACHE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=_SCHEMA_CACHE_SIZE)
+def _read_file_schema_signature(filename, size, mtime):
+    """
+    Returns the header schema signature of a file. Uses the netCDF4 library to read
+    only the header. Cached on file name, size and modification time so a file is
+    only opened once unless modified.
 
-    # Use netCDF4 library to extract the variable and dimension names.
-    rootgrp = Dataset(filename, 'r')
-    read_variables = list(rootgrp.variables)
-    dimensions = list(rootgrp.dimensions)
+    """
+    return _header_schema_signature(_read_header(filename), Path(filename).name)
+
+
+def _header_schema_signature(header, name):
+    """
+    Returns the header schema signature of a header dictionary read with
+    _read_header() and adds the schema to the in memory cache.
+
+    """
+    datastream = header['attrs'].get('datastream')
+    if datastream is None:
+        datastream = DatastreamParserARM(name).datastream
+    schema = (
+        datastream,
+        tuple((var_name, dims) for var_name, (dims, _) in header['variables'].items()),
+    )
+
+    signature = '.'.join([str(datastream), hashlib.sha1(repr(schema).encode()).hexdigest()[:16]])
+    _add_schema(signature, schema)
+
+    return signature
+
+
+def _add_schema(signature, schema):
+    """
+    Adds a header schema to the in memory cache, removing the least recently used
+    schemas when the cache is full.
+
+    """
+    _SCHEMAS[signature] = schema
+    _SCHEMAS.move_to_end(signature)
+    while len(_SCHEMAS) > _SCHEMA_CACHE_SIZE:
+        _SCHEMAS.popitem(last=False)
+
+
+def _read_header(filename):
+    """
+    Returns dictionary of the global attributes, dimension sizes and variable
+    dimension names and data types read from the header of a netCDF file name or
+    file-like object. File-like objects are read without the variable data and
+    rewound.
+
+    """
+    if not hasattr(filename, 'read'):
+        with Dataset(filename, 'r') as rootgrp:
+            return _dataset_header(rootgrp)
+
+    try:
+        if filename.read(3) == b'CDF':
+            filename.seek(0)
+            return _read_netcdf3_header(filename)
+        filename.seek(0)
+
+        try:
+            import h5netcdf.legacyapi
+        except ImportError:
+            memory = filename.read()
+            with Dataset(str(getattr(filename, 'name', 'memory')), 'r', memory=memory) as rootgrp:
+                return _dataset_header(rootgrp)
+
+        with h5netcdf.legacyapi.Dataset(filename, 'r') as rootgrp:
+            return _dataset_header(rootgrp)
+    finally:
+        filename.seek(0)
+
+
+def _dataset_header(rootgrp):
+    """
+    Returns the header dictionary of an open netCDF4 or h5netcdf legacy API Dataset.
+
+    """
+    return {
+        'attrs': {name: rootgrp.getncattr(name) for name in rootgrp.ncattrs()},
+        'dimensions': {name: len(dim) for name, dim in rootgrp.dimensions.items()},
+        'variables': {
+            name: (tuple(var.dimensions), var.dtype) for name, var in rootgrp.variables.items()
+        },
+    }
+
+
+# netCDF3 data types by type number
+_NETCDF3_TYPES = {1: 'i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8', 7: 'u1',
+                  8: '>u2', 9: '>u4', 10: '>i8', 11: '>u8'}
+
+
+def _read_netcdf3_header(fileobj):
+    """
+    Returns the header dictionary of a netCDF3 classic, 64-bit offset or 64-bit data
+    file-like object. Only the header at the start of the file is read.
+
+    """
+    def read(dtype, count=1):
+        dtype = np.dtype(dtype)
+        data = fileobj.read(dtype.itemsize * count)
+        if len(data) != dtype.itemsize * count:
+            raise OSError('Incomplete netCDF3 header')
+        return np.frombuffer(data, dtype=dtype, count=count)
+
+    def read_values(dtype, count):
+        values = read(dtype, count)
+        fileobj.read(-(values.nbytes) % 4)
+        return values
+
+    def read_name():
+        return read_values('S1', int(read(size_type)[0])).tobytes().decode('utf-8')
+
+    def read_list():
+        tag = read('>i4')[0]
+        count = read(size_type)[0]
+        return int(count) if tag != 0 else 0
+
+    def read_attrs():
+        attrs = {}
+        for _ in range(read_list()):
+            name = read_name()
+            dtype = _NETCDF3_TYPES[int(read('>i4')[0])]
+            values = read_values(dtype, int(read(size_type)[0]))
+            if dtype == 'S1':
+                attrs[name] = values.tobytes().decode('utf-8', 'replace')
+            else:
+                attrs[name] = values[0] if values.size == 1 else values
+        return attrs
+
+    version = fileobj.read(4)[3]
+    size_type = '>i8' if version == 5 else '>i4'
+    numrecs = max(int(read(size_type)[0]), 0)
+
+    dimensions = {}
+    for _ in range(read_list()):
+        name = read_name()
+        size = int(read(size_type)[0])
+        dimensions[name] = size if size > 0 else numrecs
+    dim_names = list(dimensions)
+
+    attrs = read_attrs()
+
+    variables = {}
+    for _ in range(read_list()):
+        name = read_name()
+        dims = tuple(dim_names[ii] for ii in read(size_type, int(read(size_type)[0])))
+        read_attrs()
+        dtype = np.dtype(_NETCDF3_TYPES[int(read('>i4')[0])])
+        # Skip the variable size and offset
+        read(size_type)
+        read('>i8' if version in [2, 5] else '>i4')
+        variables[name] = (dims, dtype)
+
+    return {'attrs': attrs, 'dimensions': dimensions, 'variables': variables}
+
+
+def _file_schema_signature(filename, schema_cache_file=None):
+    """
+    Returns the header schema signature of a file using the in memory cache and
+    optional on disk cache. A file saved in the on disk cache with the same size
+    and modification time is not opened.
+
+    """
+    # File-like objects from archives have no size or modification time to cache on
+    if hasattr(filename, 'read'):
+        return _header_schema_signature(_read_header(filename), str(getattr(filename, 'name', '')))
+
+    filename = str(Path(filename).resolve())
+    stat = Path(filename).stat()
+    file_entry = [stat.st_size, stat.st_mtime]
+    if schema_cache_file is not None:
+        schema_cache_file = str(schema_cache_file)
+        cache = _load_schema_cache(schema_cache_file)
+        entry = cache['files'].get(filename)
+        if entry is not None and entry[:2] == file_entry and entry[2] in cache['schemas']:
+            datastream, variables = cache['schemas'][entry[2]]
+            _add_schema(entry[2], (datastream, tuple((name, tuple(dims)) for name, dims in variables)))
+            return entry[2]
+
+    signature = _read_file_schema_signature(filename, stat.st_size, stat.st_mtime)
+    if signature in _SCHEMAS:
+        _SCHEMAS.move_to_end(signature)
+    else:
+        # The schema was removed from the memory cache so read the header again
+        signature = _read_file_schema_signature.__wrapped__(filename, stat.st_size, stat.st_mtime)
+
+    if schema_cache_file is not None:
+        _save_schema(schema_cache_file, filename, file_entry + [signature])
+
+    return signature
+
+
+def _load_schema_cache(schema_cache_file):
+    """
+    Returns the contents of a persisted schema cache file with the header schema
+    signature of each file name and the header schema of each signature. The file
+    is only read again when modified.
+
+    """
+    try:
+        stat = os.stat(schema_cache_file)
+    except FileNotFoundError:
+        return {'files': {}, 'schemas': {}}
+
+    file_id = (stat.st_size, stat.st_mtime_ns)
+    loaded = _SCHEMA_CACHE_FILES.get(schema_cache_file)
+    if loaded is not None and loaded[0] == file_id:
+        return loaded[1]
+
+    cache = {'files': {}, 'schemas': {}}
+    try:
+        with open(schema_cache_file) as fh:
+            cache.update(json.load(fh))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    _SCHEMA_CACHE_FILES[schema_cache_file] = (file_id, cache)
+
+    return cache
+
+
+def _save_schema(schema_cache_file, filename, entry):
+    """
+    Adds the size, modification time and header schema signature of a file and the
+    header schema to the persisted schema cache file. The entries saved by other
+    processes are merged under a file lock.
+
+    """
+    signature = entry[2]
+    with _schema_cache_lock(schema_cache_file):
+        cache = _load_schema_cache(schema_cache_file)
+        if cache['files'].get(filename) == entry and signature in cache['schemas']:
+            return
+
+        cache = {'files': dict(cache['files']), 'schemas': dict(cache['schemas'])}
+        cache['files'][filename] = entry
+        cache['schemas'][signature] = _SCHEMAS[signature]
+        # Write to temporary file and rename so other processes never read a partial file
+        temp_file = schema_cache_file + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_file, 'w') as fh:
+            json.dump(cache, fh)
+        os.replace(temp_file, schema_cache_file)
+
+
+@contextlib.contextmanager
+def _schema_cache_lock(schema_cache_file):
+    """
+    Context manager holding an exclusive lock on a schema cache file for the threads
+    of this process and, where fcntl is available, for other processes.
+
+    """
+    with _SCHEMA_CACHE_LOCK:
+        if not _FCNTL_AVAILABLE:
+            yield
+            return
+
+        with open(schema_cache_file + '.lock', 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@functools.lru_cache(maxsize=_SCHEMA_CACHE_SIZE)
+def _schema_drop_variables(signature, keep_variables):
+    """
+    Returns the set of variable names to drop for a header schema signature, keeping
+    the requested variables and their dimension names.
+
+    """
+    schema = dict(_SCHEMAS[signature][1])
     # Loop over the variables to exclude needed coordinate dimention names.
     dims_to_keep = []
     for var_name in keep_variables:
-        try:
-            dims_to_keep.extend(list(rootgrp[var_name].dimensions))
-        except IndexError:
-            pass
-
-    rootgrp.close()
+        dims_to_keep.extend(list(schema.get(var_name, ())))
 
     # Remove names not matching keep_varibles excluding the associated coordinate dimentions
-    return_variables = set(read_variables) - set(keep_variables) - set(dims_to_keep)
+    return frozenset(set(schema) - set(keep_variables) - set(dims_to_keep))
 
-    # Add drop_variables to list
-    if drop_variables is not None:
-        return_variables = set(return_variables) | set(drop_variables)
 
-    return list(return_variables)
+def clear_schema_cache():
+    """
+    Clears the in memory header schema cache used by keep_variables_to_drop_variables.
+
+    """
+    _read_file_schema_signature.cache_clear()
+    _schema_drop_variables.cache_clear()
+    _SCHEMAS.clear()
+    _SCHEMA_CACHE_FILES.clear()
 
 
 def check_arm_standards(ds):
@@ -400,7 +1347,20 @@ def check_arm_standards(ds):
     return the_flag
 
 
-def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scalar_fill_dim=None, local_file=False):
+# ARM DOD web service
+DOD_URL = 'https://pcm.arm.gov/pcm/api/dods/'
+# Seconds a DOD is used from the cache before the latest versions are requested again
+DOD_CACHE_TTL = 86400
+# DOD documents read in this process keyed by proc. Each value is the time the
+# document was retrieved and the document.
+_DOD_DOCUMENTS = {}
+# Datasets created from DODs keyed by the create_ds_from_arm_dod arguments. Each
+# value is the Dataset and the dimension sizes used.
+_DOD_TEMPLATES = {}
+
+
+def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scalar_fill_dim=None,
+                           local_file=False, cache_dir=None, cache_ttl=DOD_CACHE_TTL, offline=False):
     """
 
     Queries the ARM DOD api and builds a dataset based on the ARM DOD and
@@ -431,10 +1391,24 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
     local_file: bool
         If true, the DOD will be loaded from a file whose name is proc.
         If false, the DOD will be pulled from PCM.
+    cache_dir : str, pathlib.Path or None
+        Directory to cache DODs pulled from PCM as <proc>.json files. Can also be a
+        directory of DOD JSON files named <proc>.json or <proc>. A cached DOD is used
+        without checking PCM if it has the requested version or is newer than
+        cache_ttl. If PCM can not be reached a cached DOD is used. If None DODs are
+        only cached in memory.
+    cache_ttl : int or float
+        Number of seconds a cached DOD is used when the version is not set or not in
+        the cached DOD.
+    offline : bool
+        If true, the DOD is only read from the memory cache or cache_dir and PCM is
+        never queried.
+
     Returns
     -------
     ds : xarray.Dataset
-        ACT Xarray dataset populated with all variables and attributes.
+        ACT Xarray dataset populated with all variables and attributes. Datasets are
+        created once for each set of arguments and a copy is returned.
 
     Examples
     --------
@@ -445,16 +1419,13 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
             'vdis.b1', dims, version='1.2', scalar_fill_dim='time')
 
     """
-    # Set base url to get DOD information
+    key = (str(proc), str(version), tuple(sorted(set_dims.items())), fill_value, scalar_fill_dim)
     if local_file is False:
-        base_url = 'https://pcm.arm.gov/pcm/api/dods/'
-
-        # Get data from DOD api
-        with urllib.request.urlopen(base_url + proc) as url:
-            data = json.loads(url.read().decode())
+        data = _get_dod(proc, version, cache_dir=cache_dir, cache_ttl=cache_ttl, offline=offline)
     else:
         with open(proc) as file:
             data = json.loads(file.read())
+        key += (os.path.getmtime(proc),)
 
     # Check version numbers and alert if requested version in not available
     keys = list(data['versions'].keys())
@@ -467,6 +1438,13 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
         )
         version = keys[-1]
 
+    # Templates are keyed on the version used so a newer latest version is not missed
+    key += (version,)
+    if key in _DOD_TEMPLATES:
+        ds, dims = _DOD_TEMPLATES[key]
+        set_dims.update(dims)
+        return ds.copy(deep=True)
+
     # Create empty xarray dataset
     ds = xr.Dataset()
 
@@ -476,8 +1454,9 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
         if a['name'] == 'string':
             continue
         if a['value'] is None:
-            a['value'] = ''
-        atts[a['name']] = a['value']
+            atts[a['name']] = ''
+        else:
+            atts[a['name']] = a['value']
 
     ds.attrs = atts
 
@@ -506,7 +1485,7 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
                 data_na = fill_value
             else:
                 data_na = np.full(set_dims[scalar_fill_dim], fill_value)
-                v['dims'] = scalar_fill_dim
+                dims = scalar_fill_dim
         else:
             for d in dims:
                 dim_shape.append(set_dims[d])
@@ -528,10 +1507,119 @@ def create_ds_from_arm_dod(proc, set_dims, version='', fill_value=-9999.0, scala
                 continue
             atts[a['name']] = a['value']
 
-        da = xr.DataArray(data=data_na, dims=v['dims'], name=v['name'], attrs=atts)
+        da = xr.DataArray(data=data_na, dims=dims, name=v['name'], attrs=atts)
         ds[v['name']] = da
 
-    return ds
+    _DOD_TEMPLATES[key] = (ds, dict(set_dims))
+
+    return ds.copy(deep=True)
+
+
+def prefetch_dods(procs, cache_dir):
+    """
+    Pulls DODs from PCM and writes them to a cache directory for use by
+    create_ds_from_arm_dod with the cache_dir and offline keywords. DODs already
+    in the cache are replaced.
+
+    Parameters
+    ----------
+    procs : str or list of str
+        Processes to pull, i.e. vdis.b1 or ['vdis.b1', 'kazrge.a1'].
+    cache_dir : str or pathlib.Path
+        Directory to write the DODs as <proc>.json files. Will be created if it
+        does not exist.
+
+    Returns
+    -------
+    files : list of str
+        Names of the DOD files written.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        act.io.armfiles.prefetch_dods(['vdis.b1', 'metE13.b1'], '/data/dods')
+        ds = act.io.armfiles.create_ds_from_arm_dod(
+            'vdis.b1', {'time': 1440}, cache_dir='/data/dods', offline=True)
+
+    """
+    if isinstance(procs, str):
+        procs = [procs]
+
+    files = []
+    for proc in procs:
+        data = _fetch_dod(proc, cache_dir)
+        _DOD_DOCUMENTS[proc] = (time.time(), data)
+        files.append(str(Path(cache_dir, proc + '.json')))
+
+    return files
+
+
+def clear_dod_cache():
+    """
+    Clears the in memory DOD and Dataset caches used by create_ds_from_arm_dod.
+    DOD files in cache directories are not removed.
+
+    """
+    _DOD_DOCUMENTS.clear()
+    _DOD_TEMPLATES.clear()
+
+
+def _get_dod(proc, version, cache_dir=None, cache_ttl=DOD_CACHE_TTL, offline=False):
+    """
+    Returns a DOD from the memory cache, the cache directory or PCM.
+
+    """
+    cached = _DOD_DOCUMENTS.get(proc)
+    if cached is None and cache_dir is not None:
+        for cache_file in [Path(cache_dir, proc + '.json'), Path(cache_dir, proc)]:
+            if cache_file.is_file():
+                with open(cache_file) as file:
+                    cached = (cache_file.stat().st_mtime, json.loads(file.read()))
+                _DOD_DOCUMENTS[proc] = cached
+                break
+
+    if cached is not None:
+        retrieved, data = cached
+        # Released versions do not change so only the latest version can be stale
+        if offline or version in data['versions'] or time.time() - retrieved < cache_ttl:
+            return data
+
+    if offline:
+        raise FileNotFoundError(f'DOD for {proc} not found in cache directory {cache_dir} with offline set.')
+
+    try:
+        data = _fetch_dod(proc, cache_dir)
+    except OSError as error:
+        if cached is None:
+            raise
+        warnings.warn(f'Unable to pull DOD for {proc} from PCM, using cached DOD: {error}', UserWarning)
+        return cached[1]
+
+    _DOD_DOCUMENTS[proc] = (time.time(), data)
+
+    return data
+
+
+def _fetch_dod(proc, cache_dir=None):
+    """
+    Pulls a DOD from PCM and writes it to the cache directory if set.
+
+    """
+    with urllib.request.urlopen(DOD_URL + proc) as url:
+        text = url.read().decode()
+    data = json.loads(text)
+
+    if cache_dir is not None:
+        # Write to temporary file and rename so other processes never read a partial file
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        cache_file = str(Path(cache_dir, proc + '.json'))
+        temp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_file, 'w') as fh:
+            fh.write(text)
+        os.replace(temp_file, cache_file)
+
+    return data
 
 
 @xr.register_dataset_accessor('write')
@@ -555,6 +1643,8 @@ class WriteDataset:
         delete_global_attrs=['qc_standards_version', 'qc_method', 'qc_comment'],
         FillValue=-9999,
         cf_convention='CF-1.8',
+        append=False,
+        encoding_preset=None,
         **kwargs,
     ):
         """
@@ -579,9 +1669,10 @@ class WriteDataset:
             The character sting to use for replacing white spaces between words when converting
             a list of strings to single character string attributes.
         make_copy : boolean
-            Make a copy before modifying Dataset to write. For large Datasets this
-            may add processing time and memory. If modifying the Dataset is OK
-            try setting to False.
+            Make a shallow copy before modifying Dataset to write. The data arrays are not
+            copied, only the attribute and encoding dictionaries the cleanup changes, so
+            the Dataset is unchanged after writing. If modifying the Dataset attributes is
+            OK setting to False will skip the copy.
         cf_compliant : boolean
             Option to output file with additional attributes to make file Climate & Forecast
             complient. May require runing .clean.cleanup() method on the dataset to fix other
@@ -599,6 +1690,27 @@ class WriteDataset:
             array. This should then remove missing_value attribute from the file as well.
         cf_convention : str
             The Climate and Forecast convention string to add to Conventions attribute.
+        append : boolean
+            Option to append the time samples of the Dataset to the file set with the path
+            keyword. If the file does not exist it is created with the other keywords and time
+            as an unlimited dimension. If the file exists, the time dependent variables are
+            written after the last time in the file using the encoding of the file variables.
+            Samples at or before the last time in the file are not written. Variables not in
+            the file, variables without a time dimension, and attributes are not updated.
+            The Dataset is not copied and the file is closed after writing so other readers
+            see the new samples.
+        encoding_preset : str or None
+            Name of compression and chunking settings to add to the encoding of each
+            variable written. Requires netCDF4 file format. Options are:
+
+            'archive' : zlib compression with shuffle and chunks along time of about
+            1 MiB, with other dimensions full length. Smallest files.
+
+            'fast' : No compression and contiguous storage. Fastest to write.
+
+            'analysis' : Light zlib compression with shuffle and chunks the full length
+            of time and one along other dimensions, for fast reading of a time
+            series at one location of a variable.
         **kwargs : keywords
             Keywords to pass through to Dataset.to_netcdf()
 
@@ -608,10 +1720,23 @@ class WriteDataset:
 
             ds.write.write_netcdf(path='output.nc')
 
+        .. code-block :: python
+
+            # Real time processing appending to daily file
+            for ds in new_data:
+                ds.write.write_netcdf(path='sgpmetE13.b1.20190101.000000.nc', append=True)
+
         """
+        if append:
+            if Path(kwargs['path']).is_file():
+                self._append_netcdf(kwargs['path'])
+                return
+
+            if 'time' in self._ds.dims:
+                kwargs.setdefault('unlimited_dims', ['time'])
 
         if make_copy:
-            write_ds = copy.deepcopy(self._ds)
+            write_ds = self._ds.copy(deep=False)
         else:
             write_ds = self._ds
 
@@ -765,8 +1890,139 @@ class WriteDataset:
         if hasattr(write_ds, 'time_bounds') and not write_ds.time.encoding:
             write_ds.time.encoding.update(write_ds.time_bounds.encoding)
 
+        if encoding_preset is not None:
+            _add_encoding_preset(write_ds, encoding, encoding_preset, **kwargs)
+
         write_ds.to_netcdf(encoding=encoding, **kwargs)
 
+    def _append_netcdf(self, path):
+        """
+        Appends the time samples of the Dataset to an existing netCDF file along the
+        unlimited time dimension.
+
+        """
+        with Dataset(path, 'a') as nc:
+            if 'time' not in nc.dimensions or not nc.dimensions['time'].isunlimited():
+                raise ValueError(f'Can not append to {path}. The time dimension is not unlimited.')
+
+            start = len(nc.dimensions['time'])
+            time = self._encode_append_variable('time', nc['time'])
+            keep = np.ones(time.size, dtype=bool)
+            if start > 0:
+                nc['time'].set_auto_maskandscale(False)
+                keep = time > nc['time'][start - 1]
+
+            end = start + int(keep.sum())
+            if end == start:
+                return
+
+            for var_name, var in self._ds.variables.items():
+                if 'time' not in var.dims or var_name not in nc.variables:
+                    continue
+
+                nc_var = nc[var_name]
+                if set(var.dims) != set(nc_var.dimensions):
+                    raise ValueError(
+                        f'Can not append {var_name}. Dimensions {var.dims} do not match '
+                        f'{nc_var.dimensions} in {path}.')
+
+                data = self._encode_append_variable(var_name, nc_var)
+                data = np.compress(keep, data, axis=nc_var.dimensions.index('time'))
+                index = tuple(slice(start, end) if dim == 'time' else slice(None)
+                              for dim in nc_var.dimensions)
+                nc_var.set_auto_maskandscale(False)
+                nc_var[index] = data
+
+            nc.sync()
+
+    def _encode_append_variable(self, var_name, nc_var):
+        """
+        Returns the data of a variable encoded with the attributes of a file variable and
+        transposed to the file dimension order.
+
+        """
+        var = self._ds[var_name].variable.transpose(*nc_var.dimensions)
+        attrs = {att: nc_var.getncattr(att) for att in nc_var.ncattrs()}
+
+        if np.issubdtype(var.dtype, np.datetime64) and ' since ' in str(attrs.get('units')):
+            data = utils.datetime_utils.encode_time_values(var.values, attrs['units'], dtype=nc_var.dtype)
+            if '_FillValue' in attrs:
+                data[np.isnat(var.values)] = attrs['_FillValue']
+            return data
+
+        if var.dtype.kind in 'OSU':
+            return var.values
+
+        encoding = {att: attrs[att] for att in ['_FillValue', 'missing_value', 'scale_factor', 'add_offset']
+                    if att in attrs}
+        encoding['dtype'] = nc_var.dtype
+        var = xr.Variable(var.dims, var.data, encoding=encoding)
+
+        return np.asarray(xr.conventions.encode_cf_variable(var, name=var_name).values)
+
+
+# Compression and chunking settings used with WriteDataset.write_netcdf(encoding_preset=).
+# chunking is 'time' for chunks along time of chunk_size bytes, 'column' for chunks the
+# full length of time, or 'contiguous' for no chunking.
+ENCODING_PRESETS = {
+    'archive': {'zlib': True, 'complevel': 4, 'shuffle': True, 'chunking': 'time', 'chunk_size': 2**20},
+    'fast': {'zlib': False, 'chunking': 'contiguous'},
+    'analysis': {'zlib': True, 'complevel': 1, 'shuffle': True, 'chunking': 'column'},
+}
+
+# Variable encoding keys kept when adding a preset to a variable encoding
+_KEEP_ENCODING = ['units', 'calendar', 'dtype', '_FillValue', 'missing_value', 'scale_factor', 'add_offset']
+
+
+def _add_encoding_preset(ds, encoding, encoding_preset, **kwargs):
+    """
+    Updates an encoding dictionary for Dataset.to_netcdf() with compression and
+    chunking settings from ENCODING_PRESETS for each variable.
+
+    """
+    try:
+        preset = ENCODING_PRESETS[encoding_preset]
+    except KeyError:
+        raise ValueError(
+            f'encoding_preset "{encoding_preset}" not one of {list(ENCODING_PRESETS)}')
+
+    if str(kwargs.get('format', 'NETCDF4')).startswith('NETCDF3') or kwargs.get('engine') == 'scipy':
+        raise ValueError('encoding_preset requires the netCDF4 file format.')
+
+    unlimited_dims = kwargs.get('unlimited_dims') or []
+    if isinstance(unlimited_dims, str):
+        unlimited_dims = [unlimited_dims]
+    unlimited_dims = set(unlimited_dims) | set(ds.encoding.get('unlimited_dims', []))
+
+    for var_name, var in ds.variables.items():
+        if len(var.dims) == 0 or var.dtype.kind in 'OSU':
+            continue
+
+        if var_name not in encoding:
+            encoding[var_name] = {key: value for key, value in var.encoding.items() if key in _KEEP_ENCODING}
+        var_encoding = encoding[var_name]
+
+        shape = [max(size, 1) for size in var.shape]
+        if preset['chunking'] == 'contiguous':
+            if len(unlimited_dims & set(var.dims)) == 0:
+                var_encoding['contiguous'] = True
+        elif preset['chunking'] == 'time' and 'time' in var.dims:
+            bytes_per_time = var.dtype.itemsize * int(np.prod(
+                [size for dim, size in zip(var.dims, shape) if dim != 'time']))
+            time_chunk = int(min(max(preset['chunk_size'] // bytes_per_time, 1), var.sizes['time']))
+            var_encoding['chunksizes'] = tuple(
+                max(time_chunk, 1) if dim == 'time' else size for dim, size in zip(var.dims, shape))
+        elif preset['chunking'] == 'column':
+            var_encoding['chunksizes'] = tuple(
+                size if dim == 'time' else 1 for dim, size in zip(var.dims, shape))
+
+        if preset['zlib']:
+            var_encoding['zlib'] = True
+            var_encoding['complevel'] = preset['complevel']
+            var_encoding['shuffle'] = preset['shuffle']
+        elif preset['chunking'] == 'contiguous':
+            var_encoding['zlib'] = False
+
 
 def check_if_tar_gz_file(filenames):
     """
@@ -803,7 +2059,159 @@ def check_if_tar_gz_file(filenames):
     return filenames, cleanup
 
 
-def read_mmcr(filenames):
+def open_tar_gz_members(filename, start_time=None, end_time=None, engine=None,
+                        buffer_size=256 * 2**20):
+    """
+    Opens the netCDF members of a TAR, TAR gunzip or gunzip file as file-like objects
+    that can be read by Xarray without extracting the archive to disk. Members of an
+    uncompressed TAR file are read in place from the TAR file. Members of a compressed
+    file are decompressed one at a time into memory until buffer_size bytes are used,
+    the remaining members are decompressed into temporary files removed when closed.
+
+    Parameters
+    ----------
+    filename : str, pathlib.Path or tarfile.TarFile
+        Name of TAR, TAR gunzip or gunzip file. An open TarFile is read without
+        closing it, so the members of several time windows can be read from the
+        archive without reading the archive index again.
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Start of the time window. Members are selected using the date and time in
+        the ARM-standard member filenames with filter_files_by_time().
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        End of the time window.
+    engine : str or None
+        Xarray engine requested to read the members. If the members can not be read
+        with this engine None is returned.
+    buffer_size : int
+        Maximum number of bytes of decompressed members held in memory.
+
+    Returns
+    -------
+    members : tuple or None
+        Tuple of the sorted member filenames, the file-like objects, the Xarray
+        engine name to read the members with and the TAR file opened to read the
+        members from or None. The file-like objects and TAR file should be closed
+        after reading. None if filename is not a TAR or gunzip file, no netCDF
+        members are found, or the members can not be read with one Xarray engine
+        from memory.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+        import xarray as xr
+
+        names, members, engine, tar = act.io.armfiles.open_tar_gz_members(
+            '/data/sgpmetE13.b1.tar.gz', start_time='2019-01-02', end_time='2019-01-03')
+        ds = xr.open_mfdataset(members, engine=engine)
+
+    """
+    tar = None
+    if isinstance(filename, tarfile.TarFile):
+        archive = filename
+        gunzip = isinstance(archive.fileobj, gzip.GzipFile)
+        is_tar = True
+    elif not isinstance(filename, (str, PathLike)) or not Path(filename).is_file():
+        return None
+    else:
+        filename = str(filename)
+        try:
+            gunzip = is_gunzip_file(filename)
+            is_tar = tarfile.is_tarfile(filename)
+        except OSError:
+            return None
+        if is_tar:
+            archive = tar = tarfile.open(filename, 'r:*')
+
+    members = {}
+    if is_tar:
+        tar_members = {Path(member.name).name: member for member in archive.getmembers() if member.isfile()}
+        names = filter_files_by_time(list(tar_members), start_time=start_time, end_time=end_time)
+        # Read compressed members in archive order so the stream is read forward
+        for name in sorted(names, key=lambda name: tar_members[name].offset_data):
+            fileobj = archive.extractfile(tar_members[name])
+            if gunzip:
+                size = tar_members[name].size
+                fileobj = _buffer_member(fileobj, size if size <= buffer_size else 0)
+                buffer_size -= size if size <= buffer_size else 0
+            members[name] = fileobj
+        # Members of a compressed TAR file are copied so the TAR file is not needed
+        if gunzip and tar is not None:
+            tar.close()
+            tar = None
+    elif gunzip:
+        name = Path(filename).name[:-3] if filename.endswith('.gz') else Path(filename).name
+        with gzip.open(filename, 'rb') as fileobj:
+            members[name] = _buffer_member(fileobj, buffer_size, spool=True)
+    else:
+        return None
+
+    # Select the netCDF members by the file signature and determine the engine.
+    engines = set()
+    for name in list(members):
+        signature = members[name].read(4)
+        members[name].seek(0)
+        if signature[:3] == b'CDF':
+            engines.add('scipy')
+        elif signature == b'\x89HDF':
+            engines.add('h5netcdf')
+        else:
+            members.pop(name).close()
+
+    member_engine = engines.pop() if len(engines) == 1 else None
+    if member_engine is None or (engine is not None and engine != member_engine):
+        member_engine = None
+    elif member_engine == 'h5netcdf':
+        try:
+            import h5netcdf  # noqa: F401
+        except ImportError:
+            member_engine = None
+
+    if member_engine is None:
+        _close_files(list(members.values()) + [tar])
+        return None
+
+    names = sorted(members)
+
+    return names, [members[name] for name in names], member_engine, tar
+
+
+def _buffer_member(fileobj, max_size, spool=False):
+    """
+    Returns a rewound copy of a file-like object held in memory if not larger than
+    max_size bytes, else in a temporary file. Set spool when the size is not known
+    to copy into memory until max_size bytes are read.
+
+    """
+    if spool and max_size > 0:
+        buffer = tempfile.SpooledTemporaryFile(max_size=max_size)
+    elif max_size > 0:
+        buffer = io.BytesIO()
+    else:
+        buffer = tempfile.TemporaryFile()
+
+    shutil.copyfileobj(fileobj, buffer, 2**20)
+    buffer.seek(0)
+
+    return buffer
+
+
+def _close_files(files):
+    """
+    Closes a list of open files and close functions, skipping None.
+
+    """
+    for fileobj in files:
+        if fileobj is None:
+            continue
+        if callable(fileobj):
+            fileobj()
+        else:
+            fileobj.close()
+
+
+def read_mmcr(filenames, **kwargs):
     """
 
     Reads in ARM MMCR files and splits up the variables into specific
@@ -811,10 +2219,17 @@ def read_mmcr(filenames):
     interleaved and are not readable using xarray so some modifications are
     needed ahead of time.
 
+    The files are opened read only. The heights dimension is renamed to range
+    in memory and the data remain Dask backed, including the mode variables which
+    are created lazily by grouping the time samples on ModeNum.
+
     Parameters
     ----------
     filenames : str, pathlib.PosixPath or list of str
         Name of file(s) to read.
+    **kwargs : keywords
+        Keywords to pass through to xarray.open_mfdataset(). Default chunks
+        is one chunk per file.
 
     Returns
     -------
@@ -824,62 +2239,72 @@ def read_mmcr(filenames):
     """
 
     # Sort the files to make sure they concatenate right
-    filenames.sort()
+    if isinstance(filenames, (str, PathLike)):
+        filenames = glob.glob(str(filenames))
+    filenames = sorted(filenames)
 
-    # Run through each file and read it in using netCDF4, then
-    # read it in with xarray
-    multi_ds = []
-    for f in filenames:
-        nc = Dataset(f, "a")
-        # Change heights name to range to read appropriately to xarray
-        if 'heights' in nc.dimensions:
-            nc.renameDimension('heights', 'range')
-        if nc is not None:
-            ds = xr.open_dataset(xr.backends.NetCDF4DataStore(nc))
-            multi_ds.append(ds)
-    # Concatenate datasets together
-    if len(multi_ds) > 1:
-        ds = xr.concat(multi_ds, dim='time')
-    else:
-        ds = multi_ds[0]
+    if len(filenames) == 0:
+        return None
+
+    # The heights variable is two dimensional and uses the heights dimension name so can
+    # not be read with xarray. Read it from the first file with the netCDF4 library.
+    nc = Dataset(filenames[0], 'r')
+    try:
+        heights = np.ma.filled(nc['heights'][:].astype(float), np.nan)
+        heights_attrs = {att: nc['heights'].getncattr(att) for att in nc['heights'].ncattrs()
+                         if att not in ['_FillValue', 'missing_value']}
+    finally:
+        nc.close()
+
+    # Variables without a time dimension are the same in all files so only concatenate
+    # time dependent variables.
+    kwargs.setdefault('chunks', {'time': -1})
+    drop_variables = kwargs.pop('drop_variables', [])
+    if isinstance(drop_variables, str):
+        drop_variables = [drop_variables]
+    ds = xr.open_mfdataset(
+        filenames,
+        combine='nested',
+        concat_dim='time',
+        data_vars='minimal',
+        coords='minimal',
+        compat='override',
+        drop_variables=list(drop_variables) + ['heights'],
+        **kwargs,
+    )
 
-    # Get mdoes and ranges with time/height modes
-    modes = ds['mode'].values
+    # Change heights name to range to read appropriately to xarray
+    if 'heights' in ds.dims:
+        ds = ds.rename_dims({'heights': 'range'})
+    ds['heights'] = xr.DataArray(heights, dims=['mode', 'range'], attrs=heights_attrs)
+
+    # Get variables with time/height modes
     mode_vars = []
     for v in ds:
         if 'range' in ds[v].dims and 'time' in ds[v].dims and len(ds[v].dims) == 2:
             mode_vars.append(v)
 
-    # For each mode, run extract data variables if available
-    # saves as individual variables in the file.
-    for m in modes:
-        if len(ds['ModeDescription'].shape) > 1:
-            mode_desc = ds['ModeDescription'].values[0, m]
-            if np.isnan(ds['heights'].values[0, m, :]).all():
-                continue
-            range_data = ds['heights'].values[0, m, :]
-        else:
-            mode_desc = ds['ModeDescription'].values[m]
-            if np.isnan(ds['heights'].values[m, :]).all():
-                continue
-            range_data = ds['heights'].values[m, :]
-        mode_desc = str(mode_desc).split('_')[-1][0:-1]
-        mode_desc = str(mode_desc).split('\'')[0]
-        idx = np.where(ds['ModeNum'].values == m)[0]
+    # Group the time samples by mode and save each mode as individual
+    # variables in the dataset.
+    mode_ds = ds[mode_vars]
+    for m, group in mode_ds.groupby(ds['ModeNum'].compute()):
+        m = int(m)
+        range_data = heights[m, :]
         idy = np.where(~np.isnan(range_data))[0]
-        for v in mode_vars:
-            new_var_name = v + '_' + mode_desc
-            time_name = 'time_' + mode_desc
-            range_name = 'range_' + mode_desc
-            data = ds[v].values[idx, :]
-            data = data[:, idy]
-            attrs = ds[v].attrs
-            da = xr.DataArray(
-                data=data,
-                coords={time_name: ds['time'].values[idx], range_name: range_data[idy]},
-                dims=[time_name, range_name],
-                attrs=attrs
-            )
-            ds[new_var_name] = da
+        if idy.size == 0:
+            continue
+
+        mode_desc = ds['ModeDescription'].values[m]
+        if isinstance(mode_desc, bytes):
+            mode_desc = mode_desc.decode()
+        mode_desc = str(mode_desc).split('_')[-1]
+        time_name = 'time_' + mode_desc
+        range_name = 'range_' + mode_desc
+
+        group = group.drop_vars('ModeNum', errors='ignore').isel(range=idy)
+        group = group.rename({'time': time_name, 'range': range_name})
+        group = group.assign_coords({range_name: range_data[idy]})
+        group = group.rename({v: v + '_' + mode_desc for v in mode_vars})
+        ds = ds.assign(group.data_vars)
 
     return ds
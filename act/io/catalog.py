@@ -0,0 +1,243 @@
+"""
+This module contains a persistent catalog of ARM-standard data files to
+allow quick lookup of files by datastream and time range without globbing
+and sorting directories on every read.
+
+"""
+
+import calendar
+import datetime as dt
+import fnmatch
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from act.io.armfiles import ARM_FILENAME_REGEX, _to_datetime64
+from act.utils.data_utils import DatastreamParserARM
+
+
+class DatastreamCatalog:
+    """
+    Class for creating, updating and querying an on-disk SQLite index of
+    ARM-standard data files. Each filename is parsed once when scanned and the
+    site, class, facility, level, date, time, size and modification time are
+    stored in the index. Scanning a directory again only parses files that were
+    added or modified, and removes files no longer on disk.
+
+    Parameters
+    ----------
+    catalog_file : str or pathlib.Path
+        Name of the SQLite file to store the catalog. Will be created if it
+        does not exist. Use ':memory:' for a catalog that is not saved to disk.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        catalog = act.io.catalog.DatastreamCatalog('/data/archive_catalog.sqlite')
+        catalog.scan('/data/archive')
+        files = catalog.query('sgpmetE13.b1', start_time='2019-01-02', end_time='2019-01-03')
+        ds = act.io.armfiles.read_netcdf(files)
+
+    """
+
+    def __init__(self, catalog_file):
+        self._catalog_file = str(catalog_file)
+        self._conn = sqlite3.connect(self._catalog_file)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, directory TEXT, datastream TEXT, site TEXT, '
+            'datastream_class TEXT, facility TEXT, level TEXT, date TEXT, time TEXT, '
+            'ext TEXT, start INTEGER, size INTEGER, mtime REAL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS datastream_start ON files (datastream, start)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS directory ON files (directory)')
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def close(self):
+        """
+        Closes the connection to the catalog file.
+
+        """
+        self._conn.close()
+
+    def scan(self, directories, pattern='*', recursive=True):
+        """
+        Scans directories for ARM-standard files and updates the catalog.
+        Only new or modified files are parsed. Files in the catalog that are
+        in a scanned directory but no longer exist are removed.
+
+        Parameters
+        ----------
+        directories : str, pathlib.Path or list
+            Directory name(s) to scan.
+        pattern : str
+            Shell syntax pattern the filenames must match to be cataloged.
+        recursive : boolean
+            Option to scan all subdirectories.
+
+        Returns
+        -------
+        counts : dict
+            Number of files added, updated and removed from the catalog.
+
+        """
+        if isinstance(directories, (str, os.PathLike)):
+            directories = [directories]
+
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        for directory in directories:
+            directory = str(Path(directory).resolve())
+            if recursive:
+                walk = os.walk(directory)
+            else:
+                walk = [(directory, None, os.listdir(directory))]
+
+            for dirpath, _, names in walk:
+                result = self._scan_directory(dirpath, names, pattern)
+                for key in counts:
+                    counts[key] += result[key]
+
+            # Remove files from subdirectories no longer existing
+            if recursive:
+                # Compare the path prefix exactly, LIKE treats _ and % as wildcards
+                prefix = directory + os.sep
+                rows = self._conn.execute(
+                    'SELECT DISTINCT directory FROM files WHERE substr(directory, 1, ?) = ?',
+                    (len(prefix), prefix),
+                ).fetchall()
+                for (dirpath,) in rows:
+                    if not Path(dirpath).is_dir():
+                        cursor = self._conn.execute('DELETE FROM files WHERE directory = ?', (dirpath,))
+                        counts['removed'] += cursor.rowcount
+
+        self._conn.commit()
+
+        return counts
+
+    def _scan_directory(self, dirpath, names, pattern):
+        """
+        Updates catalog entries for one directory.
+
+        """
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        existing = {
+            row[0]: (row[1], row[2])
+            for row in self._conn.execute(
+                'SELECT path, size, mtime FROM files WHERE directory = ?', (dirpath,)
+            )
+        }
+
+        rows = []
+        found = set()
+        for name in fnmatch.filter(names, pattern):
+            pts = re.match(ARM_FILENAME_REGEX, name)
+            if pts is None:
+                continue
+
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            found.add(path)
+            if path in existing:
+                if existing[path] == (stat.st_size, stat.st_mtime):
+                    continue
+                counts['updated'] += 1
+            else:
+                counts['added'] += 1
+
+            pts = pts.groups()
+            fn_obj = DatastreamParserARM(name)
+            start = calendar.timegm(dt.datetime.strptime(pts[2] + pts[3], '%Y%m%d%H%M%S').timetuple())
+            rows.append((
+                path, dirpath, '.'.join(pts[:2]), fn_obj.site, fn_obj.datastream_class,
+                fn_obj.facility, fn_obj.level, pts[2], pts[3], pts[4], start,
+                stat.st_size, stat.st_mtime,
+            ))
+
+        self._conn.executemany('INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+
+        removed = [(path,) for path in set(existing) - found]
+        self._conn.executemany('DELETE FROM files WHERE path = ?', removed)
+        counts['removed'] = len(removed)
+
+        return counts
+
+    def datastreams(self):
+        """
+        Returns a sorted list of datastream names in the catalog.
+
+        """
+        rows = self._conn.execute('SELECT DISTINCT datastream FROM files ORDER BY datastream')
+        return [row[0] for row in rows]
+
+    def query(self, datastream, start_time=None, end_time=None):
+        """
+        Returns a sorted list of files for a datastream possibly containing data
+        within a time range. A file is assumed to contain data from its filename
+        time up to the filename time of the next file of the same datastream.
+
+        Parameters
+        ----------
+        datastream : str
+            ARM datastream name including data level, i.e. sgpmetE13.b1
+        start_time : str, datetime.datetime, numpy.datetime64 or None
+            Start of the time range. If None no lower limit is used.
+        end_time : str, datetime.datetime, numpy.datetime64 or None
+            End of the time range. If None no upper limit is used.
+
+        Returns
+        -------
+        files : list of str
+            Full path filenames sorted by time.
+
+        """
+        sql = 'SELECT path FROM files WHERE datastream = ?'
+        params = [datastream]
+
+        if start_time is not None:
+            start_time = _seconds_since_epoch(start_time)
+            # Include the file starting before start_time that covers start_time
+            first_start = self._conn.execute(
+                'SELECT MAX(start) FROM files WHERE datastream = ? AND start <= ?',
+                (datastream, start_time),
+            ).fetchone()[0]
+            if first_start is not None:
+                start_time = first_start
+            sql += ' AND start >= ?'
+            params.append(start_time)
+
+        if end_time is not None:
+            sql += ' AND start <= ?'
+            params.append(_seconds_since_epoch(end_time))
+
+        sql += ' ORDER BY start, path'
+
+        return [row[0] for row in self._conn.execute(sql, params)]
+
+
+def _seconds_since_epoch(time):
+    """
+    Converts a user provided time to integer seconds since 1970-01-01.
+
+    """
+    return int(_to_datetime64(time).astype('datetime64[s]').astype(np.int64))
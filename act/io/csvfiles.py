@@ -3,14 +3,24 @@ This module contains I/O operations for loading csv files.
 
 """
 
+import os
 import pathlib
+import re
+import threading
 
 import pandas as pd
 
 from .armfiles import check_arm_standards
 
+# Column names and numeric data types of the columns of each file format and
+# read options so reading more files of the same format skips type inference.
+_DTYPE_SCHEMAS = {}
+_DTYPE_SCHEMAS_SIZE = 256
+_DTYPE_SCHEMAS_LOCK = threading.Lock()
 
-def read_csv(filename, sep=',', engine='python', column_names=None, skipfooter=0, ignore_index=True, **kwargs):
+
+def read_csv(filename, sep=',', engine=None, column_names=None, skipfooter=0, ignore_index=True,
+             dtype_cache=False, **kwargs):
 
     """
     Returns an `xarray.Dataset` with stored data and metadata from user-defined
@@ -22,6 +32,12 @@ def read_csv(filename, sep=',', engine='python', column_names=None, skipfooter=0
         Name of file(s) to read.
     sep : str
         The separator between columns in the csv file.
+    engine : str or None
+        The pandas parser engine. If None the C engine is used unless the
+        options need the python engine, skipfooter or a regular expression
+        separator other than \\s+. The pyarrow engine can be faster for large
+        files but infers some data types differently so is not chosen
+        automatically.
     column_names : list or None
         The list of column names in the csv file.
     verbose : bool
@@ -32,6 +48,15 @@ def read_csv(filename, sep=',', engine='python', column_names=None, skipfooter=0
          0, …, n - 1. This is useful if you are concatenating datasets where the
          concatenation axis does not have meaningful indexing information. Note
          the index values on the other axes are still respected in the join.
+    dtype_cache : bool
+        Option to remember the numeric data types of the columns of a file format,
+        identified by the file name with the digits removed and the read options.
+        The data types are kept for the Python process, so later reads of the same
+        format in any call use the data types instead of inferring them and a column
+        read as floating point is read as floating point from later files. The data
+        types are only used for files with the same column names, and if they do
+        not fit a file the file is read again with inference. Not used when dtype is
+        set or with the pyarrow engine.
 
     Additional keyword arguments will be passed into pandas.read_csv.
 
@@ -61,11 +86,41 @@ def read_csv(filename, sep=',', engine='python', column_names=None, skipfooter=0
 
     # Read data using pandas read_csv one file at a time and append to
     # list. Then concatinate the list into one pandas dataframe.
+    if engine is None:
+        engine = _csv_engine(sep, skipfooter, kwargs)
+
     li = []
     for fl in filename:
-        df = pd.read_csv(
-            fl, sep=sep, names=column_names, skipfooter=skipfooter, engine=engine, **kwargs
-        )
+        kwargs_fl = dict(sep=sep, names=column_names, skipfooter=skipfooter, engine=engine, **kwargs)
+        key = None
+        if dtype_cache and 'dtype' not in kwargs and engine != 'pyarrow':
+            key = _dtype_schema_key(fl, kwargs_fl)
+
+        df = None
+        schema = _DTYPE_SCHEMAS.get(key) if key is not None else None
+        if schema is not None:
+            try:
+                # Only use the data types for a file with the same columns
+                header_kwargs = dict(kwargs_fl, skipfooter=0)
+                columns = tuple(pd.read_csv(fl, nrows=0, **header_kwargs).columns)
+                if columns == schema[0]:
+                    df = pd.read_csv(fl, dtype=schema[1], **kwargs_fl)
+            except (ValueError, TypeError, OverflowError):
+                df = None
+        if df is None:
+            df = pd.read_csv(fl, **kwargs_fl)
+
+        if key is not None:
+            schema = (
+                tuple(df.columns),
+                {name: dtype for name, dtype in df.dtypes.items() if dtype.kind in 'biuf'},
+            )
+            # Keep the most recently used formats
+            with _DTYPE_SCHEMAS_LOCK:
+                _DTYPE_SCHEMAS.pop(key, None)
+                if len(_DTYPE_SCHEMAS) >= _DTYPE_SCHEMAS_SIZE:
+                    del _DTYPE_SCHEMAS[next(iter(_DTYPE_SCHEMAS))]
+                _DTYPE_SCHEMAS[key] = schema
         li.append(df)
 
     if len(li) == 1:
@@ -103,3 +158,29 @@ def read_csv(filename, sep=',', engine='python', column_names=None, skipfooter=0
     ds.attrs['_arm_standards_flag'] = is_arm_file_flag
 
     return ds
+
+
+def _csv_engine(sep, skipfooter, kwargs):
+    """
+    Returns the C pandas parser engine unless the read_csv options are only
+    supported by the python engine.
+
+    """
+    delimiter = kwargs.get('delimiter', sep)
+    if skipfooter > 0 or delimiter is None or (len(delimiter) > 1 and delimiter != r'\s+'):
+        return 'python'
+
+    return 'c'
+
+
+def _dtype_schema_key(filename, kwargs):
+    """
+    Returns the data type cache key of a file from the file name with digits
+    removed and the read options. Returns None for objects that are not file names.
+
+    """
+    if not isinstance(filename, str):
+        return None
+
+    file_format = re.sub(r'\d+', '#', os.path.basename(filename))
+    return file_format, repr(sorted(kwargs.items()))
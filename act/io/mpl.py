@@ -3,19 +3,21 @@ This module contains I/O operations for loading MPL files.
 
 """
 
+import datetime as dt
 import os
-import shutil
-import subprocess
-import tempfile
 
 import dask
+import numpy as np
+import pandas as pd
 import xarray as xr
 
 from act.io.armfiles import check_arm_standards
 
-if shutil.which('mpl2nc') is not None:
+try:
+    import mpl2nc
+
     MPLIMPORT = True
-else:
+except ImportError:
     MPLIMPORT = False
 
 
@@ -26,12 +28,17 @@ def read_sigma_mplv5(
     afterpulse=None,
     dead_time=None,
     overlap=None,
+    parallel=True,
+    num_workers=None,
+    scheduler='threads',
     **kwargs,
 ):
     """
     Returns `xarray.Dataset` with stored data and metadata from a user-defined
-    SIGMA MPL V5 files. File is converted to netCDF using mpl2nc an optional
-    dependency.
+    SIGMA MPL V5 files. The binary records are decoded in memory using the
+    optional dependency mpl2nc for the record layout, metadata and normalized
+    relative backscatter calculation. Multiple files are decoded in parallel
+    and concatenated along time in one step.
 
     Parameters
     ----------
@@ -39,17 +46,27 @@ def read_sigma_mplv5(
         Name of file(s) to read.  If multiple, ensure that they are sorted,
         otherwise they will not concat properly
     save_nc : bool
-        Whether or not to save intermediate step nc file.
+        Whether or not to save the netCDF file written by mpl2nc for each file.
     out_nc_path : str
-        Path to save intermediate step nc file.
+        Path to save the netCDF file. If a directory, one file per input file
+        is saved in the directory with the input file name and .nc extension.
     afterpulse : str
         File with afterpulse correction (.bin)
     dead_time : str
-        File with dead time correction (.bin)
+        File with dead time correction (.bin or .csv)
     overlap : str
         File with overlap correction (.bin)
+    parallel : boolean
+        Option to decode multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
+        The 'processes' scheduler decodes files in a pool of processes and
+        must be called from a script with a ``if __name__ == '__main__':`` guard.
     **kwargs : keywords
-        Keywords to pass through to xarray.open_dataset().
+        Keywords to pass through to xarray.decode_cf().
 
     """
     if not MPLIMPORT:
@@ -59,24 +76,37 @@ def read_sigma_mplv5(
 
     if isinstance(filename, str):
         filename = [filename]
+    filename = [str(f) for f in filename]
+
+    if save_nc and out_nc_path is None:
+        raise ValueError('You are using save_nc, please specify ' 'an out_nc_path')
 
-    task = []
+    corrections = _read_mpl_corrections(afterpulse=afterpulse, dead_time=dead_time, overlap=overlap)
+
+    # Decode each file to arrays in a worker. Only the arrays are returned to
+    # this process so no intermediate files are needed.
+    dask_config = {'scheduler': scheduler if parallel and len(filename) > 1 else 'synchronous'}
+    if parallel and num_workers is not None:
+        dask_config['num_workers'] = num_workers
+    tasks = []
     for f in filename:
-        task.append(
-            dask.delayed(proc_sigma_mplv5_read)(
-                f,
-                save_nc=save_nc,
-                out_nc_path=out_nc_path,
-                afterpulse=afterpulse,
-                dead_time=dead_time,
-                overlap=overlap,
-                **kwargs,
-            )
-        )
+        nc_file = _mpl_nc_filename(f, out_nc_path) if save_nc else None
+        tasks.append(dask.delayed(_decode_sigma_mplv5)(f, corrections, nc_file))
+    with dask.config.set(dask_config):
+        results = dask.compute(*tasks)
 
-    results_ds = dask.compute(*task)
+    datastream_name = '.'.join(filename[0].split('/')[-1].split('.')[0:2])
 
-    ds = xr.concat(results_ds, 'time')
+    # Files with the same range gates are concatenated into preallocated
+    # arrays, otherwise the files are concatenated with an outer join on range.
+    if all(_mpl_same_range(results[0], d) for d in results[1:]):
+        ds = _mpl_to_dataset(results, datastream_name, **kwargs)
+    else:
+        datasets = [
+            _mpl_to_dataset([d], '.'.join(f.split('/')[-1].split('.')[0:2]), **kwargs)
+            for f, d in zip(filename, results)
+        ]
+        ds = xr.concat(datasets, 'time')
 
     return ds
 
@@ -86,67 +116,224 @@ def proc_sigma_mplv5_read(
 ):
     """
     Returns `xarray.Dataset` with stored data and metadata from a user-defined
-    SIGMA MPL V5 files. File is converted to netCDF using mpl2nc an optional
-    dependency.  Dask sub-routine for processing
+    SIGMA MPL V5 file. The binary records are decoded in memory using the
+    optional dependency mpl2nc for the record layout and metadata.
 
     Parameters
     ----------
     filename : str
         Name of file to read.
     save_nc : bool
-        Whether or not to save intermediate step nc file.
+        Whether or not to save the netCDF file written by mpl2nc.
     out_nc_path : str
-        Path to save intermediate step nc file.
+        Path to save the netCDF file.
     afterpulse : str
         File with afterpulse correction (.bin)
     dead_time : str
-        File with dead time correction (.bin)
+        File with dead time correction (.bin or .csv)
     overlap : str
         File with overlap correction (.bin)
     **kwargs : keywords
-        Keywords to pass through to xarray.open_dataset().
+        Keywords to pass through to xarray.decode_cf().
 
     """
+    if not MPLIMPORT:
+        raise ImportError(
+            'The module mpl2nc is not installed and is needed to read ' 'mpl binary files!'
+        )
+
+    if save_nc and out_nc_path is None:
+        raise ValueError('You are using save_nc, please specify ' 'an out_nc_path')
 
+    f = str(f)
+    corrections = _read_mpl_corrections(afterpulse=afterpulse, dead_time=dead_time, overlap=overlap)
+    d = _decode_sigma_mplv5(f, corrections, _mpl_nc_filename(f, out_nc_path) if save_nc else None)
     datastream_name = '.'.join(f.split('/')[-1].split('.')[0:2])
-    if '.bin' not in f:
-        mpl = True
-        tmpfile1 = tempfile.mkstemp(suffix='.bin', dir='.')[1]
-        shutil.copyfile(f, tmpfile1)
-        f = tmpfile1
-    else:
-        mpl = False
 
-    # Set up call for mpl2nc to add in correction files
-    call = 'mpl2nc'
+    return _mpl_to_dataset([d], datastream_name, **kwargs)
+
+
+def _read_mpl_corrections(afterpulse=None, dead_time=None, overlap=None):
+    """
+    Returns dictionary of the afterpulse, dead time and overlap correction
+    arrays read with mpl2nc.
+
+    """
+    corrections = {}
     if afterpulse is not None:
-        call += ' -a ' + afterpulse
-    if dead_time is not None:
-        call += ' -d ' + dead_time
+        with open(afterpulse, 'rb') as fh:
+            corrections.update(mpl2nc.read_afterpulse(fh))
     if overlap is not None:
-        call += ' -o ' + overlap
+        with open(overlap, 'rb') as fh:
+            corrections.update(mpl2nc.read_overlap(fh))
+    if dead_time is not None:
+        if str(dead_time).endswith('.csv'):
+            corrections.update(mpl2nc.read_dt_csv(dead_time))
+        else:
+            with open(dead_time, 'rb') as fh:
+                corrections.update(mpl2nc.read_dt(fh))
 
-    call += ' ' + f
+    return corrections
 
-    # Specify the output, will use a temporary file if no output specified
-    if save_nc:
-        if out_nc_path is None:
-            raise ValueError('You are using save_nc, please specify ' 'an out_nc_path')
 
-        subprocess.call(call + ' ' + out_nc_path, shell=True)
-        ds = xr.open_dataset(out_nc_path, **kwargs)
-    else:
-        tmpfile2 = tempfile.mkstemp(suffix='.nc', dir='.')[1]
-        subprocess.call(call + ' ' + tmpfile2, shell=True)
-        ds = xr.open_dataset(tmpfile2, **kwargs)
-        os.remove(tmpfile2)
+def _mpl_nc_filename(filename, out_nc_path):
+    """
+    Returns the netCDF file name to save a decoded MPL file to.
+
+    """
+    if os.path.isdir(out_nc_path):
+        name = os.path.splitext(os.path.basename(filename))[0] + '.nc'
+        return os.path.join(out_nc_path, name)
+
+    return out_nc_path
+
+
+def _mpl_header_dtype():
+    """
+    Returns the numpy structured data type of the little endian MPL record header.
+
+    """
+    return np.dtype([(x[0], np.dtype(x[1]).newbyteorder('<')) for x in mpl2nc.HEADER_MPL])
+
+
+def _decode_sigma_mplv5(filename, corrections, nc_file=None):
+    """
+    Returns dictionary of arrays decoded from the records of a SIGMA MPL V5
+    file in the layout returned by mpl2nc with the normalized relative
+    backscatter added. If nc_file is set the arrays are also written to the
+    netCDF file with mpl2nc.
+
+    """
+    with open(filename, 'rb') as fh:
+        buf = fh.read()
+
+    header_dtype = _mpl_header_dtype()
+    if len(buf) < header_dtype.itemsize:
+        raise IOError(f'{filename} does not contain a complete MPL record')
+
+    # Records have a fixed size when the number of bins does not change, so the
+    # whole file is decoded with a single structured view of the buffer.
+    number_bins = int(np.frombuffer(buf, dtype=header_dtype, count=1)['number_bins'][0])
+    record_dtype = np.dtype(header_dtype.descr + [
+        ('channel_1', '<f4', (number_bins,)),
+        ('channel_2', '<f4', (number_bins,)),
+    ])
+    records = None
+    if len(buf) % record_dtype.itemsize == 0:
+        records = np.frombuffer(buf, dtype=record_dtype)
+        if np.any(records['number_bins'] != number_bins):
+            records = None
+
+    if records is None:
+        records = _decode_mpl_records(buf, header_dtype, number_bins)
+
+    d = {}
+    for k in mpl2nc.FIELDS:
+        d[k] = records[k].astype(mpl2nc.HEADER_TYPES[k])
+    d['channel_1'] = records['channel_1'].astype(np.float32)
+    d['channel_2'] = records['channel_2'].astype(np.float32)
+
+    time = pd.to_datetime(pd.DataFrame({
+        'year': records['year'], 'month': records['month'], 'day': records['day'],
+        'hour': records['hours'], 'minute': records['minutes'], 'second': records['seconds']
+    })).values.astype('datetime64[s]')
+    d['time_utc'] = np.datetime_as_string(time, unit='s')
+    d['time'] = time.astype(np.int64).astype(np.uint64)
+    d['c'] = mpl2nc.C
+
+    d.update(corrections)
+    mpl2nc.process_nrb(d)
+
+    if nc_file is not None:
+        mpl2nc.write(d, nc_file)
+
+    return d
+
+
+def _decode_mpl_records(buf, header_dtype, number_bins):
+    """
+    Returns structured array of MPL records decoded one record at a time for
+    files with records of different sizes.
+
+    """
+    records = []
+    offset = 0
+    while offset < len(buf):
+        if len(buf) - offset < header_dtype.itemsize:
+            raise IOError('incomplete header')
+        header = np.frombuffer(buf, dtype=header_dtype, count=1, offset=offset)
+        n = int(header['number_bins'][0])
+        if n != number_bins:
+            raise ValueError('MPL records with different number of bins can not be read')
+        record_dtype = np.dtype(header_dtype.descr + [
+            ('channel_1', '<f4', (n,)),
+            ('channel_2', '<f4', (n,)),
+        ])
+        if len(buf) - offset < record_dtype.itemsize:
+            raise IOError('incomplete channel data')
+        records.append(np.frombuffer(buf, dtype=record_dtype, count=1, offset=offset))
+        offset += record_dtype.itemsize
+
+    return np.concatenate(records)
+
+
+def _mpl_same_range(d1, d2):
+    """
+    Returns True if two decoded MPL files have the same range gates.
+
+    """
+    return (
+        d1['channel_1'].shape[1] == d2['channel_1'].shape[1]
+        and d1['bin_time'][0] == d2['bin_time'][0]
+    )
+
+
+def _mpl_to_dataset(results, datastream_name, **kwargs):
+    """
+    Returns `xarray.Dataset` of decoded MPL files with the same range gates.
+    The profile variables of all files are copied into one preallocated array
+    each and decoded with the netCDF conventions used by mpl2nc.
+
+    """
+    d = results[0]
+    ntime = sum(r['time'].size for r in results)
+    ds = xr.Dataset()
+    for k, value in d.items():
+        header = mpl2nc.NC_HEADER[k]
+        dims = ['time' if dim == 'profile' else dim for dim in header['dims']]
+        if 'time' in dims:
+            data = np.empty((ntime,) + value.shape[1:], dtype=value.dtype)
+            start = 0
+            for r in results:
+                data[start:start + r[k].shape[0]] = r[k]
+                start += r[k].shape[0]
+        else:
+            data = np.asarray(value, dtype=header['dtype'])
+
+        attrs = {}
+        for attr in ['units', 'long_name', 'comment']:
+            if header[attr] is not None:
+                attrs[attr] = header[attr]
+        if k == 'time_utc':
+            data = data.astype(object)
+        else:
+            attrs['_FillValue'] = mpl2nc.FILL_VALUE[header['dtype']]
+        ds[k] = xr.DataArray(data, dims=dims, attrs=attrs)
+
+    ds = xr.decode_cf(ds, **kwargs)
+    ds.attrs['created'] = dt.datetime.now(dt.timezone.utc).strftime('%Y-%m-%dT:%H:%M:%SZ')
+    ds.attrs['software'] = 'mpl2nc (https://github.com/peterkuma/mpl2nc)'
+    ds.attrs['version'] = mpl2nc.__version__
 
     # Calculate range in meters
-    ds['range'] = 0.5 * ds.bin_time[0] * ds.c * (ds.range + 0.5)
+    gates = xr.DataArray(np.arange(ds.channel_1.shape[1]), dims='range')
+    ds['range'] = 0.5 * ds.bin_time[0] * ds.c * (gates + 0.5)
 
-    # Swap the coordinates to be time and range
-    ds = ds.swap_dims({'profile': 'time'})
-    ds = ds.assign_coords({'time': ds.time, 'range': ds.range})
+    # Variables without a time dimension are repeated along time for
+    # consistency with concatenating the files along time
+    for var_name in list(ds.data_vars):
+        if 'time' not in ds[var_name].dims:
+            ds[var_name] = ds[var_name].expand_dims(time=ntime)
 
     # Add metadata
     is_arm_file_flag = check_arm_standards(ds)
@@ -154,7 +341,4 @@ def proc_sigma_mplv5_read(
         ds.attrs['_datastream'] = datastream_name
     ds.attrs['_arm_standards_flag'] = is_arm_file_flag
 
-    if mpl:
-        os.remove(tmpfile1)
-
     return ds
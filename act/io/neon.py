@@ -2,18 +2,29 @@
 Modules for reading in NOAA PSL data.
 """
 
+import dask
 import pandas as pd
 import xarray as xr
-import datetime as dt
 import numpy as np
 from act.io.csvfiles import read_csv
 
+# Sensor position columns added as variables
+_POSITION_VARIABLES = ['xOffset', 'yOffset', 'zOffset', 'eastOffset', 'northOffset',
+                       'pitch', 'roll', 'azimuth', 'xAzimuth', 'yAzimuth']
 
-def read_neon_csv(files, variable_files=None, position_files=None):
+
+def read_neon_csv(files, variable_files=None, position_files=None, parallel=True,
+                  num_workers=None, scheduler='threads'):
     """
     Reads in the NEON formatted csv files from local paths or urls
     and returns an Xarray dataset.
 
+    Files from the same sensor position (HOR.VER) are concatenated along time.
+    If the files are from more than one sensor position the positions are
+    concatenated along a position dimension with the HOR.VER names as the
+    coordinate values, and the sensor position variables have the position
+    dimension.
+
     Parameters
     ----------
     filepath : list
@@ -24,6 +35,13 @@ def read_neon_csv(files, variable_files=None, position_files=None):
     position_files : list
         Name of file to read with sensor positions.  Optional, but the Dataset will not
         have any location information
+    parallel : boolean
+        Option to read multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
 
     Return
     ------
@@ -38,59 +56,98 @@ def read_neon_csv(files, variable_files=None, position_files=None):
     if isinstance(files, str):
         files = [files]
 
-    # Read in optional files
-    multi_ds = []
+    # Read in optional files and index the metadata once by table and
+    # field name, and by sensor position.
+    variable_attrs = {}
     if variable_files is not None:
         if isinstance(variable_files, str):
             variable_files = [variable_files]
         df = pd.read_csv(variable_files[0])
+        for table, field, units, description, pub_format in zip(
+                df['table'], df['fieldName'], df['units'], df['description'], df['pubFormat']):
+            variable_attrs[(table, field)] = {
+                'units': str(units), 'long_name': str(description), 'format': str(pub_format)}
 
+    loc_df = None
     if position_files is not None:
         if isinstance(position_files, str):
             position_files = [position_files]
         loc_df = pd.read_csv(position_files[0], dtype=str)
+        loc_df = loc_df.drop_duplicates('HOR.VER', keep='last').set_index('HOR.VER')
 
-    # Run through each file and read into a dataset
-    for i, f in enumerate(files):
-        ds = read_csv(f)
-        # Create standard time variable
-        time = [pd.to_datetime(t).replace(tzinfo=None) for t in ds['startDateTime'].values]
-        ds['time'] = xr.DataArray(data=time, dims=['index'])
-        ds['time'].attrs['units'] = ''
-        ds = ds.swap_dims({'index': 'time'})
-        ds = ds.drop_vars('index')
-
-        # Add some metadata
-        site_code = f.split('/')[-1].split('.')[2]
-        resolution = f.split('/')[-1].split('.')[9]
-        hor_loc = f.split('/')[-1].split('.')[6]
-        ver_loc = f.split('/')[-1].split('.')[7]
-        ds.attrs['_sites'] = site_code
-        ds.attrs['averaging_interval'] = resolution.split('_')[-1]
-        ds.attrs['HOR.VER'] = hor_loc + '.' + ver_loc
-
-        # Add in metadata from the variables file
-        if variable_files is not None:
-            for v in ds:
-                dummy = df.loc[(df['table'] == resolution) & (df['fieldName'] == v)]
-                ds[v].attrs['units'] = str(dummy['units'].values[0])
-                ds[v].attrs['long_name'] = str(dummy['description'].values[0])
-                ds[v].attrs['format'] = str(dummy['pubFormat'].values[0])
+    # Read each file into a dataset
+    dask_config = {'scheduler': scheduler if parallel else 'synchronous'}
+    if parallel and num_workers is not None:
+        dask_config['num_workers'] = num_workers
+    tasks = [dask.delayed(_read_neon_file)(str(f), variable_attrs) for f in files]
+    with dask.config.set(dask_config):
+        datasets = dask.compute(*tasks)
+
+    # Concatenate the files of each sensor position along time
+    positions = {}
+    for ds in datasets:
+        positions.setdefault(ds.attrs['HOR.VER'], []).append(ds)
+
+    multi_ds = []
+    for hor_ver, position_datasets in positions.items():
+        ds = position_datasets[0]
+        if len(position_datasets) > 1:
+            ds = xr.concat(position_datasets, dim='time', join='outer', combine_attrs='override')
+            # Sort and remove times repeated in more than one file
+            _, index = np.unique(ds['time'].values, return_index=True)
+            if index.size != ds['time'].size or not np.all(np.diff(index) > 0):
+                ds = ds.isel(time=index)
 
         # Add in sensor position data
-        if position_files is not None:
-            dloc = loc_df.loc[loc_df['HOR.VER'] == hor_loc + '.' + ver_loc]
-            idx = dloc.index.values
-            if len(idx) > 0:
-                ds['lat'] = xr.DataArray(data=float(loc_df['referenceLatitude'].values[idx]))
-                ds['lon'] = xr.DataArray(data=float(loc_df['referenceLongitude'].values[idx]))
-                ds['alt'] = xr.DataArray(data=float(loc_df['referenceElevation'].values[idx]))
-                variables = ['xOffset', 'yOffset', 'zOffset', 'eastOffset', 'northOffset',
-                             'pitch', 'roll', 'azimuth', 'xAzimuth', 'yAzimuth']
-                for v in variables:
-                    ds[v] = xr.DataArray(data=float(loc_df[v].values[idx]))
+        if loc_df is not None and hor_ver in loc_df.index:
+            location = loc_df.loc[hor_ver]
+            ds['lat'] = xr.DataArray(data=float(location['referenceLatitude']))
+            ds['lon'] = xr.DataArray(data=float(location['referenceLongitude']))
+            ds['alt'] = xr.DataArray(data=float(location['referenceElevation']))
+            for v in _POSITION_VARIABLES:
+                ds[v] = xr.DataArray(data=float(location[v]))
         multi_ds.append(ds)
 
-    ds = xr.merge(multi_ds)
+    if len(multi_ds) == 1:
+        return multi_ds[0]
+
+    position = pd.Index(list(positions.keys()), name='position')
+    ds = xr.concat(multi_ds, dim=position, join='outer', combine_attrs='override')
+    ds['position'].attrs['long_name'] = 'Sensor position HOR.VER'
+    del ds.attrs['HOR.VER']
+
+    return ds
+
+
+def _read_neon_file(filename, variable_attrs):
+    """
+    Returns `xarray.Dataset` of one NEON csv file with a time dimension and the
+    variable metadata in variable_attrs.
+
+    """
+    ds = read_csv(filename)
+
+    # Create standard time variable
+    time = pd.to_datetime(ds['startDateTime'].values, utc=True).tz_localize(None)
+    ds['time'] = xr.DataArray(data=time.values, dims=['index'])
+    ds['time'].attrs['units'] = ''
+    ds = ds.swap_dims({'index': 'time'})
+    ds = ds.drop_vars('index')
+
+    # Add some metadata
+    name = filename.split('/')[-1].split('.')
+    site_code = name[2]
+    resolution = name[9]
+    hor_loc = name[6]
+    ver_loc = name[7]
+    ds.attrs['_sites'] = site_code
+    ds.attrs['averaging_interval'] = resolution.split('_')[-1]
+    ds.attrs['HOR.VER'] = hor_loc + '.' + ver_loc
+
+    # Add in metadata from the variables file
+    for v in ds.data_vars:
+        attrs = variable_attrs.get((resolution, v))
+        if attrs is not None:
+            ds[v].attrs.update(attrs)
 
     return ds
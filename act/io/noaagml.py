@@ -2,16 +2,321 @@
 Modules for reading in NOAA GML data
 
 """
+import contextlib
+import hashlib
+import json
+import os
 import re
-from datetime import datetime
+import threading
 from pathlib import Path
 
+import dask
 import pandas as pd
 import numpy as np
 import xarray as xr
 
 import act
 
+try:
+    import fcntl
+    _FCNTL_AVAILABLE = True
+except ImportError:
+    _FCNTL_AVAILABLE = False
+
+_CACHE_LOCK = threading.Lock()
+
+
+def _assemble_time(year, month=None, day=None, hour=None, minute=None, second=None, day_of_year=None):
+    """
+    Returns datetime64[ns] times from columns of date and time fields using integer
+    arithmetic on all rows at once. Fields not provided default to the start of the
+    period. day_of_year is used in place of month and day if provided.
+
+    Parameters
+    ----------
+    year : array-like
+        Year values.
+    month, day, hour, minute : array-like or None
+        Month (1-12), day of month, hour and minute values.
+    second : array-like or None
+        Second values. May be fractional.
+    day_of_year : array-like or None
+        Day of year values starting at 1.
+
+    Returns
+    -------
+    time : numpy.ndarray
+        Times as datetime64[ns].
+
+    """
+    def _field(values, name, low, high):
+        values = np.asarray(values)
+        if values.dtype.kind == 'f':
+            if not np.all(values == np.floor(values)):
+                raise ValueError(f'{name} values must be whole numbers.')
+        values = values.astype(np.int64)
+        if values.size > 0 and (values.min() < low or values.max() > high):
+            raise ValueError(f'{name} values must be in {low}..{high}.')
+        return values
+
+    years = np.asarray(year).astype(np.int64) - 1970
+    if day_of_year is not None:
+        day_of_year = _field(day_of_year, 'day_of_year', 1, 366)
+        start = years.astype('datetime64[Y]').astype('datetime64[D]')
+        days = start + (day_of_year - 1)
+        if np.any(days.astype('datetime64[Y]') != years.astype('datetime64[Y]')):
+            raise ValueError('day_of_year values must be in the year.')
+    else:
+        months = years * 12
+        if month is not None:
+            months = months + _field(month, 'month', 1, 12) - 1
+        start = months.astype('datetime64[M]')
+        days = start.astype('datetime64[D]')
+        if day is not None:
+            day = _field(day, 'day', 1, 31)
+            month_length = ((start + 1).astype('datetime64[D]') - days).astype(np.int64)
+            if np.any(day > month_length):
+                raise ValueError('day values must be in the month.')
+            days = days + (day - 1)
+
+    nanoseconds = days.astype('datetime64[ns]').astype(np.int64)
+    if hour is not None:
+        nanoseconds = nanoseconds + _field(hour, 'hour', 0, 23) * 3600 * 10**9
+    if minute is not None:
+        nanoseconds = nanoseconds + _field(minute, 'minute', 0, 59) * 60 * 10**9
+    if second is not None:
+        second = np.asarray(second)
+        if second.size > 0 and (second.min() < 0 or second.max() >= 60):
+            raise ValueError('second values must be in 0..59.')
+        nanoseconds = nanoseconds + np.round(second * 10**9).astype(np.int64)
+
+    return nanoseconds.astype('datetime64[ns]')
+
+
+def _read_gml_files(filename, column_names, parallel=True, num_workers=None, scheduler='threads',
+                    cache_dir=None, cache_key=None, **kwargs):
+    """
+    Returns Xarray Dataset of the columns in whitespace delimited GML text files.
+    Files are parsed concurrently, the output arrays are allocated once from the row
+    counts of all files and filled in place. If cache_dir is set, the parsed columns
+    of each file are saved to one netCDF file for files with the same cache_key
+    (station and year) and parse keywords. A file is read from the cache when it is
+    read again unmodified, files not in the cache are added to it.
+
+    Parameters
+    ----------
+    filename : str, pathlib.Path or list
+        Name of file(s) to read.
+    column_names : list of str
+        Names of the columns in the files.
+    parallel : boolean
+        Option to parse the files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
+    cache_dir : str, pathlib.Path or None
+        Directory to save the cached netCDF files.
+    cache_key : function or None
+        Function returning the cache file name for a file name, or None to not cache
+        the file.
+    **kwargs : keywords
+        Keywords to pass through to pandas.read_csv().
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        Dataset of the columns with index dimension, in the same form as returned by
+        act.io.csvfiles.read_csv().
+
+    """
+    if isinstance(filename, (str, os.PathLike)):
+        filename = [filename]
+    filenames = [str(ii) for ii in filename]
+
+    # Group files by cache file. The parse keywords change the parsed values so
+    # are part of the cache file name.
+    groups = {}
+    if cache_dir is not None and cache_key is not None:
+        keywords = json.dumps([column_names, kwargs], sort_keys=True, default=repr)
+        keywords = hashlib.sha256(keywords.encode()).hexdigest()[:16]
+        for fl in filenames:
+            key = cache_key(Path(fl).name)
+            if key is not None:
+                groups.setdefault(str(Path(cache_dir, f'{key}.{keywords}.nc')), []).append(fl)
+
+    parsed = {}
+    file_signatures = {}
+    for cache_file, files in groups.items():
+        signatures = _file_signatures(files)
+        file_signatures.update(zip(files, signatures))
+        entries = _read_gml_cache(cache_file, column_names, signatures)
+        for fl, signature in zip(files, signatures):
+            if signature[0] in entries:
+                parsed[fl] = entries[signature[0]][1]
+
+    dask_config = {'scheduler': scheduler if parallel else 'synchronous'}
+    if parallel and num_workers is not None:
+        dask_config['num_workers'] = num_workers
+    to_parse = [fl for fl in dict.fromkeys(filenames) if fl not in parsed]
+    tasks = [dask.delayed(_parse_gml_file)(fl, column_names, **kwargs) for fl in to_parse]
+    with dask.config.set(dask_config):
+        parsed.update(zip(to_parse, dask.compute(*tasks)))
+
+    for cache_file, files in groups.items():
+        new_files = [fl for fl in dict.fromkeys(files) if fl in to_parse]
+        if len(new_files) > 0:
+            _write_gml_cache(cache_file, column_names, [file_signatures[fl] for fl in new_files],
+                             [parsed[fl] for fl in new_files])
+
+    ds = _columns_to_dataset([parsed[fl] for fl in filenames], column_names)
+
+    # Set the same attributes as act.io.csvfiles.read_csv()
+    is_arm_file_flag = act.io.armfiles.check_arm_standards(ds)
+    if is_arm_file_flag == 0:
+        ds.attrs['_datastream'] = '.'.join(filenames[0].split('/')[-1].split('.')[0:2])
+    ds.attrs['_site'] = str(ds.attrs['_datastream'])[0:3]
+    ds.attrs['_arm_standards_flag'] = is_arm_file_flag
+
+    return ds
+
+
+def _read_gml_cache(cache_file, column_names, signatures=None):
+    """
+    Returns dictionary of source file name and list of file signature and dictionary
+    of column arrays saved in a GML cache file. If signatures is set only the files
+    with a matching signature are read.
+
+    """
+    entries = {}
+    try:
+        with xr.open_dataset(cache_file) as cache_ds:
+            start = 0
+            for source in json.loads(cache_ds.attrs['_source_files']):
+                signature, size = source[:3], source[3]
+                if signatures is None or signature in signatures:
+                    entries[signature[0]] = [
+                        signature,
+                        {name: cache_ds[name][start:start + size].values for name in column_names},
+                    ]
+                start += size
+    except (OSError, KeyError, ValueError):
+        return {}
+
+    return entries
+
+
+def _write_gml_cache(cache_file, column_names, signatures, parts):
+    """
+    Adds the parsed columns of files with the file signatures to a GML cache file. The files already in the
+    cache file are read again while holding the lock so files added by other
+    processes are kept.
+
+    """
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    with _cache_file_lock(cache_file):
+        entries = _read_gml_cache(cache_file, column_names)
+        for signature, part in zip(signatures, parts):
+            entries[signature[0]] = [signature, part]
+
+        entries = list(entries.values())
+        cache_ds = _columns_to_dataset([part for _, part in entries], column_names)
+        cache_ds.attrs['_source_files'] = json.dumps(
+            [signature + [part[column_names[0]].size] for signature, part in entries])
+        # Write to temporary file and rename so other processes never read a partial file
+        temp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+        cache_ds.to_netcdf(temp_file)
+        os.replace(temp_file, cache_file)
+
+
+@contextlib.contextmanager
+def _cache_file_lock(cache_file):
+    """
+    Context manager holding an exclusive lock on a cache file for the threads of
+    this process and, where fcntl is available, for other processes.
+
+    """
+    with _CACHE_LOCK:
+        if not _FCNTL_AVAILABLE:
+            yield
+            return
+
+        with open(cache_file + '.lock', 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _parse_gml_file(filename, column_names, **kwargs):
+    """
+    Returns a dictionary of column name and numpy array of one GML text file.
+
+    """
+    df = pd.read_csv(filename, sep=r'\s+', header=None, names=column_names, engine='c', **kwargs)
+
+    return {name: df[name].to_numpy() for name in column_names}
+
+
+def _columns_to_dataset(parts, column_names):
+    """
+    Returns Xarray Dataset of columns concatenated from a list of dictionaries of
+    column arrays. Each output array is allocated once and filled in place.
+
+    """
+    sizes = [part[column_names[0]].size for part in parts]
+    total = int(np.sum(sizes))
+    starts = np.cumsum([0] + sizes)
+
+    data_vars = {}
+    for name in column_names:
+        values = np.empty(total, dtype=np.result_type(*[part[name].dtype for part in parts]))
+        for ii, part in enumerate(parts):
+            values[starts[ii]:starts[ii + 1]] = part[name]
+        data_vars[name] = ('index', values)
+
+    return xr.Dataset(data_vars, coords={'index': np.arange(total)})
+
+
+def _file_signatures(filenames):
+    """
+    Returns list of file name, size and modification time used to check a cache is current.
+
+    """
+    signatures = []
+    for fl in filenames:
+        stat = os.stat(fl)
+        signatures.append([str(Path(fl).resolve()), stat.st_size, stat.st_mtime])
+
+    return signatures
+
+
+def _radiation_cache_key(name):
+    """
+    Returns the station-year cache name for a GML radiation file name like brw21001.dat.
+
+    """
+    match = re.match(r'^([a-z]{3})(\d{2})\d{3}\.dat$', name)
+    if match is None:
+        return None
+
+    return f'gml_radiation_{match.group(1)}_20{match.group(2)}'
+
+
+def _met_cache_key(name):
+    """
+    Returns the station-year cache name for a GML met file name like
+    met_brw_insitu_1_obop_hour_2020.txt.
+
+    """
+    match = re.match(r'^met_([a-z]{3})_.*_(minute|hour)_(\d{4})', name)
+    if match is None:
+        return None
+
+    return f'gml_met_{match.group(1)}_{match.group(2)}_{match.group(3)}'
+
 
 def read_gml(filename, datatype=None, remove_time_vars=True, convert_missing=True, **kwargs):
     """
@@ -258,34 +563,11 @@ def read_gml_halo(filename, **kwargs):
         elif var_name.endswith('min'):
             min_name = var_name
 
-    timestamp = np.full(ds[var_names[0]].size, np.nan, dtype="datetime64[ns]")
-    for ii in range(0, len(timestamp)):
-        if min_name is not None:
-            ts = datetime(
-                ds[year_name].values[ii],
-                ds[month_name].values[ii],
-                ds[day_name].values[ii],
-                ds[hour_name].values[ii],
-                ds[min_name].values[ii],
-            )
-        elif hour_name is not None:
-            ts = datetime(
-                ds[year_name].values[ii],
-                ds[month_name].values[ii],
-                ds[day_name].values[ii],
-                ds[hour_name].values[ii],
-            )
-        elif day_name is not None:
-            ts = datetime(
-                ds[year_name].values[ii],
-                ds[month_name].values[ii],
-                ds[day_name].values[ii],
-            )
-        else:
-            ts = datetime(
-                ds[year_name].values[ii], ds[month_name].values[ii], 1)
-
-        timestamp[ii] = np.datetime64(ts, "ns")
+    fields = {}
+    for key, var_name in zip(['month', 'day', 'hour', 'minute'], [month_name, day_name, hour_name, min_name]):
+        if var_name is not None:
+            fields[key] = ds[var_name].values
+    timestamp = _assemble_time(ds[year_name].values, **fields)
 
     for var_name in [year_name, month_name, day_name, hour_name, min_name]:
         try:
@@ -421,17 +703,9 @@ def read_gml_co2(filename=None, convert_missing=True, **kwargs):
     ds = act.io.csvfiles.read_csv(
         filename, sep=r'\s+', skiprows=skiprows, **kwargs)
 
-    timestamp = np.full(ds['year'].size, np.nan, dtype="datetime64[ns]")
-    for ii in range(0, len(timestamp)):
-        ts = datetime(
-            ds['year'].values[ii],
-            ds['month'].values[ii],
-            ds['day'].values[ii],
-            ds['hour'].values[ii],
-            ds['minute'].values[ii],
-            ds['second'].values[ii],
-        )
-        timestamp[ii] = np.datetime64(ts, "ns")
+    timestamp = _assemble_time(
+        ds['year'].values, month=ds['month'].values, day=ds['day'].values,
+        hour=ds['hour'].values, minute=ds['minute'].values, second=ds['second'].values)
 
     ds = ds.rename({'index': 'time'})
     ds = ds.assign_coords(time=timestamp)
@@ -542,15 +816,8 @@ def read_gml_ozone(filename=None, **kwargs):
         filename, sep=r'\s+', skiprows=skiprows, **kwargs)
     ds.attrs['station'] = str(ds['STN'].values[0]).lower()
 
-    timestamp = np.full(ds['YEAR'].size, np.nan, dtype="datetime64[ns]")
-    for ii in range(0, len(timestamp)):
-        ts = datetime(
-            ds['YEAR'].values[ii],
-            ds['MON'].values[ii],
-            ds['DAY'].values[ii],
-            ds['HR'].values[ii],
-        )
-        timestamp[ii] = np.datetime64(ts, "ns")
+    timestamp = _assemble_time(
+        ds['YEAR'].values, month=ds['MON'].values, day=ds['DAY'].values, hour=ds['HR'].values)
 
     ds = ds.rename({'index': 'time'})
     ds = ds.assign_coords(time=timestamp)
@@ -570,7 +837,8 @@ def read_gml_ozone(filename=None, **kwargs):
 
 
 def read_gml_radiation(filename=None, convert_missing=True,
-                       remove_time_vars=True, **kwargs):
+                       remove_time_vars=True, parallel=True, num_workers=None,
+                       cache_dir=None, **kwargs):
     """
     Function to read radiation data from NOAA GML.
 
@@ -586,8 +854,17 @@ def read_gml_radiation(filename=None, convert_missing=True,
         Some column names in the CSV file are used for creating the time
         coordinate variable in the returend Xarray DataSet. Once used the
         variables are not needed and will be removed from DataSet.
+    parallel : boolean
+        Option to parse multiple files in parallel using Dask threads.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    cache_dir : str, pathlib.Path or None
+        Directory to save the parsed files of each station-year to a netCDF file.
+        When a file is read again unmodified with the same keywords the values are
+        read from the netCDF file in place of the text file.
     **kwargs : keywords
-        Keywords to pass through to ACT read_csv() routine.
+        Keywords to pass through to pandas read_csv() routine.
 
     Returns
     -------
@@ -738,9 +1015,13 @@ def read_gml_radiation(filename=None, convert_missing=True,
         },
     }
 
+    test_filename = filename
+    if isinstance(test_filename, (list, tuple)):
+        test_filename = test_filename[0]
+
     # Add additinal column names for NOAA SPASH campaign
-    if str(Path(filename).name).startswith('cbc') or \
-            str(Path(filename).name).startswith('ckp'):
+    if str(Path(test_filename).name).startswith('cbc') or \
+            str(Path(test_filename).name).startswith('ckp'):
         column_names['SPN1_total'] = {
             'units': 'W/m^2',
             'long_name': 'SPN1 total average',
@@ -772,7 +1053,9 @@ def read_gml_radiation(filename=None, convert_missing=True,
         names.insert(ii + num, 'qc_' + name)
         num += 1
 
-    ds = act.io.csvfiles.read_csv(filename, sep=r'\s+', header=None, skiprows=2, column_names=names, **kwargs)
+    ds = _read_gml_files(
+        filename, names, parallel=parallel, num_workers=num_workers, cache_dir=cache_dir,
+        cache_key=_radiation_cache_key, skiprows=2, **kwargs)
 
     if isinstance(filename, (list, tuple)):
         filename = filename[0]
@@ -820,16 +1103,9 @@ def read_gml_radiation(filename=None, convert_missing=True,
         )
         ds.attrs['location'] = station
 
-        timestamp = np.full(ds['year'].size, np.nan, dtype="datetime64[ns]")
-        for ii in range(0, len(timestamp)):
-            ts = datetime(
-                ds['year'].values[ii],
-                ds['month'].values[ii],
-                ds['day'].values[ii],
-                ds['hour'].values[ii],
-                ds['minute'].values[ii],
-            )
-            timestamp[ii] = np.datetime64(ts, "ns")
+        timestamp = _assemble_time(
+            ds['year'].values, month=ds['month'].values, day=ds['day'].values,
+            hour=ds['hour'].values, minute=ds['minute'].values)
 
         ds = ds.rename({'index': 'time'})
         ds = ds.assign_coords(time=timestamp)
@@ -891,7 +1167,8 @@ def read_gml_radiation(filename=None, convert_missing=True,
     return ds
 
 
-def read_gml_met(filename=None, convert_missing=True, **kwargs):
+def read_gml_met(filename=None, convert_missing=True, parallel=True, num_workers=None,
+                 cache_dir=None, **kwargs):
     """
     Function to read meteorological data from NOAA GML.
 
@@ -903,8 +1180,17 @@ def read_gml_met(filename=None, convert_missing=True, **kwargs):
         Option to convert missing values to NaN. If turned off will
         set variable attribute to missing value expected. This works well
         to preserve the data type best for writing to a netCDF file.
+    parallel : boolean
+        Option to parse multiple files in parallel using Dask threads.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    cache_dir : str, pathlib.Path or None
+        Directory to save the parsed files of each station-year to a netCDF file.
+        When a file is read again unmodified with the same keywords the values are
+        read from the netCDF file in place of the text file.
     **kwargs : keywords
-        Keywords to pass through to ACT read_csv() routine.
+        Keywords to pass through to pandas read_csv() routine.
 
     Returns
     -------
@@ -994,30 +1280,14 @@ def read_gml_met(filename=None, convert_missing=True, **kwargs):
         minutes = False
         del column_names['minute']
 
-    ds = act.io.csvfiles.read_csv(
-        filename, sep=r'\s+', header=None,
-        column_names=column_names.keys(), **kwargs)
+    ds = _read_gml_files(
+        filename, list(column_names.keys()), parallel=parallel, num_workers=num_workers,
+        cache_dir=cache_dir, cache_key=_met_cache_key, **kwargs)
 
     if ds is not None:
-        timestamp = np.full(ds['year'].size, np.nan, dtype="datetime64[ns]")
-        for ii in range(0, len(timestamp)):
-            if minutes:
-                ts = datetime(
-                    ds['year'].values[ii],
-                    ds['month'].values[ii],
-                    ds['day'].values[ii],
-                    ds['hour'].values[ii],
-                    ds['minute'].values[ii],
-                )
-            else:
-                ts = datetime(
-                    ds['year'].values[ii],
-                    ds['month'].values[ii],
-                    ds['day'].values[ii],
-                    ds['hour'].values[ii],
-                )
-
-            timestamp[ii] = np.datetime64(ts, "ns")
+        timestamp = _assemble_time(
+            ds['year'].values, month=ds['month'].values, day=ds['day'].values,
+            hour=ds['hour'].values, minute=ds['minute'].values if minutes else None)
 
         ds = ds.rename({'index': 'time'})
         ds = ds.assign_coords(time=timestamp)
@@ -1088,12 +1358,9 @@ def read_surfrad(filename, **kwargs):
 
     # Create time variable and add as the coordinate
     ds = df.to_xarray()
-    year = ds['year'].values
-    month = ds['month'].values
-    day = ds['day'].values
-    hour = ds['hour'].values
-    minute = ds['minute'].values
-    time = [datetime(year[i], month[i], day[i], hour[i], minute[i]) for i in range(len(year))]
+    time = _assemble_time(
+        ds['year'].values, month=ds['month'].values, day=ds['day'].values,
+        hour=ds['hour'].values, minute=ds['minute'].values)
     ds = ds.assign_coords(index=time)
     ds = ds.rename(index='time')
 
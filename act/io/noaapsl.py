@@ -4,7 +4,9 @@ Modules for reading in NOAA PSL data.
 
 from datetime import datetime, timedelta
 from os import path as ospath
-from itertools import groupby
+import io
+import warnings
+import dask
 import fsspec
 import yaml
 import re
@@ -38,34 +40,18 @@ def read_psl_wind_profiler(filepath, transpose=True):
         Standard Xarray dataset with the second mode data.
 
     """
-    # Open the file, read in the lines as a list, and return that list
-    file = fsspec.open(filepath).open()
-    lines = file.readlines()
-    lines = [x.decode().rstrip()[:] for x in lines][1:]
-
-    # Separate sections based on the $ separator in the file
-    sections_of_file = (list(g) for _, g in groupby(lines, key='$'.__ne__))
-
-    # Count how many lines need to be skipped when reading into pandas
-    start_line = 0
-    list_of_datasets = []
-    for section in sections_of_file:
-        if section[0] != '$':
-            list_of_datasets.append(
-                _parse_psl_wind_lines(
-                    filepath, section, line_offset=start_line)
-            )
-        start_line += len(section)
+    # Read the lines once and parse each section from the lines in memory
+    lines = _read_psl_lines(filepath)
+    sections = [_parse_psl_wind_lines(lines[start:end])
+                for start, end in _psl_section_offsets(lines)]
 
     # Return two datasets for each mode and the merge of datasets of the
     # same mode.
-    mode_one_ds = xr.concat(
-        list_of_datasets[0::2], dim='time')
-    mode_two_ds = xr.concat(
-        list_of_datasets[1::2], dim='time')
-    if transpose:
-        mode_one_ds = mode_one_ds.transpose('HT', 'time')
-        mode_two_ds = mode_two_ds.transpose('HT', 'time')
+    mode_one_ds = _psl_sections_to_dataset(sections[0::2])
+    mode_two_ds = _psl_sections_to_dataset(sections[1::2])
+    if not transpose:
+        mode_one_ds = mode_one_ds.transpose('time', 'HT')
+        mode_two_ds = mode_two_ds.transpose('time', 'HT')
     return mode_one_ds, mode_two_ds
 
 
@@ -87,49 +73,38 @@ def read_psl_wind_profiler_temperature(filepath, transpose=True):
         Standard Xarray dataset with the data.
 
     """
-    # Open the file, read in the lines as a list, and return that list
-    file = fsspec.open(filepath).open()
-    lines = file.readlines()
-    lines = [x.decode().rstrip()[:] for x in lines][1:]
-
-    # Separate sections based on the $ separator in the file
-    sections_of_file = (list(g) for _, g in groupby(lines, key='$'.__ne__))
-
-    # Count how many lines need to be skipped when reading into pandas
-    start_line = 0
-    list_of_datasets = []
-    for section in sections_of_file:
-        if section[0] != '$':
-            list_of_datasets.append(
-                _parse_psl_temperature_lines(
-                    filepath, section, line_offset=start_line)
-            )
-        start_line += len(section)
-
-    # Merge the resultant datasets together
+    # Read the lines once and parse each section from the lines in memory
+    lines = _read_psl_lines(filepath)
+    sections = [_parse_psl_temperature_lines(lines[start:end])
+                for start, end in _psl_section_offsets(lines)]
+
+    # Merge the sections together
+    var_attrs = {
+        'T': {'long_name': 'average_uncorrected_RASS_temperature', 'units': 'degC'},
+        'Tc': {'long_name': 'average_corrected_RASS_temperature', 'units': 'degC'},
+        'W': {'long_name': 'average_vertical_wind', 'units': 'm/s'},
+    }
+    ds = _psl_sections_to_dataset(sections, var_attrs=var_attrs)
     if transpose:
-        return xr.concat(list_of_datasets, dim='time').transpose('HT', 'time')
+        return ds
     else:
-        return xr.concat(list_of_datasets, dim='time')
+        return ds.transpose('time', 'HT')
 
 
-def _parse_psl_wind_lines(filepath, lines, line_offset=0):
+def _parse_psl_wind_lines(lines):
     """
     Reads lines related to wind in a psl file.
 
     Parameters
     ----------
-    filepath : str
-        Name of file(s) to read.
     lines : list
-      List of strings containing the lines to parse.
-    line_offset : int (default = 0)
-      Offset to start reading the pandas data table.
+      List of strings containing the lines of one section to parse.
 
     Returns
     -------
-    ds : xarray.Dataset
-      Xarray dataset with wind data.
+    section : tuple
+      Attributes, time, heights, variable names and 2D array of values
+      with shape (height, variable) of the section.
 
     """
     # 1 - site
@@ -183,29 +158,12 @@ def _parse_psl_wind_lines(filepath, lines, line_offset=0):
         [beam_elevation1, beam_elevation2, beam_elevation3],
         dtype='float32')
 
-    # Read in the data table section using pandas
-    df = pd.read_csv(filepath, skiprows=line_offset + 10, delim_whitespace=True)
-
-    # Only read in the number of rows for a given set of gates
-    df = df.iloc[: int(number_of_range_gates)]
-
-    # Grab a list of valid columns, except time
-    columns = set(list(df.columns)) - {'time'}
-    # Set the data types to be floats
-    df = df[list(columns)].astype(float)
-
-    # Nan values are encoded as 999999 - let's reflect that
-    df = df.replace(999999.0, np.nan)
-
-    # Ensure the height array is stored as a float
-    df['HT'] = df.HT.astype(float)
-
-    # Set the height as an index
-    df = df.set_index('HT')
-
-    # Rename the count and snr columns more usefully
-    df = df.rename(
-        columns={
+    # Read in the data table section from the lines already read, only the
+    # number of rows for a given set of gates. Rename the count and snr
+    # columns more usefully.
+    height, names, values = _parse_psl_table(
+        lines, int(number_of_range_gates),
+        rename={
             'RAD': 'RAD1',
             'RAD.1': 'RAD2',
             'RAD.2': 'RAD3',
@@ -221,74 +179,61 @@ def _parse_psl_wind_lines(filepath, lines, line_offset=0):
         }
     )
 
-    # Convert to an xaray dataset
-    ds = df.to_xarray()
-
-    # Add attributes to variables
-    # Height
-    ds['HT'].attrs['long_name'] = 'height_above_ground'
-    ds['HT'].attrs['units'] = 'km'
-
-    # Add time to our dataset
-    ds['time'] = time
-
     # Add in our additional attributes
-    ds.attrs['site_identifier'] = site.strip()
-    ds.attrs['data_type'] = datatype
-    ds.attrs['latitude'] = latitude
-    ds.attrs['longitude'] = longitude
-    ds.attrs['elevation'] = elevation
-    ds.attrs['beam_elevation'] = beam_elevation
-    ds.attrs['beam_azimuth'] = beam_azimuth
-    ds.attrs['revision_number'] = version
-    ds.attrs[
+    attrs = {}
+    attrs['site_identifier'] = site.strip()
+    attrs['data_type'] = datatype
+    attrs['latitude'] = latitude
+    attrs['longitude'] = longitude
+    attrs['elevation'] = elevation
+    attrs['beam_elevation'] = beam_elevation
+    attrs['beam_azimuth'] = beam_azimuth
+    attrs['revision_number'] = version
+    attrs[
         'data_description'
     ] = 'https://psl.noaa.gov/data/obs/data/view_data_type_info.php?SiteID=ctd&DataOperationalID=5855&OperationalID=2371'
-    ds.attrs['consensus_average_time'] = consensus_average_time
-    ds.attrs['oblique-beam_vertical_correction'] = int(
+    attrs['consensus_average_time'] = consensus_average_time
+    attrs['oblique-beam_vertical_correction'] = int(
         beam_vertical_correction)
-    ds.attrs['number_of_beams'] = int(number_of_beams)
-    ds.attrs['number_of_range_gates'] = int(number_of_range_gates)
+    attrs['number_of_beams'] = int(number_of_beams)
+    attrs['number_of_range_gates'] = int(number_of_range_gates)
 
     # Handle oblique and vertical attributes.
-    ds.attrs['number_of_gates_oblique'] = int(number_of_gates_obl)
-    ds.attrs['number_of_gates_vertical'] = int(number_of_gates_vert)
-    ds.attrs['number_spectral_averages_oblique'] = int(
+    attrs['number_of_gates_oblique'] = int(number_of_gates_obl)
+    attrs['number_of_gates_vertical'] = int(number_of_gates_vert)
+    attrs['number_spectral_averages_oblique'] = int(
         number_spectral_averages_obl)
-    ds.attrs['number_spectral_averages_vertical'] = int(
+    attrs['number_spectral_averages_vertical'] = int(
         number_spectral_averages_vert)
-    ds.attrs['pulse_width_oblique'] = int(pulse_width_obl)
-    ds.attrs['pulse_width_vertical'] = int(pulse_width_vert)
-    ds.attrs['inner_pulse_period_oblique'] = int(inner_pulse_period_obl)
-    ds.attrs['inner_pulse_period_vertical'] = int(inner_pulse_period_vert)
-    ds.attrs['full_scale_doppler_value_oblique'] = float(
+    attrs['pulse_width_oblique'] = int(pulse_width_obl)
+    attrs['pulse_width_vertical'] = int(pulse_width_vert)
+    attrs['inner_pulse_period_oblique'] = int(inner_pulse_period_obl)
+    attrs['inner_pulse_period_vertical'] = int(inner_pulse_period_vert)
+    attrs['full_scale_doppler_value_oblique'] = float(
         full_scale_doppler_obl)
-    ds.attrs['full_scale_doppler_value_vertical'] = float(
+    attrs['full_scale_doppler_value_vertical'] = float(
         full_scale_doppler_vert)
-    ds.attrs['delay_to_first_gate_oblique'] = int(delay_first_gate_obl)
-    ds.attrs['delay_to_first_gate_vertical'] = int(delay_first_gate_vert)
-    ds.attrs['spacing_of_gates_oblique'] = int(spacing_of_gates_obl)
-    ds.attrs['spacing_of_gates_vertical'] = int(spacing_of_gates_vert)
-    return ds
+    attrs['delay_to_first_gate_oblique'] = int(delay_first_gate_obl)
+    attrs['delay_to_first_gate_vertical'] = int(delay_first_gate_vert)
+    attrs['spacing_of_gates_oblique'] = int(spacing_of_gates_obl)
+    attrs['spacing_of_gates_vertical'] = int(spacing_of_gates_vert)
+    return attrs, time, height, names, values
 
 
-def _parse_psl_temperature_lines(filepath, lines, line_offset=0):
+def _parse_psl_temperature_lines(lines):
     """
     Reads lines related to temperature in a psl file.
 
     Parameters
     ----------
-    filepath : str
-        Name of file(s) to read.
     lines : list
-      List of strings containing the lines to parse.
-    line_offset : int (default = 0)
-      Offset to start reading the pandas data table.
+      List of strings containing the lines of one section to parse.
 
     Returns
     -------
-    ds : xarray.Dataset
-      Xarray dataset with temperature data.
+    section : tuple
+      Attributes, time, heights, variable names and 2D array of values
+      with shape (height, variable) of the section.
 
     """
     # 1 - site
@@ -328,30 +273,12 @@ def _parse_psl_temperature_lines(filepath, lines, line_offset=0):
     beam_azimuth, beam_elevation = filter_list(
         lines[8].split(' ')).astype(float)
 
-    # Read in the data table section using pandas
-    df = pd.read_csv(filepath, skiprows=line_offset + 10, delim_whitespace=True)
-
-    # Only read in the number of rows for a given set of gates
-    df = df.iloc[: int(number_of_gates)]
-
-    # Grab a list of valid columns, except time
-    columns = set(list(df.columns)) - {'time'}
-
-    # Set the data types to be floats
-    df = df[list(columns)].astype(float)
-
-    # Nan values are encoded as 999999 - let's reflect that
-    df = df.replace(999999.0, np.nan)
-
-    # Ensure the height array is stored as a float
-    df['HT'] = df.HT.astype(float)
-
-    # Set the height as an index
-    df = df.set_index('HT')
-
-    # Rename the count and snr columns more usefully
-    df = df.rename(
-        columns={
+    # Read in the data table section from the lines already read, only the
+    # number of rows for a given set of gates. Rename the count and snr
+    # columns more usefully.
+    height, names, values = _parse_psl_table(
+        lines, int(number_of_gates),
+        rename={
             'CNT': 'CNT_T',
             'CNT.1': 'CNT_Tc',
             'CNT.2': 'CNT_W',
@@ -361,48 +288,153 @@ def _parse_psl_temperature_lines(filepath, lines, line_offset=0):
         }
     )
 
-    # Convert to an xaray dataset
-    ds = df.to_xarray()
+    # Add in our additional attributes
+    attrs = {}
+    attrs['site_identifier'] = site.strip()
+    attrs['data_type'] = datatype
+    attrs['latitude'] = latitude
+    attrs['longitude'] = longitude
+    attrs['elevation'] = elevation
+    attrs['beam_elevation'] = beam_elevation
+    attrs['beam_azimuth'] = beam_azimuth
+    attrs['revision_number'] = version
+    attrs[
+        'data_description'
+    ] = 'https://psl.noaa.gov/data/obs/data/view_data_type_info.php?SiteID=ctd&DataOperationalID=5855&OperationalID=2371'
+    attrs['consensus_average_time'] = consensus_average_time
+    attrs['number_of_beams'] = int(number_of_beams)
+    attrs['number_of_gates'] = int(number_of_gates)
+    attrs['number_of_range_gates'] = int(number_of_range_gates)
+    attrs['number_spectral_averages'] = int(number_spectral_averages)
+    attrs['pulse_width'] = pulse_width
+    attrs['inner_pulse_period'] = inner_pulse_period
+    attrs['full_scale_doppler_value'] = full_scale_doppler
+    attrs['spacing_of_gates'] = spacing_of_gates
 
-    # Add attributes to variables
-    # Height
-    ds['HT'].attrs['long_name'] = 'height_above_ground'
-    ds['HT'].attrs['units'] = 'km'
+    return attrs, time, height, names, values
 
-    # Temperature
-    ds['T'].attrs['long_name'] = 'average_uncorrected_RASS_temperature'
-    ds['T'].attrs['units'] = 'degC'
-    ds['Tc'].attrs['long_name'] = 'average_corrected_RASS_temperature'
-    ds['Tc'].attrs['units'] = 'degC'
 
-    # Vertical motion (w)
-    ds['W'].attrs['long_name'] = 'average_vertical_wind'
-    ds['W'].attrs['units'] = 'm/s'
+def _read_psl_lines(filepath):
+    """
+    Returns the lines of a PSL wind profiler file without the first line.
+    """
+    with fsspec.open(filepath) as file:
+        lines = file.readlines()
 
-    # Add time to our dataset
-    ds['time'] = time
+    return [x.decode().rstrip() for x in lines][1:]
 
-    # Add in our additional attributes
-    ds.attrs['site_identifier'] = site.strip()
-    ds.attrs['data_type'] = datatype
-    ds.attrs['latitude'] = latitude
-    ds.attrs['longitude'] = longitude
-    ds.attrs['elevation'] = elevation
-    ds.attrs['beam_elevation'] = beam_elevation
-    ds.attrs['beam_azimuth'] = beam_azimuth
-    ds.attrs['revision_number'] = version
-    ds.attrs[
-        'data_description'
-    ] = 'https://psl.noaa.gov/data/obs/data/view_data_type_info.php?SiteID=ctd&DataOperationalID=5855&OperationalID=2371'
-    ds.attrs['consensus_average_time'] = consensus_average_time
-    ds.attrs['number_of_beams'] = int(number_of_beams)
-    ds.attrs['number_of_gates'] = int(number_of_gates)
-    ds.attrs['number_of_range_gates'] = int(number_of_range_gates)
-    ds.attrs['number_spectral_averages'] = int(number_spectral_averages)
-    ds.attrs['pulse_width'] = pulse_width
-    ds.attrs['inner_pulse_period'] = inner_pulse_period
-    ds.attrs['full_scale_doppler_value'] = full_scale_doppler
-    ds.attrs['spacing_of_gates'] = spacing_of_gates
+
+def _psl_section_offsets(lines):
+    """
+    Returns the start and end line index of each section of a PSL wind
+    profiler file. Sections are separated by lines with only a $.
+    """
+    offsets = []
+    start = None
+    for ii, line in enumerate(lines):
+        if line == '$':
+            if start is not None:
+                offsets.append((start, ii))
+            start = None
+        elif start is None:
+            start = ii
+    if start is not None:
+        offsets.append((start, len(lines)))
+
+    return offsets
+
+
+def _parse_psl_table(lines, number_of_rows, rename=None):
+    """
+    Parses the data table of a PSL wind profiler section. The table header is
+    on the tenth line of the section followed by number_of_rows lines of values.
+
+    Parameters
+    ----------
+    lines : list
+      List of strings containing the lines of one section.
+    number_of_rows : int
+      Number of table rows to read.
+    rename : dict or None
+      Mapping of column names to variable names. Repeated column names are
+      numbered the same as pandas, as CNT, CNT.1 and CNT.2.
+
+    Returns
+    -------
+    height : numpy.ndarray
+      Heights of the table rows.
+    names : list of str
+      Variable names of the columns other than height and time.
+    values : numpy.ndarray
+      2D array of values with shape (height, variable).
+
+    """
+    if rename is None:
+        rename = {}
+
+    names = []
+    counts = {}
+    for name in lines[9].split():
+        if name in counts:
+            counts[name] += 1
+            name = f'{name}.{counts[name]}'
+        else:
+            counts[name] = 0
+        names.append(rename.get(name, name))
+
+    rows = [line for line in lines[10:] if line.strip() != ''][:number_of_rows]
+    try:
+        values = np.array(' '.join(rows).split(), dtype=float).reshape(len(rows), len(names))
+    except ValueError:
+        # Rows with missing values are filled with NaN
+        values = pd.read_csv(
+            io.StringIO('\n'.join(rows)), sep=r'\s+', header=None, names=names
+        ).to_numpy(dtype=float)
+
+    # Nan values are encoded as 999999 - let's reflect that
+    values[values == 999999.0] = np.nan
+
+    height = values[:, names.index('HT')]
+    keep = [ii for ii, name in enumerate(names) if name not in ['HT', 'time']]
+
+    return height, [names[ii] for ii in keep], values[:, keep]
+
+
+def _psl_sections_to_dataset(sections, var_attrs=None):
+    """
+    Returns `xarray.Dataset` of the parsed sections of a PSL wind profiler
+    file with dimensions (HT, time). Sections with the same heights and
+    variables are copied into one array per variable. Otherwise the sections
+    are concatenated along time with the union of heights. The attributes are
+    from the first section.
+    """
+    if len(sections) == 0:
+        raise ValueError('No data sections found in PSL wind profiler file.')
+
+    if var_attrs is None:
+        var_attrs = {}
+
+    attrs, _, height, names, _ = sections[0]
+    if not all(np.array_equal(section[2], height, equal_nan=True) and section[3] == names
+               for section in sections[1:]):
+        return xr.concat(
+            [_psl_sections_to_dataset([section], var_attrs=var_attrs) for section in sections],
+            dim='time')
+
+    values = np.empty((len(names), height.size, len(sections)))
+    for ii, section in enumerate(sections):
+        values[:, :, ii] = section[4].T
+
+    time = np.array([section[1] for section in sections], dtype='datetime64[ns]')
+    ds = xr.Dataset(
+        data_vars={name: (('HT', 'time'), values[ii], dict(var_attrs.get(name, {})))
+                   for ii, name in enumerate(names)},
+        coords={
+            'HT': ('HT', height, {'long_name': 'height_above_ground', 'units': 'km'}),
+            'time': ('time', time),
+        },
+        attrs=dict(attrs),
+    )
 
     return ds
 
@@ -668,7 +700,7 @@ def read_psl_parsivel(files):
     return ds
 
 
-def read_psl_radar_fmcw_moment(files):
+def read_psl_radar_fmcw_moment(files, parallel=True, num_workers=None, scheduler='threads'):
     """
     Returns `xarray.Dataset` with stored data and metadata from
     NOAA PSL FMCW Radar files. See References section for details.
@@ -678,6 +710,13 @@ def read_psl_radar_fmcw_moment(files):
     files : str or list
         Name of file(s) to read.  Currently does not support reading URLs but files can
         be downloaded easily using the act.discovery.download_noaa_psl_data function.
+    parallel : boolean
+        Option to parse multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
 
     Return
     ------
@@ -691,12 +730,13 @@ def read_psl_radar_fmcw_moment(files):
 
     """
 
-    ds = _parse_psl_radar_moments(files)
+    ds = _parse_psl_radar_moments(
+        files, parallel=parallel, num_workers=num_workers, scheduler=scheduler)
 
     return ds
 
 
-def read_psl_radar_sband_moment(files):
+def read_psl_radar_sband_moment(files, parallel=True, num_workers=None, scheduler='threads'):
     """
     Returns `xarray.Dataset` with stored data and metadata from
     NOAA PSL S-band Radar files.
@@ -706,6 +746,13 @@ def read_psl_radar_sband_moment(files):
     files : str or list
         Name of file(s) to read.  Currently does not support reading URLs but files can
         be downloaded easily using the act.discovery.download_noaa_psl_data function.
+    parallel : boolean
+        Option to parse multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
 
     Return
     ------
@@ -714,12 +761,13 @@ def read_psl_radar_sband_moment(files):
 
     """
 
-    ds = _parse_psl_radar_moments(files)
+    ds = _parse_psl_radar_moments(
+        files, parallel=parallel, num_workers=num_workers, scheduler=scheduler)
 
     return ds
 
 
-def _parse_psl_radar_moments(files):
+def _parse_psl_radar_moments(files, parallel=True, num_workers=None, scheduler='threads'):
     """
     Returns `xarray.Dataset` with stored data and metadata from
     NOAA PSL FMCW and S-Band Radar files.
@@ -729,6 +777,13 @@ def _parse_psl_radar_moments(files):
     files : str or list
         Name of file(s) to read.  Currently does not support reading URLs but files can
         be downloaded easily using the act.discovery.download_noaa_psl_data function.
+    parallel : boolean
+        Option to parse multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
 
     Return
     ------
@@ -778,103 +833,124 @@ def _parse_psl_radar_moments(files):
     h3_names = ['interpulse_period', 'pulse_width', 'first_range_gate', 'range_between_gates',
                 'n_gates', 'n_coherent_integration', 'n_averaged_spectra', 'n_points_spectrum',
                 'n_code_bits']
-    names = {'radial_velocity': 0, 'snr': 1, 'signal_power': 2, 'spectral_width': 3,
-             'noise_amplitude': 4, 'qc_variable': 5}
+    names = ['radial_velocity', 'snr', 'signal_power', 'spectral_width', 'noise_amplitude', 'qc_variable']
 
     # If file is a string, convert to list for handling.
     if not isinstance(files, list):
         files = [files]
 
-    # Run through each file and read the data in
-    for f in files:
-        # Read in the first line of the file which has site, lat, lon, etc...
-        df = str(pd.read_table(f, nrows=0).columns[0]).split(' ')
-        ctr = 0
-        for d in df:
-            if len(d) > 0:
-                if d == 'lat' or d == 'lon':
-                    data[h1_names[ctr]]['data'].append(float(d) / 100.)
-                else:
-                    data[h1_names[ctr]]['data'].append(d)
-                ctr += 1
-
-        # Set counts and errors
-        error = False
-        error_ct = 0
-        ct = 0
-        # Loop through while there's no errors i.e. eof
-        while error is False:
-            try:
-                # Read in the initial headers to get information used to parse data
-                if ct == 0:
-                    df = str(pd.read_table(f, nrows=0, skiprows=[0]).columns[0]).split(' ')
-                    ctr = 0
-                    for d in df:
-                        if len(d) > 0:
-                            data[h2_names[ctr]]['data'].append(d)
-                            ctr += 1
-                    # Read in third row of header information
-                    df = str(pd.read_table(f, nrows=0, skiprows=[0, 1]).columns[0]).split(' ')
-                    ctr = 0
-                    for d in df:
-                        if len(d) > 0:
-                            data[h3_names[ctr]]['data'].append(d)
-                            ctr += 1
-                    # Read in the data based on number of gates
-                    df = pd.read_csv(f, skiprows=[0, 1, 2], nrows=int(data['n_gates']['data'][-1]) - 1, delim_whitespace=True,
-                                     names=list(names.keys()))
-                    index2 = 0
-                else:
-                    # Set indices for parsing data, reading 2 headers and then the columns of data
-                    index1 = ct * int(data['n_gates']['data'][-1])
-                    index2 = index1 + int(data['n_gates']['data'][-1]) + 2 * ct + 4
-                    df = str(pd.read_table(f, nrows=0, skiprows=list(range(index2 - 1))).columns[0]).split(' ')
-                    ctr = 0
-                    for d in df:
-                        if len(d) > 0:
-                            data[h2_names[ctr]]['data'].append(d)
-                            ctr += 1
-                    df = str(pd.read_table(f, nrows=0, skiprows=list(range(index2))).columns[0]).split(' ')
-                    ctr = 0
-                    for d in df:
-                        if len(d) > 0:
-                            data[h3_names[ctr]]['data'].append(d)
-                            ctr += 1
-                    df = pd.read_csv(f, skiprows=list(range(index2 + 1)), nrows=int(data['n_gates']['data'][-1]) - 1, delim_whitespace=True,
-                                     names=list(names.keys()))
-
-                # Add data from the columns to the dictionary
-                for n in names:
-                    data[n]['data'].append(df[n].to_list())
-
-                # Calculate the range based on number of gates, range to first gate and range between gates
-                if len(data['range']['data']) == 0:
-                    ranges = float(data['first_range_gate']['data'][-1]) + np.array(range(int(data['n_gates']['data'][-1]) - 1)) * \
-                        float(data['range_between_gates']['data'][-1])
-                    data['range']['data'] = ranges
-
-                # Calculate a time
-                time = dt.datetime(
-                    int('20' + data['year']['data'][-1]), 1, 1, int(data['hour']['data'][-1]),
-                    int(data['minute']['data'][-1]), int(data['second']['data'][-1])) + \
-                    dt.timedelta(days=int(data['day_of_year']['data'][-1]) - 1)
-                data['time']['data'].append(time)
-
-                # Range correct the snr which converts it essentially to an uncalibrated reflectivity
-                snr_rc = data['snr']['data'][-1] - 20. * np.log10(1. / (ranges / 1000.) ** 2)
-                data['reflectivity_uncalibrated']['data'].append(snr_rc)
-            except Exception as e:
-                # Handle errors, if end of file then continue on, if something else
-                # try the next block of data but if it errors another time in this file move on
-                if isinstance(e, pd.errors.EmptyDataError) or error_ct > 1:
-                    error = True
-                else:
-                    print(e)
-                    pass
-                error_ct += 1
-            ct += 1
+    # Parse each file in one pass
+    dask_config = {'scheduler': scheduler if parallel else 'synchronous'}
+    if parallel and num_workers is not None:
+        dask_config['num_workers'] = num_workers
+    tasks = [dask.delayed(_parse_psl_radar_moment_file)(f, names) for f in files]
+    with dask.config.set(dask_config):
+        results = dask.compute(*tasks)
+
+    for result in results:
+        for ii, d in enumerate(result['site_header'][:len(h1_names)]):
+            data[h1_names[ii]]['data'].append(d)
+
+    # Allocate the output arrays once and fill with the profiles of each file
+    headers = np.concatenate([result['headers'] for result in results])
+    n_times = headers.shape[0]
+    n_range = max([result['n_range'] for result in results])
+    for n in names:
+        dtype = np.result_type(*[result['moments'][n].dtype for result in results])
+        if any([result['n_range'] != n_range for result in results]):
+            dtype = np.result_type(dtype, np.float64)
+        if dtype.kind == 'f':
+            data[n]['data'] = np.full((n_times, n_range), np.nan, dtype=dtype)
+        else:
+            data[n]['data'] = np.empty((n_times, n_range), dtype=dtype)
+    start = 0
+    for result in results:
+        end = start + result['headers'].shape[0]
+        for n in names:
+            data[n]['data'][start:end, :result['n_range']] = result['moments'][n]
+        start = end
+
+    for ii, n in enumerate(h2_names + h3_names):
+        values = headers[:, ii]
+        if n not in ['azimuth', 'elevation', 'interpulse_period', 'pulse_width',
+                     'first_range_gate', 'range_between_gates']:
+            values = values.astype(np.int64)
+        data[n]['data'] = values
+
+    # Calculate the range based on number of gates, range to first gate and range between gates
+    # of the first profile
+    ranges = np.array([], dtype=np.float64)
+    if n_times > 0:
+        ranges = headers[0, len(h2_names) + 2] + np.arange(n_range) * headers[0, len(h2_names) + 3]
+    data['range']['data'] = ranges
+
+    # Calculate the time from the 2-digit year, day of year and time of day
+    years = (2000 + data['year']['data'] - 1970).astype('datetime64[Y]')
+    time = years.astype('datetime64[D]') + (data['day_of_year']['data'] - 1)
+    time = time.astype('datetime64[ns]') + (
+        data['hour']['data'] * 3600 + data['minute']['data'] * 60 + data['second']['data']).astype('timedelta64[s]')
+    data['time']['data'] = time
+
+    # Range correct the snr which converts it essentially to an uncalibrated reflectivity
+    data['reflectivity_uncalibrated']['data'] = data['snr']['data'] - 20. * np.log10(1. / (ranges / 1000.) ** 2)
 
     # Convert dictionary to Dataset
     ds = xr.Dataset().from_dict(data)
 
     return ds
+
+
+def _parse_psl_radar_moment_file(filename, names):
+    """
+    Returns dictionary of the headers and moments of all profiles in one NOAA PSL
+    FMCW or S-Band Radar moment file read in a single pass. After the site header
+    line each profile has two header lines followed by one line per range gate.
+    The last range gate line is not used.
+
+    """
+    with open(filename) as fh:
+        lines = fh.read().splitlines()
+
+    headers = []
+    n_gates = []
+    moment_lines = []
+    index = 1
+    while index + 1 < len(lines) and len(lines[index].strip()) > 0:
+        fields = lines[index].split() + lines[index + 1].split()
+        try:
+            header = [float(ii) for ii in fields]
+            n = int(header[12])
+        except (ValueError, IndexError):
+            header = None
+        # Stop at a malformed or incomplete profile
+        if header is None or len(header) != 17 or n < 2 or index + 2 + n > len(lines):
+            warnings.warn(f'Unable to read profile starting at line {index + 1} of {filename}. '
+                          'Remaining profiles not read.', UserWarning)
+            break
+
+        headers.append(header)
+        n_gates.append(n - 1)
+        moment_lines.extend(lines[index + 2:index + 1 + n])
+        index += 2 + n
+
+    headers = np.array(headers, dtype=np.float64).reshape(-1, 17)
+    n_range = max(n_gates, default=0)
+    moments = {}
+    if len(moment_lines) > 0:
+        df = pd.read_csv(io.StringIO('\n'.join(moment_lines)), sep=r'\s+', header=None, names=names)
+    else:
+        df = pd.DataFrame({n: np.array([], dtype=np.float64) for n in names})
+
+    if all([n == n_range for n in n_gates]):
+        for n in names:
+            moments[n] = df[n].to_numpy().reshape(len(n_gates), n_range)
+    else:
+        offsets = np.cumsum([0] + n_gates)
+        for n in names:
+            values = df[n].to_numpy()
+            moments[n] = np.full((len(n_gates), n_range), np.nan)
+            for ii in range(len(n_gates)):
+                moments[n][ii, :n_gates[ii]] = values[offsets[ii]:offsets[ii + 1]]
+
+    return {'site_header': lines[0].split() if len(lines) > 0 else [],
+            'headers': headers, 'n_range': n_range, 'moments': moments}
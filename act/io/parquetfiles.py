@@ -0,0 +1,291 @@
+"""
+This module contains I/O operations for writing and reading partitioned Parquet
+datasets of ARM time series. Each variable with only a time dimension is stored
+as a column and the files are partitioned by datastream and date so SQL engines
+and the reader only read the partitions, row groups and columns requested.
+
+"""
+
+import json
+import warnings
+
+import numpy as np
+import xarray as xr
+
+from act.config import DEFAULT_DATASTREAM_NAME
+from act.io.armfiles import _to_datetime64, check_arm_standards
+from act.io.zarrfiles import _decode_attributes, _encode_attributes
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pds
+    _PYARROW_AVAILABLE = True
+except ImportError:
+    _PYARROW_AVAILABLE = False
+
+# Schema metadata keys holding the ACT attributes and data types
+_ATTRIBUTES_KEY = b'act_attributes'
+_DTYPE_KEY = b'act_dtype'
+_SCALARS_KEY = b'act_scalar_variables'
+# Hive partition columns added to each row
+_PARTITION_COLUMNS = ['datastream', 'date']
+
+
+def write_parquet(ds, path, variables=None, compact_qc=True, compression='zstd', **kwargs):
+    """
+    Writes the time series variables of a Dataset to a Parquet dataset partitioned
+    by datastream and date in the Hive directory layout
+    path/datastream=<datastream>/date=<YYYYMMDD>/. Variables with only a time
+    dimension are written as columns with their attributes stored in the column
+    metadata. Scalar variables are stored in the schema metadata and variables with
+    other dimensions are not written. Writing the same Dataset again replaces the
+    files written before, so one file is written per input Dataset and date.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset to write. Must have a time dimension. Not modified.
+    path : str or pathlib.Path
+        Name of root directory of the Parquet dataset.
+    variables : str, list of str or None
+        Variable names to write. If None all time series variables are written.
+    compact_qc : boolean
+        Option to store quality control variables with the smallest unsigned
+        integer type holding all the flag values. The original type is restored
+        when reading.
+    compression : str
+        Parquet compression codec.
+    **kwargs : keywords
+        Keywords to pass through to pyarrow.dataset.write_dataset().
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        for filename in sorted(glob.glob('/data/sgpmetE13.b1/sgpmetE13.b1.2019*.cdf')):
+            ds = act.io.armfiles.read_netcdf(filename)
+            act.io.parquetfiles.write_parquet(ds, '/data/parquet')
+
+    """
+    if not _PYARROW_AVAILABLE:
+        raise ImportError('pyarrow is required to write Parquet files but is not installed')
+
+    if 'time' not in ds.dims:
+        raise ValueError('Dataset must have a time dimension to write to Parquet.')
+
+    if isinstance(variables, str):
+        variables = [variables]
+    if variables is None:
+        variables = [name for name in ds.variables if name != 'time']
+
+    time = ds['time'].values
+    fields = [pa.field('time', pa.timestamp('ns'), metadata=_field_metadata(ds['time']))]
+    columns = [pa.array(time, type=pa.timestamp('ns'))]
+    scalars = {}
+    skipped = []
+    for name in variables:
+        var = ds[name]
+        if var.dims == ('time',):
+            values = var.values
+            if compact_qc and _is_qc_variable(var):
+                values = values.astype(_compact_qc_dtype(var, values))
+            column = pa.array(values)
+            columns.append(column)
+            fields.append(pa.field(name, column.type, metadata=_field_metadata(var)))
+        elif var.ndim == 0:
+            scalars[name] = {'value': var.values.tolist(), 'dtype': str(var.dtype),
+                             'attrs': _encode_attributes(var.attrs)}
+        else:
+            skipped.append(name)
+
+    if len(skipped) > 0:
+        warnings.warn(f'Variables without only a time dimension are not written to Parquet: {skipped}',
+                      UserWarning)
+
+    datastream = ds.attrs.get('_datastream', DEFAULT_DATASTREAM_NAME)
+    dates = np.char.replace(np.datetime_as_string(time, unit='D'), '-', '')
+    fields.extend([pa.field('datastream', pa.string()), pa.field('date', pa.string())])
+    columns.extend([pa.array(np.full(time.size, datastream)), pa.array(dates)])
+
+    attrs = {key: value for key, value in ds.attrs.items() if key not in ['_file_dates', '_file_times']}
+    schema = pa.schema(fields, metadata={
+        _ATTRIBUTES_KEY: json.dumps(_encode_attributes(attrs)),
+        _SCALARS_KEY: json.dumps(scalars),
+    })
+    table = pa.Table.from_arrays(columns, schema=schema)
+
+    # Name files by the first time so writing the same Dataset again replaces its files
+    start = np.datetime_as_string(time[0], unit='s').replace('-', '').replace(':', '')
+    kwargs.setdefault('basename_template', f'part-{start}-{{i}}.parquet')
+    kwargs.setdefault('existing_data_behavior', 'overwrite_or_ignore')
+    kwargs.setdefault('file_options', pds.ParquetFileFormat().make_write_options(compression=compression))
+    pds.write_dataset(table, str(path), format='parquet', partitioning=_partitioning(), **kwargs)
+
+
+def read_parquet(path, variables=None, start_time=None, end_time=None, datastream=None):
+    """
+    Returns `xarray.Dataset` read from a Parquet dataset written with
+    write_parquet(). The datastream and time range are pushed down to the
+    Parquet reader so only the date partitions and row groups within the time
+    range are read, and only the columns of the requested variables are read.
+    Scalar variables and global attributes are read from the first file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Name of root directory of the Parquet dataset.
+    variables : str, list of str or None
+        Variable names to read. If None all variables are read.
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Start of the time range. If None no lower limit is used.
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        End of the time range. If None no upper limit is used.
+    datastream : str or None
+        Datastream name to read. Required if the Parquet dataset has more than
+        one datastream.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        ACT Xarray dataset.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        ds = act.io.parquetfiles.read_parquet(
+            '/data/parquet', variables=['temp_mean', 'qc_temp_mean'], datastream='sgpmetE13.b1',
+            start_time='2015-01-01', end_time='2020-01-01')
+
+    """
+    if not _PYARROW_AVAILABLE:
+        raise ImportError('pyarrow is required to read Parquet files but is not installed')
+
+    dataset = pds.dataset(str(path), format='parquet', partitioning=_partitioning())
+    schema = dataset.schema
+
+    scalars = json.loads(schema.metadata.get(_SCALARS_KEY, b'{}'))
+    if isinstance(variables, str):
+        variables = [variables]
+    if variables is None:
+        variables = [name for name in schema.names if name not in _PARTITION_COLUMNS + ['time']]
+        variables.extend(scalars.keys())
+    missing = [name for name in variables if name not in schema.names and name not in scalars]
+    if len(missing) > 0:
+        raise ValueError(f'Variables not in Parquet dataset: {missing}')
+
+    # The date partition filter skips directories, the time filter skips row groups
+    expression = None
+    if datastream is not None:
+        expression = _and(expression, pds.field('datastream') == datastream)
+    start_time = _to_datetime64(start_time)
+    end_time = _to_datetime64(end_time)
+    if start_time is not None:
+        expression = _and(expression, pds.field('date') >= _date_string(start_time))
+        expression = _and(expression, pds.field('time') >= pa.scalar(start_time, type=pa.timestamp('ns')))
+    if end_time is not None:
+        expression = _and(expression, pds.field('date') <= _date_string(end_time))
+        expression = _and(expression, pds.field('time') <= pa.scalar(end_time, type=pa.timestamp('ns')))
+
+    columns = ['time'] + [name for name in variables if name in schema.names] + _PARTITION_COLUMNS
+    table = dataset.to_table(columns=columns, filter=expression).sort_by('time')
+
+    datastreams = table['datastream'].unique().to_pylist()
+    if len(datastreams) > 1:
+        raise ValueError(f'Parquet dataset has more than one datastream {datastreams}. '
+                         'Set the datastream keyword.')
+
+    ds = xr.Dataset()
+    for name in columns[:-len(_PARTITION_COLUMNS)]:
+        field = schema.field(name)
+        metadata = field.metadata or {}
+        values = table[name].to_numpy()
+        if _DTYPE_KEY in metadata:
+            values = values.astype(metadata[_DTYPE_KEY].decode())
+        attrs = _decode_attributes(json.loads(metadata.get(_ATTRIBUTES_KEY, b'{}')))
+        ds[name] = xr.DataArray(values, dims='time', attrs=attrs)
+
+    for name in variables:
+        if name in scalars:
+            value = np.asarray(scalars[name]['value'], dtype=scalars[name]['dtype'])
+            ds[name] = xr.DataArray(value, attrs=_decode_attributes(scalars[name]['attrs']))
+
+    ds.attrs = _decode_attributes(json.loads(schema.metadata.get(_ATTRIBUTES_KEY, b'{}')))
+    ds.attrs['_file_dates'] = sorted(table['date'].unique().to_pylist())
+    is_arm_file_flag = check_arm_standards(ds)
+    if len(datastreams) == 1:
+        ds.attrs['_datastream'] = datastreams[0]
+    elif '_datastream' not in ds.attrs:
+        ds.attrs['_datastream'] = DEFAULT_DATASTREAM_NAME
+    ds.attrs['_arm_standards_flag'] = is_arm_file_flag
+
+    return ds
+
+
+def _partitioning():
+    """
+    Returns the Hive partitioning of datastream and date directories.
+
+    """
+    return pds.partitioning(
+        pa.schema([(name, pa.string()) for name in _PARTITION_COLUMNS]), flavor='hive')
+
+
+def _field_metadata(var):
+    """
+    Returns the Parquet column metadata holding the attributes and data type of a variable.
+
+    """
+    return {_ATTRIBUTES_KEY: json.dumps(_encode_attributes(var.attrs)), _DTYPE_KEY: str(var.dtype)}
+
+
+def _is_qc_variable(var):
+    """
+    Returns True if the variable is an integer quality control variable.
+
+    """
+    return var.dtype.kind in 'iu' and (
+        var.attrs.get('standard_name') == 'quality_flag' or str(var.name).startswith('qc_'))
+
+
+def _compact_qc_dtype(var, values):
+    """
+    Returns the smallest unsigned integer type holding the values and flags of a
+    quality control variable, or the variable type if values are negative.
+
+    """
+    flags = [values]
+    for attr in ['flag_masks', 'flag_values']:
+        if attr in var.attrs:
+            flags.append(np.atleast_1d(var.attrs[attr]))
+    flags = np.concatenate([np.asarray(flag, dtype=np.int64).ravel() for flag in flags])
+    if flags.size == 0:
+        return np.uint8
+    if flags.min() < 0:
+        return var.dtype
+
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if flags.max() <= np.iinfo(dtype).max:
+            return dtype
+
+    return var.dtype
+
+
+def _date_string(time):
+    """
+    Returns the date partition name of a datetime64 time.
+
+    """
+    return str(time.astype('datetime64[D]')).replace('-', '')
+
+
+def _and(expression, other):
+    """
+    Returns the logical and of two filter expressions where the first may be None.
+
+    """
+    return other if expression is None else expression & other
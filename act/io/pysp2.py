@@ -1,3 +1,11 @@
+from datetime import datetime
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from act.io.armfiles import _to_datetime64
+
 try:
     import pysp2
 
@@ -81,3 +89,183 @@ def read_sp2_dat(file_name, type):
         raise ModuleNotFoundError(
             'PySP2 must be installed in order to read SP2 data and housekeeping files.'
         )
+
+
+def read_sp2_mmap(file_name, start_record=None, end_record=None, start_time=None,
+                  end_time=None, arm_convention=True, chunks=10000):
+    """
+    Memory maps a binary SP2 raw data file and returns the wave forms of a
+    range of records as an xarray Dataset with the variables of read_sp2().
+    The variables are Dask arrays over the memory map so only the bytes of the
+    records used in a computation are read from the file.
+
+    Parameters
+    ----------
+    file_name: str
+        The name of the .sp2b file to read.
+    start_record: int or None
+        Index of the first record to read. If None starts at the first record.
+    end_record: int or None
+        Index one past the last record to read. If None ends at the last record.
+    start_time: str, datetime.datetime, numpy.datetime64 or None
+        Start of the time window of records to read. The records are assumed to
+        be in time order so the window is found with a binary search.
+    end_time: str, datetime.datetime, numpy.datetime64 or None
+        End of the time window of records to read.
+    arm_convention: bool
+        If True, then the file name will follow ARM standard naming conventions.
+        If False, then the file name follows the SP2 default naming convention.
+    chunks: int
+        Number of records in each Dask chunk.
+
+    Returns
+    -------
+    ds: xarray.Dataset
+        The xarray Dataset containing the raw SP2 waveforms for each particle
+        in the record range, or None if the file is empty.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        ds = act.io.pysp2.read_sp2_mmap(file_name, start_time='2019-12-16T13:10:00',
+                                        end_time='2019-12-16T13:20:00')
+        wave_ds = act.qc.get_waveform_statistics(ds, ini_file, num_records=1000)
+
+    """
+    file_date = _sp2_file_date(file_name, arm_convention)
+    records = _sp2_memmap(file_name)
+    if records is None:
+        return None
+
+    # Select the record range without reading the records in between
+    num_records = records.shape[0]
+    start, stop, _ = slice(start_record, end_record).indices(num_records)
+    start_time = _to_datetime64(start_time)
+    end_time = _to_datetime64(end_time)
+    if start_time is not None:
+        start = max(start, _sp2_bisect_time(records, start_time, start, stop))
+    if end_time is not None:
+        stop = min(stop, _sp2_bisect_time(records, end_time, start, stop, right=True))
+    records = records[start:max(start, stop)]
+
+    diff_epoch_1904 = (datetime(1970, 1, 1) - datetime(1904, 1, 1)).total_seconds()
+    chunks = max(1, min(chunks, max(records.shape[0], 1)))
+
+    def from_field(field, dtype):
+        return da.from_array(records[field], chunks=(chunks,) + records.dtype[field].shape,
+                             asarray=False).astype(dtype)
+
+    time_wave = from_field('TimeWave', np.float64)
+    utc_time = from_field('TimeDiv10000', np.float64) * 10000 + from_field('TimeRemainder', np.float64)
+    date_time_wave = (file_date - datetime(1904, 1, 1)).total_seconds() + time_wave
+    time = da.map_blocks(_sp2_datetime, utc_time - diff_epoch_1904, dtype='datetime64[ns]')
+
+    ds = xr.Dataset()
+    ds['time'] = xr.DataArray(time, dims='event_index')
+    ds['Flag'] = xr.DataArray(from_field('Flag', np.int16), dims='event_index')
+    for name in ['Res1', 'Res5', 'Res6']:
+        ds[name] = xr.DataArray(from_field(name, np.float32), dims='event_index')
+    for name in ['Res7', 'Res8']:
+        ds[name] = xr.DataArray(from_field(name, np.float64), dims='event_index')
+    ds['EventIndex'] = xr.DataArray(from_field('EventIndex', np.float32), dims='event_index')
+    ds['DateTimeWaveUTC'] = xr.DataArray(utc_time, dims='event_index')
+    ds['TimeWave'] = xr.DataArray(time_wave, dims='event_index')
+    ds['DateTimeWave'] = xr.DataArray(date_time_wave, dims='event_index')
+
+    data = from_field('data', np.int64)
+    for i in range(data.shape[2]):
+        ds['Data_ch' + str(i)] = xr.DataArray(data[:, :, i], dims=('event_index', 'columns'))
+
+    return ds
+
+
+def _sp2_file_date(file_name, arm_convention):
+    """
+    Returns the date of an SP2 file from the file name.
+
+    """
+    name = str(file_name).replace('\\', '/').split('/')[-1]
+    if arm_convention:
+        return datetime.strptime(name.split('.')[2], '%Y%m%d')
+
+    return datetime.strptime(name[0:8], '%Y%m%d')
+
+
+def _sp2_memmap(file_name):
+    """
+    Returns read only memory map of the fixed size records of an SP2 file as a
+    numpy structured array, or None if the file is empty. The record size is
+    read from the first record.
+
+    """
+    with open(file_name, 'rb') as fh:
+        header = fh.read(8)
+        if len(header) < 8:
+            return None
+        num_cols, num_channels = np.frombuffer(header, dtype='>u4')
+        data_points_per_record = int(num_cols) * int(num_channels)
+        bytes_per_record = 2 * data_points_per_record + 58
+        fh.seek(bytes_per_record - 5)
+        num_spare_cols = int(np.frombuffer(fh.read(4), dtype='>u4')[0])
+        fh.seek(0, 2)
+        file_size = fh.tell()
+
+    fields = [
+        ('num_cols', '>u4'),
+        ('num_channels', '>u4'),
+        ('data', '>i2', (int(num_cols), int(num_channels))),
+        ('Flag', '>i2'),
+        ('TimeWave', '>f4'),
+        ('Res1', '>f4'),
+        ('EventIndex', '>f4'),
+        ('TimeDiv10000', '>f4'),
+        ('TimeRemainder', '>f4'),
+        ('Res5', '>f4'),
+        ('Res6', '>f4'),
+        ('unused', '>f4'),
+        ('Res7', '>f8'),
+        ('Res8', '>f8'),
+    ]
+    if num_spare_cols != 0:
+        fields.append(('spare', 'V' + str(num_spare_cols)))
+    dtype = np.dtype(fields)
+
+    num_records = file_size // dtype.itemsize
+    if num_records == 0:
+        return None
+
+    return np.memmap(file_name, dtype=dtype, mode='r', shape=(num_records,))
+
+
+def _sp2_bisect_time(records, time, lo, hi, right=False):
+    """
+    Returns the index of the first record in records[lo:hi] after time, or at
+    or after time if right is False, reading only the times of the records
+    visited by a binary search.
+
+    """
+    diff_epoch_1904 = (datetime(1970, 1, 1) - datetime(1904, 1, 1)).total_seconds()
+    while lo < hi:
+        mid = (lo + hi) // 2
+        record = records[mid]
+        utc_time = np.float64(record['TimeDiv10000']) * 10000 + np.float64(record['TimeRemainder'])
+        record_time = _sp2_datetime(np.array([utc_time - diff_epoch_1904]))[0]
+        if record_time < time or (right and record_time == time):
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+def _sp2_datetime(seconds):
+    """
+    Returns datetime64 times from seconds since 1970 rounded to microseconds
+    the same way as datetime.fromtimestamp().
+
+    """
+    fraction, whole = np.modf(seconds)
+    microseconds = whole.astype(np.int64) * 1000000 + np.round(fraction * 1e6).astype(np.int64)
+
+    return microseconds.astype('datetime64[us]').astype('datetime64[ns]')
@@ -0,0 +1,540 @@
+"""
+This module contains functions to create and open byte range reference indexes
+of ARM netCDF4/HDF5 file collections. The index records the location of every
+data chunk of each variable in each file so the collection can be opened without
+reading the file headers. The index uses the Kerchunk JSON reference format and
+is read with the fsspec reference file system and Zarr.
+
+"""
+
+import base64
+import glob
+import json
+import math
+import warnings
+from os import PathLike
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from act.io.armfiles import _decode_time_variables, filter_files_by_time
+from act.utils.datetime_utils import _decode_time_ns, parse_time_units
+
+try:
+    import h5py
+    _H5PY_AVAILABLE = True
+except ImportError:
+    _H5PY_AVAILABLE = False
+
+try:
+    import fsspec
+    import zarr
+    _ZARR_AVAILABLE = True
+except ImportError:
+    _ZARR_AVAILABLE = False
+
+# HDF5 and netCDF4 library attributes not written to the index
+_SKIP_ATTRIBUTES = [
+    'DIMENSION_LIST', 'REFERENCE_LIST', 'CLASS', 'NAME', '_Netcdf4Dimid',
+    '_Netcdf4Coordinates', '_nc3_strict', '_NCProperties', '_FillValue',
+]
+
+# Dimension used to stack the variables without a time dimension of each file
+_FILE_DIMENSION = '_reference_file'
+
+# Files are opened separately if combining needs this many times more chunks
+_MAX_CHUNK_RATIO = 16
+
+
+def create_reference_index(filenames, index_file=None):
+    """
+    Creates a byte range reference index of netCDF4/HDF5 files. Each file header is
+    read once to record the data type, shape, chunking, compression, attributes and
+    byte offset of every data chunk of each variable.
+
+    Parameters
+    ----------
+    filenames : str, pathlib.Path, list of str or list of pathlib.Path
+        Name of file(s) to index. A string will be expanded with shell syntax globbing.
+        The list of files from DatastreamCatalog.query() can be used.
+    index_file : str, pathlib.Path or None
+        Name of JSON file to write the index. If None the index is only returned.
+
+    Returns
+    -------
+    index : dict
+        Reference index in Kerchunk version 1 format. Each file is a Zarr group
+        named by the position of the file in the sorted list of files.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        act.io.references.create_reference_index(
+            '/data/sgpkazrgeC1.a1/sgpkazrgeC1.a1.2019*.nc', index_file='/data/sgpkazrgeC1.a1.json')
+        ds = act.io.armfiles.read_netcdf(None, reference_index='/data/sgpkazrgeC1.a1.json')
+
+    """
+    if not _H5PY_AVAILABLE:
+        raise ImportError('h5py is required to create a reference index but is not installed')
+
+    if isinstance(filenames, str):
+        filenames = glob.glob(filenames)
+    elif isinstance(filenames, PathLike):
+        filenames = [filenames]
+    filenames = sorted([str(Path(filename).resolve()) for filename in filenames],
+                       key=lambda filename: Path(filename).name)
+
+    refs = {
+        '.zgroup': json.dumps({'zarr_format': 2}),
+        '.zattrs': json.dumps({'files': filenames}),
+    }
+    for ii, filename in enumerate(filenames):
+        refs.update(_file_references(filename, str(ii)))
+
+    index = {'version': 1, 'refs': refs}
+    if index_file is not None:
+        with open(index_file, 'w') as fh:
+            json.dump(index, fh)
+
+    return index
+
+
+def open_reference_index(index, start_time=None, end_time=None, drop_variables=None,
+                         decode_times=True, **kwargs):
+    """
+    Returns `xarray.Dataset` of a file collection from a reference index. The
+    references of the files are combined into one Zarr store covering the whole
+    collection that is opened once, so opening does not depend on the number of
+    files. Only the index is read when opening, the data chunks are read from the
+    files when needed. Variables without a time dimension are repeated along time
+    for each file the same as xarray.open_mfdataset(). Collections where the files
+    do not have the same variables and storage layout are opened one file at a time
+    and combined by coordinates.
+
+    Parameters
+    ----------
+    index : str, pathlib.Path or dict
+        Name of JSON index file or index returned from create_reference_index().
+    start_time : str, datetime.datetime, numpy.datetime64 or None
+        Only files with a filename time that may contain data after start_time are opened.
+    end_time : str, datetime.datetime, numpy.datetime64 or None
+        Only files with a filename time that may contain data before end_time are opened.
+    drop_variables : str or list of str
+        Variable names to not read.
+    decode_times : boolean
+        Decode time variables to datetime64 using the units of each file. If False the
+        numeric values are returned with the units attribute of the first file.
+    **kwargs : keywords
+        Keywords to pass through to xarray.combine_by_coords(), or xarray.combine_nested()
+        if decode_times is False, when the files can not be combined into one store.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        Xarray dataset. The source file names are listed in the _files attribute.
+
+    """
+    if not _ZARR_AVAILABLE:
+        raise ImportError('fsspec and Zarr are required to open a reference index but are not installed')
+
+    index = load_reference_index(index)
+    files = reference_index_files(index)
+    if start_time is not None or end_time is not None:
+        keep_files = set(filter_files_by_time(files, start_time=start_time, end_time=end_time))
+    else:
+        keep_files = set(files)
+
+    groups = [str(ii) for ii, filename in enumerate(files) if filename in keep_files]
+    if len(groups) == 0:
+        raise OSError('no files to open')
+
+    if isinstance(drop_variables, str):
+        drop_variables = [drop_variables]
+    drop_variables = set(drop_variables or [])
+
+    ds = None
+    combined = _combine_references(index['refs'], groups, drop_variables)
+    if combined is not None:
+        refs, counts, time_units = combined
+        mapper = fsspec.filesystem('reference', fo={'version': 1, 'refs': refs}).get_mapper('')
+        ds = xr.open_zarr(mapper, consolidated=False, decode_times=False)
+        # Repeat the variables without a time dimension for the times of each file
+        if _FILE_DIMENSION in ds.dims:
+            ds = ds.isel({_FILE_DIMENSION: xr.DataArray(np.repeat(np.arange(len(groups)), counts), dims='time')})
+        if decode_times:
+            ds = _decode_combined_time_variables(ds, time_units, counts)
+
+    if ds is None:
+        mapper = fsspec.filesystem('reference', fo=index).get_mapper('')
+        datasets = []
+        for group in groups:
+            ds = xr.open_zarr(
+                mapper, group=group, consolidated=False, decode_times=False,
+                drop_variables=list(drop_variables))
+            ds.encoding['source'] = files[int(group)]
+            if decode_times:
+                ds = _decode_time_variables(ds)
+            datasets.append(ds)
+
+        kwargs.setdefault('combine_attrs', 'override')
+        if decode_times:
+            ds = xr.combine_by_coords(datasets, **kwargs)
+        else:
+            # Numeric times with different units can not be ordered so keep the file order
+            ds = xr.combine_nested(datasets, concat_dim='time', **kwargs)
+
+    ds.attrs['_files'] = [files[int(group)] for group in groups]
+
+    return ds
+
+
+def load_reference_index(index):
+    """
+    Returns a reference index read from a JSON file. An index already
+    read is returned unchanged.
+
+    Parameters
+    ----------
+    index : str, pathlib.Path or dict
+        Name of JSON index file or index returned from create_reference_index().
+
+    Returns
+    -------
+    index : dict
+        Reference index in Kerchunk version 1 format.
+
+    """
+    if isinstance(index, (str, PathLike)):
+        with open(index) as fh:
+            index = json.load(fh)
+
+    return index
+
+
+def reference_index_files(index):
+    """
+    Returns the sorted list of file names in a reference index.
+
+    Parameters
+    ----------
+    index : str, pathlib.Path or dict
+        Name of JSON index file or index returned from create_reference_index().
+
+    Returns
+    -------
+    files : list of str
+        Full path file names in the index.
+
+    """
+    index = load_reference_index(index)
+
+    return json.loads(index['refs']['.zattrs'])['files']
+
+
+def _combine_references(refs, groups, drop_variables):
+    """
+    Returns the references of the file groups combined into one Zarr group
+    concatenated along time, the number of times in each file and the time
+    units and calendar of each file for variables with time units. Variables
+    without a time dimension are stacked along _FILE_DIMENSION. Returns None if
+    the files do not have the same variables and storage layout.
+
+    """
+    group_index = {group: ii for ii, group in enumerate(groups)}
+    variables = [{} for group in groups]
+    for key, value in refs.items():
+        parts = key.split('/')
+        if len(parts) != 3 or parts[0] not in group_index or parts[1] in drop_variables:
+            continue
+        var = variables[group_index[parts[0]]].setdefault(parts[1], {'chunks': {}})
+        if parts[2] in ['.zarray', '.zattrs']:
+            var[parts[2]] = json.loads(value)
+        else:
+            var['chunks'][parts[2]] = value
+
+    names = list(variables[0])
+    if 'time' not in names or any(set(group_vars) != set(names) for group_vars in variables):
+        return None
+    if any(group_vars['time']['.zattrs']['_ARRAY_DIMENSIONS'] != ['time'] for group_vars in variables):
+        return None
+
+    counts = [group_vars['time']['.zarray']['shape'][0] for group_vars in variables]
+    combined = {
+        '.zgroup': json.dumps({'zarr_format': 2}),
+        '.zattrs': refs[f'{groups[0]}/.zattrs'],
+    }
+    time_units = {}
+    num_chunks = 0
+    num_combined_chunks = 0
+    for name in names:
+        group_vars = [group_vars[name] for group_vars in variables]
+        zarrays = [var['.zarray'] for var in group_vars]
+        dims = group_vars[0]['.zattrs']['_ARRAY_DIMENSIONS']
+        along_time = dims[:1] == ['time']
+        for var, zarray in zip(group_vars, zarrays):
+            if var['.zattrs']['_ARRAY_DIMENSIONS'] != dims:
+                return None
+            if any(zarray[key] != zarrays[0][key] for key in ['dtype', 'compressor', 'filters', 'fill_value']):
+                return None
+            if zarray['chunks'][along_time:] != zarrays[0]['chunks'][along_time:]:
+                return None
+            if zarray['shape'][along_time:] != zarrays[0]['shape'][along_time:]:
+                return None
+        num_chunks += sum(len(var['chunks']) for var in group_vars)
+
+        zarray = dict(zarrays[0])
+        attrs = dict(group_vars[0]['.zattrs'])
+        if along_time:
+            result = _concatenate_time_chunks(group_vars, counts)
+            if result is None:
+                return None
+            size, chunk_refs = result
+            zarray['shape'] = [sum(counts)] + zarray['shape'][1:]
+            zarray['chunks'] = [size] + zarray['chunks'][1:]
+        elif 'time' in dims:
+            return None
+        elif dims == [name]:
+            # Dimension coordinates are the same in all files
+            chunk_refs = group_vars[0]['chunks']
+        else:
+            chunk_refs = {}
+            for ii, var in enumerate(group_vars):
+                for key, ref in var['chunks'].items():
+                    chunk_refs[str(ii) if len(dims) == 0 else f'{ii}.{key}'] = ref
+            zarray['shape'] = [len(groups)] + zarray['shape']
+            zarray['chunks'] = [1] + zarray['chunks']
+            attrs['_ARRAY_DIMENSIONS'] = [_FILE_DIMENSION] + dims
+            along_time = True
+
+        if along_time:
+            units = [(var['.zattrs'].get('units'), var['.zattrs'].get('calendar', 'standard'))
+                     for var in group_vars]
+            if isinstance(units[0][0], str) and ' since ' in units[0][0]:
+                time_units[name] = units
+
+        combined[f'{name}/.zarray'] = json.dumps(zarray)
+        combined[f'{name}/.zattrs'] = json.dumps(attrs)
+        for key, ref in chunk_refs.items():
+            combined[f'{name}/{key}'] = ref
+        num_combined_chunks += len(chunk_refs)
+
+    if num_combined_chunks > _MAX_CHUNK_RATIO * max(num_chunks, 1):
+        return None
+
+    # Time bounds without units use the units of the time variable
+    for name, units in list(time_units.items()):
+        bounds = variables[0][name]['.zattrs'].get('bounds')
+        if bounds in names and bounds not in time_units and 'units' not in variables[0][bounds]['.zattrs']:
+            time_units[bounds] = units
+
+    return combined, counts, time_units
+
+
+def _concatenate_time_chunks(group_vars, counts):
+    """
+    Returns the chunk size along time and the chunk references of a variable
+    concatenated along time from each file. Chunks without compression or filters
+    that are not split along the other dimensions are split into smaller chunks so
+    each file starts at a chunk boundary. Returns None if no chunk size fits the
+    chunks of each file.
+
+    """
+    zarrays = [var['.zarray'] for var in group_vars]
+    row_size = int(np.prod(zarrays[0]['shape'][1:], dtype=np.int64)) * np.dtype(zarrays[0]['dtype']).itemsize
+    splittable = [
+        zarray['compressor'] is None and zarray['filters'] is None and zarray['chunks'][1:] == zarray['shape'][1:]
+        for zarray in zarrays
+    ]
+
+    with_data = [ii for ii, count in enumerate(counts) if count > 0]
+    if len(with_data) == 0:
+        return zarrays[0]['chunks'][0], {}
+
+    fixed = {zarrays[ii]['chunks'][0] for ii in with_data if not splittable[ii]}
+    if len(fixed) > 1:
+        return None
+    if len(fixed) == 1:
+        size = fixed.pop()
+    else:
+        size = 0
+        for ii in with_data:
+            size = math.gcd(size, zarrays[ii]['chunks'][0])
+            if ii != with_data[-1]:
+                size = math.gcd(size, counts[ii])
+
+    # Each file must start at a chunk boundary
+    if any(counts[ii] % size != 0 for ii in with_data[:-1]):
+        return None
+    if any(zarrays[ii]['chunks'][0] % size != 0 for ii in with_data):
+        return None
+
+    chunk_refs = {}
+    start = 0
+    for var, zarray, split, count in zip(group_vars, zarrays, splittable, counts):
+        chunk_size = zarray['chunks'][0]
+        for key, ref in var['chunks'].items():
+            index = key.split('.')
+            first_row = int(index[0]) * chunk_size
+            if not split or chunk_size == size:
+                chunk_refs['.'.join([str((start + first_row) // size)] + index[1:])] = ref
+                continue
+
+            if isinstance(ref, str):
+                data = base64.b64decode(ref[len('base64:'):])
+            for row in range(first_row, min(first_row + chunk_size, count), size):
+                offset = (row - first_row) * row_size
+                if isinstance(ref, str):
+                    piece = 'base64:' + base64.b64encode(data[offset:offset + size * row_size]).decode()
+                else:
+                    piece = [ref[0], ref[1] + offset, size * row_size]
+                chunk_refs['.'.join([str((start + row) // size)] + index[1:])] = piece
+        start += count
+
+    return size, chunk_refs
+
+
+def _decode_combined_time_variables(ds, time_units, counts):
+    """
+    Decodes the time variables of a combined Dataset using the time units of each
+    file. Returns None if the units of a file can not be decoded with
+    act.utils.datetime_utils.decode_time_values().
+
+    """
+    data_vars = {}
+    coords = {}
+    for name, units in time_units.items():
+        if name not in ds.variables or len(set(units)) == 1:
+            continue
+        if any(calendar.lower() not in ['standard', 'gregorian', 'proleptic_gregorian']
+               for _, calendar in units):
+            return None
+        try:
+            parsed = [parse_time_units(unit) for unit, _ in units]
+        except ValueError:
+            return None
+
+        var = ds[name].variable
+        shape = (-1,) + (1,) * (var.ndim - 1)
+        factor = np.repeat([factor for factor, _ in parsed], counts).reshape(shape)
+        reference = np.repeat(np.array([reference for _, reference in parsed]), counts).reshape(shape)
+        attrs = {key: value for key, value in var.attrs.items() if key not in ['units', 'calendar']}
+        encoding = dict(var.encoding)
+        encoding['units'], encoding['calendar'] = units[0]
+        new_var = xr.Variable(var.dims, _decode_time_ns(var.data, factor, reference), attrs, encoding)
+        if name in ds.coords:
+            coords[name] = new_var
+        else:
+            data_vars[name] = new_var
+
+    # Variables with the same units in every file are decoded together
+    return _decode_time_variables(ds.assign_coords(coords).assign(data_vars))
+
+
+def _file_references(filename, group):
+    """
+    Returns the references for each variable of one netCDF4/HDF5 file as a Zarr group.
+
+    """
+    refs = {}
+    try:
+        h5f = h5py.File(filename, 'r')
+    except OSError:
+        raise ValueError(f'{filename} is not a netCDF4/HDF5 file and can not be indexed.')
+
+    with h5f:
+        refs[f'{group}/.zgroup'] = json.dumps({'zarr_format': 2})
+        refs[f'{group}/.zattrs'] = json.dumps(_json_attributes(h5f.attrs))
+
+        for var_name, dset in h5f.items():
+            if not isinstance(dset, h5py.Dataset):
+                continue
+            if dset.dtype.kind in 'OV':
+                warnings.warn(f'{var_name} in {filename} has a variable length or compound data type '
+                              'and is not included in the reference index.', UserWarning)
+                continue
+            # Dimensions without coordinate variables are stored as empty datasets
+            if str(dset.attrs.get('NAME', b'')).find('This is a netCDF dimension but not a netCDF variable') >= 0:
+                continue
+
+            if 'DIMENSION_LIST' in dset.attrs:
+                dims = [h5f[ref[0]].name.lstrip('/') for ref in dset.attrs['DIMENSION_LIST']]
+            elif dset.ndim == 1:
+                dims = [var_name]
+            else:
+                dims = []
+
+            attrs = _json_attributes(dset.attrs)
+            attrs['_ARRAY_DIMENSIONS'] = dims
+
+            fill_value = dset.attrs.get('_FillValue')
+            if fill_value is not None:
+                fill_value = np.asarray(fill_value).item()
+                if isinstance(fill_value, float) and np.isnan(fill_value):
+                    fill_value = 'NaN'
+
+            filters = None
+            compressor = None
+            if dset.shuffle:
+                filters = [{'id': 'shuffle', 'elementsize': dset.dtype.itemsize}]
+            if dset.compression == 'gzip':
+                compressor = {'id': 'zlib', 'level': dset.compression_opts}
+            elif dset.compression is not None or dset.fletcher32 or dset.scaleoffset is not None:
+                raise ValueError(f'{var_name} in {filename} uses an HDF5 filter that can not be indexed.')
+
+            chunks = dset.chunks if dset.chunks is not None else dset.shape
+            zarray = {
+                'zarr_format': 2,
+                'shape': list(dset.shape),
+                'chunks': [max(size, 1) for size in chunks],
+                'dtype': dset.dtype.str,
+                'compressor': compressor,
+                'filters': filters,
+                'fill_value': fill_value,
+                'order': 'C',
+            }
+            refs[f'{group}/{var_name}/.zarray'] = json.dumps(zarray)
+            refs[f'{group}/{var_name}/.zattrs'] = json.dumps(attrs)
+
+            if dset.chunks is not None:
+                for jj in range(dset.id.get_num_chunks()):
+                    info = dset.id.get_chunk_info(jj)
+                    key = '.'.join(str(offset // size) for offset, size in zip(info.chunk_offset, dset.chunks))
+                    refs[f'{group}/{var_name}/{key}'] = [filename, info.byte_offset, info.size]
+            else:
+                key = '.'.join(['0'] * max(dset.ndim, 1))
+                offset = dset.id.get_offset()
+                if offset is not None:
+                    refs[f'{group}/{var_name}/{key}'] = [filename, offset, dset.id.get_storage_size()]
+                elif dset.size > 0:
+                    # Compact storage is in the header so store the values in the index
+                    data = np.ascontiguousarray(dset[()]).tobytes()
+                    refs[f'{group}/{var_name}/{key}'] = 'base64:' + base64.b64encode(data).decode()
+
+    return refs
+
+
+def _json_attributes(attrs):
+    """
+    Returns HDF5 attributes as a dictionary of JSON types.
+
+    """
+    json_attrs = {}
+    for key, value in attrs.items():
+        if key in _SKIP_ATTRIBUTES:
+            continue
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', errors='replace')
+        elif isinstance(value, np.ndarray):
+            value = [ii.decode('utf-8', errors='replace') if isinstance(ii, bytes) else ii
+                     for ii in value.tolist()]
+            if len(value) == 1:
+                value = value[0]
+        elif isinstance(value, np.generic):
+            value = value.item()
+        json_attrs[key] = value
+
+    return json_attrs
@@ -3,9 +3,10 @@ This module contains I/O operations for loading Sodar files.
 
 """
 
-import datetime as dt
+import io
 import re
 
+import dask
 import fsspec
 import numpy as np
 import pandas as pd
@@ -13,8 +14,11 @@ import xarray as xr
 
 from act.io.noaapsl import filter_list
 
+# Date and time at the start of each profile block
+_TIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}\ \d{2}:\d{2}:\d{2}')
 
-def read_mfas_sodar(filepath):
+
+def read_mfas_sodar(filepath, parallel=True, num_workers=None, scheduler='threads'):
     """
     Returns `xarray.Dataset` with stored data and metadata from a user-defined
     Flat Array MFAS Sodar file. More information can be found here:
@@ -22,8 +26,15 @@ def read_mfas_sodar(filepath):
 
     Parameters
     ----------
-    filepath : str
-        Name of file to read.
+    filepath : str or list
+        Name of file(s) to read. Multiple files are concatenated along time.
+    parallel : boolean
+        Option to read multiple files in parallel using Dask.
+    num_workers : int or None
+        Number of workers in the pool used when parallel is True. If None will use
+        the Dask default.
+    scheduler : str
+        Dask scheduler to use when parallel is True. 'threads' or 'processes'.
 
     Return
     ------
@@ -31,87 +42,116 @@ def read_mfas_sodar(filepath):
         Standard Xarray dataset with the data.
 
     """
-    file = fsspec.open(filepath).open()
-    lines = file.readlines()
-    lines = [x.decode().rstrip()[:] for x in lines]
-
-    # Retrieve number of height values from line 3.
-    _, _, len_height = filter_list(lines[3].split()).astype(int)
-
-    # Retrieve metadata
-    file_dict, variable_dict = _metadata_retrieval(lines)
-
-    # Retrieve datetimes and time indices from when datetime rows appear
-    skip_time_ind = []
-    datetimes = []
-    fmt = '%Y-%m-%d %H:%M:%S'
-    for i, line in enumerate(lines):
-        match = re.search(r'\d{4}-\d{2}-\d{2}\ \d{2}:\d{2}:\d{2}', line)
-        if match is None:
-            continue
-        else:
-            date_object = dt.datetime.strptime(match.group(0), fmt)
-            datetimes.append(date_object)
-            skip_time_ind.append(i)
-
-    datetimes = np.delete(datetimes, 0)
-    # Create datetime column with matching datetimes to heights
-    data_times = pd.DataFrame(datetimes, columns=['Dates'])
-    repeat_times = data_times.loc[data_times.index.repeat(len_height)]
-
-    # This is used to pull only actual data.
-    # Code can be added as well to read in the metadata from the first few rows.
-    skip_meta_ind = np.arange(0, skip_time_ind[1] + 1, 1)
-    skip_full_ind = np.append(skip_meta_ind, skip_time_ind)
-    skip_full_ind = np.unique(skip_full_ind)
-
-    # Column row appears 1 row after first time, retrieve column names from that.
-    columns = np.delete(filter_list(lines[skip_time_ind[1] + 1].split(' ')), 0).tolist()
+    if not isinstance(filepath, (list, tuple)):
+        return _read_mfas_sodar_file(filepath)
 
-    # Tmp column allows for the # column to be pushed over and dropped.
-    tmp_columns = columns + ['tmp']
+    dask_config = {'scheduler': scheduler if parallel else 'synchronous'}
+    if parallel and num_workers is not None:
+        dask_config['num_workers'] = num_workers
+    tasks = [dask.delayed(_read_mfas_sodar_file)(f) for f in filepath]
+    with dask.config.set(dask_config):
+        datasets = dask.compute(*tasks)
 
-    # Parse data to a dataframe skipping rows that aren't data.
-    # tmp_columns is used to removed '#' column that causes
-    # columns to move over by one.
-    df = pd.read_table(filepath,
-                       sep=r'\s+',
-                       skiprows=skip_full_ind,
-                       names=tmp_columns,
-                       usecols=columns)
+    if len(datasets) == 1:
+        return datasets[0]
 
-    df = df[~df['W'].isin(['dir'])].reset_index(drop=True)
+    return xr.concat(datasets, dim='time', join='outer', combine_attrs='override')
 
-    # Set index to datetime column.
-    df = df.set_index(repeat_times['Dates'])
 
-    # Convert dataframe to xarray dataset.
-    ds = df.to_xarray()
-
-    # Convert height to float.
-    ds['z'] = ds.z.astype(float)
-
-    # Convert all variables from string to float.
-    ds = ds.astype(float)
+def _read_mfas_sodar_file(filepath):
+    """
+    Returns `xarray.Dataset` with the data and metadata of one MFAS Sodar file.
+    Each profile block is a time line, a column name line and one line for
+    each height. The profile blocks are located using the number of heights
+    from the header, the values of all blocks are parsed in one pass and
+    copied into preallocated 2D time by height arrays.
 
-    # Convert variables that should be int back to int.
-    ds['error'] = ds.error.astype(int)
-    ds['PGz'] = ds.PGz.astype(int)
+    """
+    with fsspec.open(filepath) as file:
+        lines = file.read().decode().splitlines()
+    lines = [x.rstrip() for x in lines]
 
-    # Get unique time and height values.
-    time_dim = np.unique(ds.Dates.values)
-    height_dim = np.unique(ds.z.values)
+    # Retrieve number of height values from line 3.
+    _, _, len_height = filter_list(lines[3].split()).astype(int)
 
-    # Use unique time and height values to reindex data to be two dimensional.
-    ind = pd.MultiIndex.from_product((time_dim, height_dim), names=('time', 'height'))
+    # Retrieve metadata from the lines before the data block.
+    data_ind = lines.index('# beginning of data block')
+    file_dict, variable_dict = _metadata_retrieval(lines[:data_ind + 1])
 
-    # Xarray 2023.9 contains new syntax, adding try and except for
-    # previous version.
-    try:
-        mindex_coords = xr.Coordinates.from_pandas_multiindex(ind, 'Dates')
-        ds = ds.assign_coords(mindex_coords).unstack("Dates")
-    except AttributeError:
-        ds = ds.assign(Dates=ind).unstack("Dates")
+    # Retrieve datetimes and the data lines of each profile block. The next
+    # block is expected after the heights of the current block.
+    datetimes = []
+    block_rows = []
+    data_lines = []
+    column_ind = None
+    i = data_ind + 1
+    while i < len(lines):
+        if _TIME_PATTERN.match(lines[i]) is None:
+            i += 1
+            continue
+        if column_ind is None:
+            column_ind = i + 1
+        datetimes.append(lines[i][:19].replace(' ', 'T'))
+        block = lines[i + 2:i + 2 + len_height]
+        block = block[:_block_length(block)]
+        block_rows.append(len(block))
+        data_lines.extend(block)
+        i += 2 + len(block)
+
+    if len(datetimes) == 0:
+        raise ValueError(f'No data blocks found in {filepath}')
+    datetimes = np.array(datetimes, dtype='datetime64[ns]')
+
+    # Column row appears 1 row after each time, retrieve column names from
+    # the first. The first column is the # comment character.
+    columns = lines[column_ind].split()[1:]
+    int_columns = ['error', 'PGz']
+
+    # Parse the values of all blocks at once.
+    values = pd.read_csv(io.StringIO('\n'.join(data_lines)), sep=r'\s+', header=None,
+                         names=columns, dtype=float).to_numpy()
+
+    # Preallocate the 2D arrays and copy the values of each block into them.
+    data = {}
+    for name in columns:
+        if name in int_columns:
+            data[name] = np.zeros((datetimes.size, len_height), dtype=int)
+        else:
+            data[name] = np.full((datetimes.size, len_height), np.nan)
+
+    block_rows = np.array(block_rows)
+    if np.all(block_rows == len_height):
+        values = values.reshape(datetimes.size, len_height, len(columns))
+        for j, name in enumerate(columns):
+            data[name][:] = values[:, :, j]
+    else:
+        offsets = np.concatenate([[0], np.cumsum(block_rows)])
+        for k in range(datetimes.size):
+            for j, name in enumerate(columns):
+                data[name][k, :block_rows[k]] = values[offsets[k]:offsets[k + 1], j]
+
+    # All profiles need the heights of the longest profile.
+    z = data['z']
+    height = z[np.argmax(block_rows)].astype(float)
+    rows = np.arange(len_height) < block_rows[:, np.newaxis]
+    if not np.all((z == height)[rows]):
+        raise ValueError(f'Profiles in {filepath} have different heights.')
+
+    # Change fill values to nans for floats and 0 for ints with one mask for
+    # each variable. The fill value changes between variables.
+    for name in columns:
+        if name in ['z', 'error']:
+            continue
+        elif name == 'PGz':
+            data[name][data[name] == 99] = 0
+        elif name in variable_dict:
+            data[name][data[name] == variable_dict[name]['_FillValue']] = np.nan
+
+    ds = xr.Dataset(coords={'time': ('time', datetimes), 'height': ('height', height)})
+    for name in columns:
+        if name == 'z':
+            continue
+        ds[name] = (('time', 'height'), data[name])
 
     # Add file metadata.
     for key in file_dict.keys():
@@ -119,30 +159,28 @@ def read_mfas_sodar(filepath):
 
     # Add metadata to the attributes of each variable.
     for key in variable_dict.keys():
-        ds[key].attrs = variable_dict[key]
-
-    # Change fill values to nans for floats and 0 for ints.
-    # We can't use xr.replace as the fill value changes between variables.
-    for var in ds.data_vars:
-        if var == 'error':
-            continue
-        elif var == 'PGz':
-            data_with_fill = ds[var].values
-            data_with_fill[data_with_fill == 99] = 0
-            ds[var].values = data_with_fill
-        else:
-            data_with_fill = ds[var].values
-            fill_value = ds[var].attrs['_FillValue']
-            data_with_fill[data_with_fill == fill_value] = np.nan
-            ds[var].values = data_with_fill
+        if key in ds.variables:
+            ds[key].attrs = variable_dict[key]
 
-    # Drop z as its already a coordinate and give coordinate the same attributes.
-    ds.height.attrs = ds['z'].attrs
-    ds = ds.drop_vars('z')
+    # Give the height coordinate the height attributes.
+    ds['height'].attrs = variable_dict['z']
 
     return ds
 
 
+def _block_length(block):
+    """
+    Returns the number of data lines at the start of a profile block before
+    a blank line or the next profile. Lines have trailing whitespace removed.
+
+    """
+    for i, line in enumerate(block):
+        if line == '' or (line[0].isdigit() and _TIME_PATTERN.match(line) is not None):
+            return i
+
+    return len(block)
+
+
 def _metadata_retrieval(lines):
     # File format from line 0.
     _format = lines[0]
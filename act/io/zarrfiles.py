@@ -0,0 +1,281 @@
+"""
+This module contains I/O operations for writing and reading Zarr stores of
+ARM datasets. The attributes ACT uses for quality control variables and the
+ACT global attributes are kept through a write and read.
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from act.config import DEFAULT_DATASTREAM_NAME
+from act.io.armfiles import _decode_time_variables, check_arm_standards
+from act.utils.datetime_utils import encode_time_values
+
+try:
+    import zarr
+    _ZARR_AVAILABLE = True
+except ImportError:
+    _ZARR_AVAILABLE = False
+
+# Attribute holding the numpy type of attributes that are not JSON types so they
+# can be restored when reading.
+_ATTRIBUTE_TYPES = '_act_attribute_types'
+# Global attributes holding lists of values from each file that are combined when
+# appending to a store.
+_FILE_ATTRIBUTES = ['_file_dates', '_file_times']
+
+
+def write_zarr(ds, store, time_chunk=None, target_chunk_size=16 * 2**20, **kwargs):
+    """
+    Writes a Dataset to a Zarr store. If the store does not exist it is created
+    chunked along time. If the store exists, samples after the last time in the store
+    are appended along time and samples with times already in the store are written
+    in place using a region write. Only the chunks holding the new samples are written.
+    Variables without a time dimension in the store are not written again.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset to write. Not modified.
+    store : str, pathlib.Path or MutableMapping
+        Zarr store or name of directory to write.
+    time_chunk : int or None
+        Number of time samples in each chunk when creating the store. If None is
+        chosen from the largest variable so chunks are close to target_chunk_size.
+        Ignored when writing to an existing store.
+    target_chunk_size : int
+        Target chunk size in bytes used when time_chunk is None.
+    **kwargs : keywords
+        Keywords to pass through to xarray.Dataset.to_zarr(). Set mode='w' to
+        replace an existing store.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        for filename in sorted(glob.glob('/data/sgpmetE13.b1/sgpmetE13.b1.2019*.cdf')):
+            ds = act.io.armfiles.read_netcdf(filename)
+            ds.clean.cleanup()
+            act.io.zarrfiles.write_zarr(ds, '/data/sgpmetE13.b1.zarr')
+
+    """
+    if not _ZARR_AVAILABLE:
+        raise ImportError('Zarr is required to write Zarr stores but is not installed')
+
+    if isinstance(store, Path):
+        store = str(store)
+
+    # Shallow copy so attribute changes do not modify the Dataset
+    write_ds = ds.copy(deep=False)
+    for var in write_ds.variables.values():
+        var.attrs = _encode_attributes(var.attrs)
+        # Remove netCDF encodings not valid for Zarr
+        var.encoding = {key: value for key, value in var.encoding.items()
+                        if key in ['units', 'calendar', 'dtype', '_FillValue', 'scale_factor', 'add_offset']}
+    write_ds.attrs = _encode_attributes(write_ds.attrs)
+
+    group = None
+    if kwargs.get('mode') != 'w':
+        try:
+            group = zarr.open_group(store, mode='r')
+        except (zarr.errors.GroupNotFoundError, FileNotFoundError):
+            group = None
+
+    if group is not None:
+        if 'time' not in group:
+            raise ValueError('The Zarr store has no time variable so samples can not be written to it.')
+        if 'time' not in write_ds.dims:
+            raise ValueError('The Dataset has no time dimension so can not be written to an existing Zarr store.')
+        store_times = xr.open_zarr(store, decode_times=False)['time']
+
+    if group is None:
+        if 'time' in write_ds.dims:
+            if time_chunk is None:
+                time_chunk = _time_chunk_size(write_ds, target_chunk_size)
+            write_ds = write_ds.chunk({'time': time_chunk})
+        kwargs.setdefault('consolidated', True)
+        write_ds.to_zarr(store, **kwargs)
+        return
+
+    # Encode the new times with the store time units to find where they go
+    store_chunk = group['time'].chunks[0]
+    store_size = store_times.size
+    times = encode_time_values(write_ds['time'].values, store_times.attrs['units'], dtype=store_times.dtype)
+    index = np.searchsorted(store_times.values, times)
+    in_store = (index < store_size) & (store_times.values[np.minimum(index, store_size - 1)] == times)
+
+    # Variables without time in the store are not written again
+    write_ds = write_ds.drop_vars([
+        name for name in write_ds.variables
+        if name in group and 'time' not in group[name].attrs.get('_ARRAY_DIMENSIONS', [])])
+
+    for key in _FILE_ATTRIBUTES:
+        values = list(group.attrs.get(key, [])) + list(write_ds.attrs.get(key, []))
+        write_ds.attrs[key] = list(dict.fromkeys(values))
+
+    kwargs.setdefault('consolidated', True)
+    if in_store.all():
+        # Region write of samples already in the store
+        start = int(index[0])
+        end = int(index[-1]) + 1
+        if end - start != times.size:
+            raise ValueError('Times to write in place are not contiguous in the Zarr store.')
+
+        write_ds = write_ds.drop_vars([name for name, var in write_ds.variables.items()
+                                       if 'time' not in var.dims])
+        write_ds = write_ds.chunk({'time': _aligned_time_chunks(start, times.size, store_chunk)})
+        write_ds.to_zarr(store, region={'time': slice(start, end)}, **kwargs)
+        zarr.open_group(store, mode='r+').attrs.update(
+            {key: write_ds.attrs[key] for key in _FILE_ATTRIBUTES if key in write_ds.attrs})
+        if kwargs['consolidated']:
+            zarr.consolidate_metadata(store)
+
+    elif not in_store.any() and times[0] > store_times.values[-1]:
+        write_ds = write_ds.chunk({'time': _aligned_time_chunks(store_size, times.size, store_chunk)})
+        write_ds.to_zarr(store, append_dim='time', **kwargs)
+
+    else:
+        raise ValueError('Times to write overlap the Zarr store times. Write samples '
+                         'already in the store and new samples separately.')
+
+
+def read_zarr(store, decode_times=True, **kwargs):
+    """
+    Returns `xarray.Dataset` read lazily from a Zarr store written with
+    write_zarr(). Time variables are decoded the same as read_netcdf() and the ACT
+    attribute types are restored.
+
+    Parameters
+    ----------
+    store : str, pathlib.Path or MutableMapping
+        Zarr store or name of directory to read.
+    decode_times : boolean
+        Option to decode time values to datetime64.
+    **kwargs : keywords
+        Keywords to pass through to xarray.open_zarr().
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        ACT Xarray dataset.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import act
+
+        ds = act.io.zarrfiles.read_zarr('/data/sgpmetE13.b1.zarr')
+        ds = ds.sel(time=slice('2019-01-02', '2019-01-03'))
+
+    """
+    if not _ZARR_AVAILABLE:
+        raise ImportError('Zarr is required to read Zarr stores but is not installed')
+
+    if isinstance(store, Path):
+        store = str(store)
+
+    ds = xr.open_zarr(store, decode_times=False, **kwargs)
+    if decode_times:
+        ds = _decode_time_variables(ds)
+
+    for var in ds.variables.values():
+        var.attrs = _decode_attributes(var.attrs)
+    ds.attrs = _decode_attributes(ds.attrs)
+
+    is_arm_file_flag = check_arm_standards(ds)
+    if '_datastream' not in ds.attrs:
+        if is_arm_file_flag == 0:
+            ds.attrs['_datastream'] = DEFAULT_DATASTREAM_NAME
+        else:
+            ds.attrs['_datastream'] = ds.attrs['datastream']
+    ds.attrs['_arm_standards_flag'] = is_arm_file_flag
+
+    return ds
+
+
+def _encode_attributes(attrs):
+    """
+    Returns attributes with numpy values converted to JSON types and the numpy
+    types recorded in the _act_attribute_types attribute.
+
+    """
+    new_attrs = {}
+    types = {}
+    for key, value in attrs.items():
+        if isinstance(value, np.ndarray):
+            types[key] = ['ndarray', str(value.dtype)]
+            value = value.tolist()
+        elif isinstance(value, np.generic):
+            types[key] = ['scalar', str(value.dtype)]
+            value = value.item()
+        elif isinstance(value, (list, tuple)):
+            if len(value) > 0 and all(isinstance(ii, np.generic) for ii in value):
+                types[key] = ['list', str(np.asarray(value).dtype)]
+            value = [ii.item() if isinstance(ii, np.generic) else ii for ii in value]
+        new_attrs[key] = value
+
+    if len(types) > 0:
+        new_attrs[_ATTRIBUTE_TYPES] = types
+
+    return new_attrs
+
+
+def _decode_attributes(attrs):
+    """
+    Returns attributes with the numpy types recorded by _encode_attributes() restored.
+
+    """
+    attrs = dict(attrs)
+    types = attrs.pop(_ATTRIBUTE_TYPES, {})
+    for key, (kind, dtype) in types.items():
+        if key not in attrs:
+            continue
+        value = np.asarray(attrs[key], dtype=dtype)
+        if kind == 'ndarray':
+            attrs[key] = value
+        elif kind == 'scalar':
+            attrs[key] = value[()]
+        else:
+            attrs[key] = list(value)
+
+    return attrs
+
+
+def _time_chunk_size(ds, target_chunk_size):
+    """
+    Returns the number of time samples per chunk so the largest variable chunk is
+    close to the target size in bytes.
+
+    """
+    bytes_per_time = 1
+    for var in ds.variables.values():
+        if 'time' not in var.dims:
+            continue
+        size = var.dtype.itemsize * int(np.prod([length for dim, length in var.sizes.items() if dim != 'time']))
+        bytes_per_time = max(bytes_per_time, size)
+
+    return int(max(target_chunk_size // bytes_per_time, 1))
+
+
+def _aligned_time_chunks(start, size, chunk):
+    """
+    Returns Dask chunk lengths along time for writing size samples at index start
+    so each Dask chunk writes to only one Zarr chunk of length chunk.
+
+    """
+    chunks = []
+    first = min(chunk - start % chunk, size)
+    if first > 0:
+        chunks.append(first)
+    size -= first
+    chunks.extend([chunk] * (size // chunk))
+    if size % chunk > 0:
+        chunks.append(size % chunk)
+
+    return tuple(chunks)
@@ -138,7 +138,10 @@ def get_waveform_statistics(ds, config_file, parallel=False, num_records=None):
         If true, use dask to enable parallelism
     num_records: int or None
         Only process first num_records datapoints. Set to
-        None to process all records.
+        None to process all records. When set the dataset is subset to
+        the records processed and loaded, so with a dataset from
+        act.io.pysp2.read_sp2_mmap only those records are read. When
+        None the dataset is passed to pysp2 without loading.
 
     Returns
     -------
@@ -147,6 +150,10 @@ def get_waveform_statistics(ds, config_file, parallel=False, num_records=None):
     """
     if PYSP2_AVAILABLE:
         config = pysp2.io.read_config(config_file)
+        # Only the records processed are read from a lazy dataset, the whole
+        # dataset is left to pysp2 to read
+        if num_records is not None:
+            ds = ds.isel(event_index=slice(0, num_records)).load()
         return pysp2.util.gaussian_fit(ds, config, parallel, num_records)
     else:
         raise ModuleNotFoundError('PySP2 must be installed in order to process SP2 data.')
@@ -3,6 +3,7 @@ import os
 from datetime import datetime
 
 import numpy as np
+import pytest
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
@@ -290,7 +291,272 @@ def test_arm_doi():
     assert "No DOI Found" in doi
 
 
-def test_download_surfrad():
-    results = act.discovery.download_surfrad(site='tbl', startdate='20230601', enddate='20230602')
+def test_download_surfrad(tmp_path):
+    results = act.discovery.download_surfrad(site='tbl', startdate='20230601', enddate='20230602',
+                                             output=str(tmp_path))
     assert len(results) == 2
     assert 'tbl23152.dat' in results[0]
+
+
+def test_download_arm_data_local_server(tmp_path, monkeypatch):
+    import http.server
+    import json
+    import threading
+    from urllib.parse import parse_qs, urlparse
+
+    files = {
+        'sgpmetE13.b1.20200101.000000.cdf': os.urandom(300000),
+        'sgpmetE13.b1.20200102.000000.cdf': os.urandom(200000),
+    }
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path.endswith('/query'):
+                names = list(files) + list(files)[:1] + ['sgpmetE13.b1.20200103.000000.cdf']
+                body = json.dumps({'status': 'success', 'files': names}).encode()
+                status = 200
+            else:
+                name = query['file'][0]
+                body = files.get(name, b'This data file is not available on /data/archive.')
+                start = 0
+                if 'Range' in self.headers:
+                    start = int(self.headers['Range'].split('=')[1].split('-')[0])
+                requests_seen.append((name, start))
+                status = 206 if start > 0 else 200
+                body = body[start:]
+                # Drop the connection half way through the first request of the first file
+                if name == list(files)[0] and len(requests_seen) == 1:
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body[:len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_HEAD(self):
+            name = parse_qs(urlparse(self.path).query)['file'][0]
+            requests_seen.append((name, 'HEAD'))
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(files[name])))
+            self.end_headers()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(act.discovery.get_arm, '_LIVE_DATA_URL',
+                        f'http://127.0.0.1:{server.server_port}/armlive/livedata/')
+    monkeypatch.setattr(act.discovery.get_arm, 'get_arm_doi', lambda *args: 'DOI')
+    monkeypatch.setitem(act.discovery.cache._CACHE_CONFIG, 'cache_dir', None)
+
+    try:
+        results = act.discovery.get_arm.download_arm_data(
+            'user', 'token', 'sgpmetE13.b1', '2020-01-01', '2020-01-03', output=str(tmp_path),
+            num_workers=1, backoff=0)
+        assert [os.path.basename(f) for f in results] == list(files)
+        for name, data in files.items():
+            with open(tmp_path / name, 'rb') as fh:
+                assert fh.read() == data
+        assert not glob.glob(str(tmp_path / '*.part'))
+        # The dropped download is resumed from where it stopped
+        assert requests_seen[1][0] == list(files)[0]
+        assert 0 < requests_seen[1][1] <= 150000
+
+        # Files with the same size on disk are not downloaded again
+        num_requests = len(requests_seen)
+        results = act.discovery.get_arm.download_arm_data(
+            'user', 'token', 'sgpmetE13.b1', '2020-01-01', '2020-01-03', output=str(tmp_path),
+            backoff=0)
+        assert len(results) == 2
+        assert sorted(str(start) for _, start in requests_seen[num_requests:]) == ['0', 'HEAD', 'HEAD']
+
+        # Cached files are not read from the cache by other users
+        cache = act.discovery.cache
+        for key in cache._CACHE_CONFIG:
+            monkeypatch.setitem(cache._CACHE_CONFIG, key, cache._CACHE_CONFIG[key])
+        act.discovery.set_download_cache(tmp_path / 'cache')
+        downloaded = []
+        for ii, user in enumerate(['user', 'user', 'other']):
+            num_requests = len(requests_seen)
+            act.discovery.get_arm.download_arm_data(
+                user, 'token', 'sgpmetE13.b1', '2020-01-01', '2020-01-03',
+                output=str(tmp_path / str(ii)), backoff=0)
+            downloaded.append(sorted(name[-19:-4] for name, _ in requests_seen[num_requests:]))
+        # The unavailable file is never cached
+        assert downloaded == [['20200101.000000', '20200102.000000', '20200103.000000'],
+                              ['20200103.000000'],
+                              ['20200101.000000', '20200102.000000', '20200103.000000']]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_neon_data_signed_urls(tmp_path, monkeypatch):
+    import hashlib
+    import json
+    import urllib.error
+
+    cache = act.discovery.cache
+    get_neon = act.discovery.get_neon
+    data_url = 'http://data.neonscience.org/api/v0/data/DP1.00002.001/BARR/2022-10'
+    listings = []
+    expired = [0]
+
+    # Each listing signs the file urls, urls of listings up to expired[0] are not valid
+    def read_url(url, timeout=None):
+        assert url == data_url
+        listings.append(url)
+        files = [{'name': name, 'url': f'https://storage/{name}?sig={len(listings)}'}
+                 for name in ['readme.txt', 'data.csv']]
+        return json.dumps({'data': {'files': files}}).encode()
+
+    def stream_url(url, output_file, timeout=None):
+        if int(url.split('?sig=')[1]) <= expired[0]:
+            raise urllib.error.HTTPError(url, 403, 'Forbidden', None, None)
+        with open(output_file, 'w') as fh:
+            fh.write(url.split('/')[-1].split('?')[0])
+
+    for module in [cache, get_neon]:
+        monkeypatch.setattr(module, '_read_url', read_url)
+        monkeypatch.setattr(module, '_stream_url', stream_url)
+    for key in cache._CACHE_CONFIG:
+        monkeypatch.setitem(cache._CACHE_CONFIG, key, cache._CACHE_CONFIG[key])
+
+    act.discovery.set_download_cache(tmp_path / 'cache')
+    files = get_neon.download_neon_data('BARR', 'DP1.00002.001', '2022-10', output_dir=str(tmp_path / 'a'))
+    assert [os.path.basename(fl) for fl in files] == ['readme.txt', 'data.csv']
+
+    # A file removed from the cache is downloaded with the urls of a new listing
+    expired[0] = len(listings)
+    key_hash = hashlib.sha256((data_url + '/data.csv').encode()).hexdigest()
+    os.remove(tmp_path / 'cache' / 'keys' / (key_hash + '.json'))
+    num_listings = len(listings)
+    files = get_neon.download_neon_data('BARR', 'DP1.00002.001', '2022-10', output_dir=str(tmp_path / 'b'))
+    assert open(files[1]).read() == 'data.csv'
+    assert len(listings) == num_listings + 1
+
+    # Without the cache the listing is only read once
+    act.discovery.set_download_cache(None)
+    num_listings = len(listings)
+    files = get_neon.download_neon_data('BARR', 'DP1.00002.001', '2022-10', output_dir=str(tmp_path / 'c'))
+    assert len(files) == 2
+    assert len(listings) == num_listings + 1
+
+
+def test_download_cache_local_server(tmp_path, monkeypatch):
+    import http.server
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    content = {
+        '/a.dat': b'a' * 1000,
+        '/b.dat': b'b' * 1000,
+        '/c.dat': b'c' * 1000,
+        '/copy_of_a.dat': b'a' * 1000,
+    }
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+            body = content[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    cache = act.discovery.cache
+    for key in cache._CACHE_CONFIG:
+        monkeypatch.setitem(cache._CACHE_CONFIG, key, cache._CACHE_CONFIG[key])
+    cache_dir = tmp_path / 'cache'
+    try:
+        act.discovery.set_download_cache(cache_dir, max_size=2500)
+
+        # Concurrent fetches of the same url download it once
+        with ThreadPoolExecutor(4) as executor:
+            data = list(executor.map(lambda i: cache.fetch_bytes(url + '/a.dat'), range(4)))
+        assert data == [content['/a.dat']] * 4
+        assert requests_seen == ['/a.dat']
+
+        # Files are copied from the cache and identical content is stored once
+        cache.fetch_file(url + '/copy_of_a.dat', tmp_path / 'copy_of_a.dat')
+        cache.fetch_file(url + '/a.dat', tmp_path / 'a.dat')
+        assert (tmp_path / 'a.dat').read_bytes() == content['/a.dat']
+        assert requests_seen == ['/a.dat', '/copy_of_a.dat']
+        assert len(list(cache_dir.glob('objects/*/*'))) == 1
+
+        # The least recently used content is removed when the cache is too large
+        cache.fetch_bytes(url + '/b.dat')
+        cache.fetch_bytes(url + '/b.dat', key='b')
+        cache.fetch_bytes(url + '/c.dat')
+        assert len(list(cache_dir.glob('keys/*.json'))) == 3
+        assert len(list(cache_dir.glob('objects/*/*'))) == 2
+        cache.fetch_bytes(url + '/a.dat')
+        assert len(requests_seen) == 6
+
+        # Expired content is fetched again
+        act.discovery.set_download_cache(cache_dir, ttl=0)
+        cache.fetch_bytes(url + '/b.dat')
+        assert len(requests_seen) == 7
+        act.discovery.set_download_cache(cache_dir)
+
+        # Content evicted by another process after the lookup is fetched again
+        cached_path = cache._cached_path
+        evicted = []
+
+        def evicting_cached_path(*args):
+            path = cached_path(*args)
+            if not evicted:
+                evicted.append(path)
+                os.remove(path)
+            return path
+
+        monkeypatch.setattr(cache, '_cached_path', evicting_cached_path)
+        assert cache.fetch_bytes(url + '/c.dat') == content['/c.dat']
+        assert len(evicted) == 1
+        monkeypatch.setattr(cache, '_cached_path', cached_path)
+
+        # A .part file of an interrupted download is kept to resume from
+        def resumable_download(url, temp_file):
+            with open(temp_file + '.part', 'ab') as fh:
+                fh.write(b'd' * 500)
+            if os.path.getsize(temp_file + '.part') < 1000:
+                raise ConnectionError('Connection closed')
+            os.replace(temp_file + '.part', temp_file)
+
+        with pytest.raises(ConnectionError):
+            cache.fetch_file(url + '/d.dat', tmp_path / 'd.dat', download=resumable_download)
+        cache.fetch_file(url + '/d.dat', tmp_path / 'd.dat', download=resumable_download)
+        assert (tmp_path / 'd.dat').read_bytes() == b'd' * 1000
+
+        # Offline mode only reads from the cache
+        server.shutdown()
+        act.discovery.set_download_cache(cache_dir, offline=True)
+        assert cache.fetch_bytes(url + '/b.dat') == content['/b.dat']
+        with pytest.raises(FileNotFoundError):
+            cache.fetch_bytes(url + '/copy_of_a.dat')
+
+        act.discovery.clear_download_cache()
+        assert not list(cache_dir.glob('keys/*.json'))
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,13 +1,21 @@
 import glob
+import io
+import json
+import os
 from os import PathLike
 from pathlib import Path
 import random
+import shutil
 from string import ascii_letters
+import tarfile
 import tempfile
 
 import fsspec
+import netCDF4
 import numpy as np
+import pandas as pd
 import pytest
+import xarray as xr
 
 import act
 import act.tests.sample_files as sample_files
@@ -116,6 +124,301 @@ def test_keep_variables():
     del ds
 
 
+def test_keep_variables_schema_cache(monkeypatch):
+    act.io.armfiles.clear_schema_cache()
+    var_names = ['temp_mean', 'qc_temp_mean']
+    drop_variables = act.io.armfiles.keep_variables_to_drop_variables(act.tests.EXAMPLE_MET1, var_names)
+    assert act.io.armfiles._read_file_schema_signature.cache_info().misses == 1
+    assert len(act.io.armfiles._SCHEMAS) == 1
+    assert list(act.io.armfiles._SCHEMAS)[0].startswith('sgpmetE13.b1.')
+
+    # Same file does not reopen file or recompute drop list
+    result = act.io.armfiles.keep_variables_to_drop_variables(act.tests.EXAMPLE_MET1, var_names)
+    assert sorted(result) == sorted(drop_variables)
+    assert act.io.armfiles._read_file_schema_signature.cache_info().hits == 1
+    assert act.io.armfiles._schema_drop_variables.cache_info().hits == 1
+
+    # Different file with same schema shares drop list
+    files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))
+    result = act.io.armfiles.keep_variables_to_drop_variables(files[1], var_names, drop_variables='nonsense')
+    assert sorted(result) == sorted(drop_variables + ['nonsense'])
+    assert len(act.io.armfiles._SCHEMAS) == 1
+    assert act.io.armfiles._schema_drop_variables.cache_info().hits == 2
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache_file = Path(tmpdirname, 'schema_cache.json')
+        # Schema saved by another process is kept
+        with open(cache_file, 'w') as fh:
+            json.dump({'schemas': {'other.b1.0123456789abcdef': ['other.b1', [['time', ['time']]]]}}, fh)
+        for filename in files[2:5]:
+            result = act.io.armfiles.keep_variables_to_drop_variables(
+                filename, var_names, schema_cache_file=cache_file)
+            assert sorted(result) == sorted(drop_variables)
+        with open(cache_file) as fh:
+            schemas = json.load(fh)['schemas']
+        assert sorted(schemas) == sorted(['other.b1.0123456789abcdef'] + list(act.io.armfiles._SCHEMAS))
+
+        with open(cache_file) as fh:
+            saved_files = json.load(fh)['files']
+        assert sorted(saved_files) == [str(Path(filename).resolve()) for filename in files[2:5]]
+
+        # New process simulated by clearing in memory cache does not read the headers
+        act.io.armfiles.clear_schema_cache()
+        ds = act.io.armfiles.read_netcdf(files[2], keep_variables=var_names, schema_cache_file=cache_file)
+        assert sorted(ds.data_vars) == sorted(var_names)
+        result = act.io.armfiles.keep_variables_to_drop_variables(
+            files[3], var_names, schema_cache_file=cache_file)
+        assert sorted(result) == sorted(drop_variables)
+        assert act.io.armfiles._read_file_schema_signature.cache_info().misses == 0
+        with open(cache_file) as fh:
+            assert json.load(fh)['schemas'] == schemas
+
+        # Modified files are read again
+        filename = Path(tmpdirname, Path(files[2]).name)
+        shutil.copy(files[2], filename)
+        for mtime in [0, 1]:
+            os.utime(filename, (mtime, mtime))
+            act.io.armfiles.keep_variables_to_drop_variables(
+                filename, var_names, schema_cache_file=cache_file)
+        assert act.io.armfiles._read_file_schema_signature.cache_info().misses == 2
+        with open(cache_file) as fh:
+            assert json.load(fh)['files'][str(filename.resolve())][1] == 1
+
+    # Schemas are removed from memory in least recently used order
+    monkeypatch.setattr(act.io.armfiles, '_SCHEMA_CACHE_SIZE', 1)
+    act.io.armfiles.clear_schema_cache()
+    act.io.armfiles.keep_variables_to_drop_variables(files[0], var_names)
+    act.io.armfiles.keep_variables_to_drop_variables(act.tests.EXAMPLE_SONDE1, 'tdry')
+    assert len(act.io.armfiles._SCHEMAS) == 1
+    assert list(act.io.armfiles._SCHEMAS)[0].startswith('sgpsondewnpnC1.b1.')
+    result = act.io.armfiles.keep_variables_to_drop_variables(files[0], var_names)
+    assert sorted(result) == sorted(drop_variables)
+    assert list(act.io.armfiles._SCHEMAS)[0].startswith('sgpmetE13.b1.')
+    act.io.armfiles.clear_schema_cache()
+
+
+def test_io_write_append():
+    ds = act.io.armfiles.read_netcdf(sample_files.EXAMPLE_MET1)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        write_file = Path(tmpdirname, Path(sample_files.EXAMPLE_MET1).name)
+        # Overlapping samples are only written once
+        for index in [slice(0, 100), slice(50, 700), slice(700, None)]:
+            ds.isel(time=index).write.write_netcdf(path=write_file, append=True)
+            ds_read = act.io.armfiles.read_netcdf(str(write_file))
+            assert ds_read['time'].values[-1] == ds['time'].values[index][-1]
+            ds_read.close()
+
+        with netCDF4.Dataset(write_file) as nc:
+            assert nc.dimensions['time'].isunlimited()
+
+        ds_read = act.io.armfiles.read_netcdf(str(write_file))
+        for var_name in ['time', 'time_offset', 'temp_mean', 'qc_temp_mean', 'rh_mean']:
+            np.testing.assert_array_equal(ds_read[var_name].values, ds[var_name].values)
+        assert ds_read['temp_mean'].encoding['_FillValue'] == -9999
+        ds_read.close()
+
+        write_file = Path(tmpdirname, 'no_unlimited.nc')
+        ds.write.write_netcdf(path=write_file)
+        with np.testing.assert_raises(ValueError):
+            ds.write.write_netcdf(path=write_file, append=True)
+
+
+def test_io_write_encoding_preset():
+    ds = act.io.armfiles.read_netcdf(sample_files.EXAMPLE_MET_WILDCARD)
+    ds.clean.cleanup()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        file_size = {}
+        for preset in ['archive', 'fast', 'analysis']:
+            write_file = Path(tmpdirname, f'{preset}.nc')
+            ds.write.write_netcdf(path=write_file, encoding_preset=preset)
+            file_size[preset] = write_file.stat().st_size
+            with netCDF4.Dataset(write_file) as nc:
+                chunking = nc['temp_mean'].chunking()
+                zlib = nc['temp_mean'].filters()['zlib']
+            if preset == 'fast':
+                assert chunking == 'contiguous'
+                assert zlib is False
+            else:
+                assert chunking == [ds['time'].size]
+                assert zlib is True
+
+            ds_read = act.io.armfiles.read_netcdf(str(write_file))
+            np.testing.assert_array_equal(ds_read['temp_mean'].values, ds['temp_mean'].values)
+            np.testing.assert_array_equal(ds_read['time'].values, ds['time'].values)
+            ds_read.close()
+
+        assert file_size['archive'] < file_size['fast'] / 2
+
+        # The Dataset is not modified by cleanup before writing
+        assert '_datastream' in ds.attrs
+        assert isinstance(ds['qc_temp_mean'].attrs['flag_meanings'], list)
+
+        with np.testing.assert_raises(ValueError):
+            ds.write.write_netcdf(path=Path(tmpdirname, 'a.nc'), encoding_preset='small')
+        with np.testing.assert_raises(ValueError):
+            ds.write.write_netcdf(
+                path=Path(tmpdirname, 'a.nc'), encoding_preset='archive', format='NETCDF3_64BIT')
+
+
+@pytest.mark.skipif(not act.io.zarrfiles._ZARR_AVAILABLE, reason='Zarr is not installed.')
+def test_io_zarr():
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[:3]
+    ds_full = act.io.armfiles.read_netcdf(met_files)
+    ds_full.clean.cleanup()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        store = Path(tmpdirname, 'sgpmetE13.b1.zarr')
+        for met_file in met_files:
+            ds = act.io.armfiles.read_netcdf(met_file)
+            ds.clean.cleanup()
+            act.io.write_zarr(ds, store, time_chunk=1000)
+
+        ds_zarr = act.io.read_zarr(store)
+        assert ds_zarr.attrs['_file_dates'] == ['20190101', '20190102', '20190103']
+        assert ds_zarr.attrs['_datastream'] == ds_full.attrs['_datastream']
+        assert ds_zarr['temp_mean'].chunks[0][0] == 1000
+        for var_name in ['time', 'temp_mean', 'qc_temp_mean', 'rh_mean']:
+            np.testing.assert_array_equal(ds_zarr[var_name].values, ds_full[var_name].values)
+            assert ds_zarr[var_name].attrs.keys() == ds_full[var_name].attrs.keys()
+        for attr_name in ['flag_masks', 'flag_meanings', 'flag_assessments', 'fail_min']:
+            assert type(ds_zarr['qc_temp_mean'].attrs[attr_name]) is type(ds_full['qc_temp_mean'].attrs[attr_name])
+            np.testing.assert_array_equal(
+                ds_zarr['qc_temp_mean'].attrs[attr_name], ds_full['qc_temp_mean'].attrs[attr_name])
+        assert ds_zarr['temp_mean'].attrs['ancillary_variables'] == 'qc_temp_mean'
+
+        # Write in place part of the second day
+        ds = ds_full.isel(time=slice(1500, 1600)).copy(deep=True)
+        ds['temp_mean'][:] = 99.
+        act.io.write_zarr(ds, store)
+        ds_zarr = act.io.read_zarr(store)
+        assert (ds_zarr['temp_mean'].values[1500:1600] == 99.).all()
+        assert ds_zarr['temp_mean'].values[1499] == ds_full['temp_mean'].values[1499]
+        assert ds_zarr['time'].size == ds_full['time'].size
+
+        # Samples partly in the store
+        ds = act.io.armfiles.read_netcdf(sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[2:4])
+        with np.testing.assert_raises(ValueError):
+            act.io.write_zarr(ds.isel(time=slice(1400, 1500)), store)
+
+        # Existing store without time
+        store = Path(tmpdirname, 'no_time.zarr')
+        ds.isel(time=0).drop_vars('time').to_zarr(store)
+        with pytest.raises(ValueError, match='no time variable'):
+            act.io.write_zarr(ds, store)
+        act.io.write_zarr(ds, store, mode='w')
+        assert act.io.read_zarr(store)['time'].size == ds['time'].size
+
+
+@pytest.mark.skipif(not (act.io.references._H5PY_AVAILABLE and act.io.references._ZARR_AVAILABLE),
+                    reason='h5py or Zarr is not installed.')
+def test_io_reference_index(monkeypatch):
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[:4]
+    open_zarr = xr.open_zarr
+    open_calls = []
+
+    def open_zarr_spy(*args, **kwargs):
+        open_calls.append(kwargs.get('group'))
+        return open_zarr(*args, **kwargs)
+
+    monkeypatch.setattr(xr, 'open_zarr', open_zarr_spy)
+
+    # Same compressed storage, same contiguous storage with files of different
+    # lengths and a mix of contiguous and compressed storage
+    for presets, time_slice in [(['archive'], slice(None)), (['fast'], slice(0, 720)),
+                                (['fast', 'archive'], slice(None))]:
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            filenames = []
+            for ii, met_file in enumerate(met_files):
+                ds = act.io.armfiles.read_netcdf(met_file)
+                if ii % 2 == 1:
+                    ds = ds.isel(time=time_slice)
+                filenames.append(Path(tmpdirname, Path(met_file).name.replace('.cdf', '.nc')))
+                ds.write.write_netcdf(path=filenames[-1], encoding_preset=presets[ii % len(presets)])
+                ds.close()
+
+            index_file = Path(tmpdirname, 'sgpmetE13.b1.json')
+            index = act.io.create_reference_index(filenames, index_file=index_file)
+            assert act.io.references.reference_index_files(index_file) == [str(filename) for filename in filenames]
+
+            ds_ref = act.io.armfiles.read_netcdf(filenames)
+            open_calls.clear()
+            ds = act.io.armfiles.read_netcdf(None, reference_index=index_file)
+            # Collections with the same storage are opened as one store
+            assert len(open_calls) == (1 if len(presets) == 1 else len(filenames))
+            assert ds.attrs['_file_dates'] == ds_ref.attrs['_file_dates']
+            for var_name in ds_ref.variables:
+                np.testing.assert_array_equal(ds[var_name].values, ds_ref[var_name].values)
+                assert ds[var_name].dims == ds_ref[var_name].dims
+                assert ds[var_name].attrs.keys() == ds_ref[var_name].attrs.keys()
+            assert ds['temp_mean'].chunks is not None
+
+            ds = act.io.armfiles.read_netcdf(
+                None, reference_index=index, keep_variables='temp_mean',
+                start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+            assert ds.attrs['_file_dates'] == ['20190102', '20190103']
+            assert list(ds.data_vars) == ['temp_mean']
+            assert ds['time'].values[-1] == np.datetime64('2019-01-03T06:00:00')
+
+            ds = act.io.armfiles.read_netcdf(None, reference_index=index, use_base_time=True)
+            np.testing.assert_array_equal(ds['time'].values, ds_ref['time'].values)
+            ds = act.io.references.open_reference_index(index, decode_times=False)
+            assert ds['time'].dtype == np.float64
+            assert ds['time'].attrs['units'].startswith('seconds since 2019-01-01')
+
+    with np.testing.assert_raises(ValueError):
+        act.io.create_reference_index(met_files[0])
+
+    # Variable length strings can not be referenced
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filename = Path(tmpdirname, 'sgpmetE13.b1.20190101.000000.nc')
+        ds = act.io.armfiles.read_netcdf(met_files[0])
+        ds['site'] = xr.DataArray(np.array(['sgp'] * ds['time'].size, dtype=object), dims='time')
+        ds.to_netcdf(filename)
+        with pytest.warns(UserWarning, match='site'):
+            index = act.io.create_reference_index(filename)
+        assert 'site' not in act.io.references.open_reference_index(index)
+
+
+@pytest.mark.skipif(not act.io.parquetfiles._PYARROW_AVAILABLE, reason='pyarrow is not installed.')
+def test_io_parquet():
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[:3]
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for met_file in met_files:
+            ds = act.io.armfiles.read_netcdf(met_file)
+            act.io.parquetfiles.write_parquet(ds, tmpdirname)
+        # Writing the same Dataset again replaces its file
+        act.io.parquetfiles.write_parquet(ds, tmpdirname)
+        files = sorted(Path(tmpdirname).glob('*/*/*.parquet'))
+        assert len(files) == 3
+        assert files[0].parent.name == 'date=20190101'
+        assert files[0].parent.parent.name == 'datastream=sgpmetE13.b1'
+
+        ds_ref = act.io.armfiles.read_netcdf(met_files)
+        ds = act.io.parquetfiles.read_parquet(tmpdirname)
+        assert ds.attrs['_file_dates'] == ['20190101', '20190102', '20190103']
+        assert ds.attrs['_datastream'] == 'sgpmetE13.b1'
+        for var_name in ['time', 'temp_mean', 'qc_temp_mean', 'time_offset']:
+            np.testing.assert_array_equal(ds[var_name].values, ds_ref[var_name].values)
+            assert ds[var_name].dtype == ds_ref[var_name].dtype
+            assert ds[var_name].attrs == ds_ref[var_name].attrs
+        assert ds['lat'].values == ds_ref['lat'].values[0]
+        assert ds['lat'].attrs['units'] == 'degree_N'
+        assert ds.attrs['qc_bit_1_description'] == ds_ref.attrs['qc_bit_1_description']
+
+        import pyarrow.parquet as pq
+        assert pq.read_schema(files[0]).field('qc_temp_mean').type == 'uint8'
+
+        ds = act.io.parquetfiles.read_parquet(
+            tmpdirname, variables=['temp_mean', 'qc_temp_mean'],
+            start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+        assert list(ds.data_vars) == ['temp_mean', 'qc_temp_mean']
+        assert ds.attrs['_file_dates'] == ['20190102', '20190103']
+        assert ds['time'].values[0] == np.datetime64('2019-01-02T12:00:00')
+        assert ds['time'].values[-1] == np.datetime64('2019-01-03T06:00:00')
+
+        with np.testing.assert_raises(ValueError):
+            act.io.parquetfiles.read_parquet(tmpdirname, variables='not_a_variable')
+
+
 def test_io_mfdataset():
     met_ds = act.io.armfiles.read_netcdf(act.tests.EXAMPLE_MET_WILDCARD)
     met_ds.load()
@@ -150,6 +453,251 @@ def test_io_mfdataset():
     del met_ds
 
 
+def test_io_time_window():
+    files = act.io.armfiles.filter_files_by_time(
+        act.tests.EXAMPLE_MET_WILDCARD, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+    assert [Path(ii).name for ii in files] == [
+        'sgpmetE13.b1.20190102.000000.cdf', 'sgpmetE13.b1.20190103.000000.cdf']
+
+    files = act.io.armfiles.filter_files_by_time(act.tests.EXAMPLE_MET_WILDCARD, start_time='2019-01-06')
+    assert len(files) == 2
+    files = act.io.armfiles.filter_files_by_time(act.tests.EXAMPLE_MET_WILDCARD, end_time='2019-01-01')
+    assert len(files) == 1
+
+    met_ds = act.io.armfiles.read_netcdf(
+        act.tests.EXAMPLE_MET_WILDCARD, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+    assert met_ds.attrs['_file_dates'] == ['20190102', '20190103']
+    assert met_ds['time'].values[0] == np.datetime64('2019-01-02T12:00:00')
+    assert met_ds['time'].values[-1] == np.datetime64('2019-01-03T06:00:00')
+    met_ds.close()
+    del met_ds
+
+    # Last file has unknown end time so is kept but trimmed to no data
+    met_ds = act.io.armfiles.read_netcdf(act.tests.EXAMPLE_MET_WILDCARD, start_time='2020-01-01')
+    assert met_ds.attrs['_file_dates'] == ['20190107']
+    assert met_ds['time'].size == 0
+
+
+def test_io_catalog():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        met_files = glob.glob(act.tests.EXAMPLE_MET_WILDCARD)
+        for met_file in met_files:
+            Path(tmpdirname, Path(met_file).name).write_bytes(Path(met_file).read_bytes())
+        Path(tmpdirname, 'not_arm_file.txt').write_text('Not an ARM file')
+
+        catalog_file = Path(tmpdirname, 'catalog.sqlite')
+        catalog = act.io.catalog.DatastreamCatalog(catalog_file)
+        counts = catalog.scan(tmpdirname)
+        assert counts == {'added': 7, 'updated': 0, 'removed': 0}
+        assert len(catalog) == 7
+        assert catalog.datastreams() == ['sgpmetE13.b1']
+
+        files = catalog.query('sgpmetE13.b1', start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+        assert [Path(ii).name for ii in files] == [
+            'sgpmetE13.b1.20190102.000000.cdf', 'sgpmetE13.b1.20190103.000000.cdf']
+        assert len(catalog.query('sgpmetE13.b1')) == 7
+        assert len(catalog.query('sgpmetE13.b1', start_time='2019-01-07')) == 1
+        assert catalog.query('sgpmetE14.b1') == []
+
+        ds = act.io.armfiles.read_netcdf(
+            'sgpmetE13.b1', catalog=catalog, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+        assert ds.attrs['_file_dates'] == ['20190102', '20190103']
+        assert ds['time'].values[0] == np.datetime64('2019-01-02T12:00:00')
+        ds.close()
+        catalog.close()
+
+        # Reopen catalog from disk and update with incremental scan
+        Path(tmpdirname, Path(met_files[0]).name).unlink()
+        with act.io.catalog.DatastreamCatalog(catalog_file) as catalog:
+            assert len(catalog) == 7
+            counts = catalog.scan(tmpdirname)
+            assert counts == {'added': 0, 'updated': 0, 'removed': 1}
+            assert len(catalog) == 6
+
+        # Underscores in a directory name do not match other directories
+        for name in ['sgp_met', 'sgpXmet']:
+            Path(tmpdirname, name, 'sub').mkdir(parents=True)
+            Path(tmpdirname, name, 'sub', Path(met_files[0]).name).write_bytes(Path(met_files[0]).read_bytes())
+        with act.io.catalog.DatastreamCatalog(':memory:') as catalog:
+            catalog.scan([Path(tmpdirname, 'sgp_met'), Path(tmpdirname, 'sgpXmet')])
+            shutil.rmtree(Path(tmpdirname, 'sgpXmet', 'sub'))
+            counts = catalog.scan(Path(tmpdirname, 'sgp_met'))
+            assert counts == {'added': 0, 'updated': 0, 'removed': 0}
+            assert len(catalog) == 2
+
+
+def test_io_parallel_chunks():
+    chunks = act.io.armfiles.plan_time_chunks(act.tests.EXAMPLE_MET_WILDCARD, target_chunk_size=1000)
+    assert chunks == {'time': 125}
+    chunks = act.io.armfiles.plan_time_chunks(act.tests.EXAMPLE_MET1, target_chunk_size=1)
+    assert chunks == {'time': 1}
+    assert act.io.armfiles.plan_time_chunks('./randomfile*.nc') == {}
+
+    ds = act.io.armfiles.read_netcdf(
+        act.tests.EXAMPLE_MET_WILDCARD, chunks='auto-time', target_chunk_size=1000,
+        parallel=True, num_workers=2)
+    assert ds.attrs['_chunk_plan'] == 'time: 125'
+    assert max(ds['temp_mean'].chunks[0]) == 125
+    assert len(ds['temp_mean'].chunks[0]) == 84
+    np.testing.assert_almost_equal(ds['temp_mean'].mean().values, 4.2282, decimal=4)
+    ds.close()
+
+    # netCDF4 files opened from a thread pool hold the netCDF4 lock
+    ds = act.io.armfiles.read_netcdf(act.tests.EXAMPLE_MET_WILDCARD, parallel=True, scheduler='threads')
+    assert '_chunk_plan' not in ds.attrs
+    np.testing.assert_almost_equal(ds['temp_mean'].mean().values, 4.2282, decimal=4)
+    ds.close()
+
+
+def test_io_iter_netcdf():
+    windows = []
+    for ds in act.io.armfiles.iter_netcdf(
+            act.tests.EXAMPLE_MET_WILDCARD, window='2D', overlap='10min', start_time='2019-01-02T06:00:00'):
+        windows.append(ds.attrs['_window'])
+        assert ds['time'].values[0] == np.datetime64(ds.attrs['_window'][0]) - np.timedelta64(10, 'm')
+        assert 'temp_mean' in ds
+        ds.close()
+
+    assert len(windows) == 3
+    assert windows[0] == ['2019-01-02T06:00:00.000000000', '2019-01-04T00:00:00.000000000']
+    assert windows[-1] == ['2019-01-06T00:00:00.000000000', '2019-01-08T00:00:00.000000000']
+
+    windows = list(act.io.armfiles.iter_netcdf(
+        [act.tests.EXAMPLE_MET_TEST2], window='20min', end_time='2019-01-01T00:50:00'))
+    assert len(windows) == 3
+    assert [ds['time'].size for ds in windows] == [20, 20, 11]
+    assert act.io.iter_netcdf is act.io.armfiles.iter_netcdf
+
+
+def test_io_iter_netcdf_files(tmp_path, monkeypatch):
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[:4]
+    read_netcdf = act.io.armfiles.read_netcdf
+    reads = []
+
+    def record_read_netcdf(filenames, **kwargs):
+        reads.append(filenames)
+        return read_netcdf(filenames, **kwargs)
+
+    monkeypatch.setattr(act.io.armfiles, 'read_netcdf', record_read_netcdf)
+
+    # Files without ARM-standard names are read once for the time range and
+    # only the files overlapping a window are read for the window
+    filenames = []
+    for ii, met_file in enumerate(met_files):
+        filenames.append(str(tmp_path / f'met_{ii}.nc'))
+        shutil.copy(met_file, filenames[-1])
+    sizes = []
+    for ds in act.io.armfiles.iter_netcdf(filenames, window='1D', overlap='10min'):
+        sizes.append(ds['time'].size)
+        ds.close()
+    assert sizes == [1450, 1460, 1460, 1450]
+    assert reads[:4] == filenames
+    assert [len(files) for files in reads[4:]] == [2, 3, 3, 2]
+
+    # Members of a TAR file are read from the archive opened once without extracting
+    monkeypatch.setattr(act.io.armfiles, 'check_if_tar_gz_file', None)
+    tar_file = tmp_path / 'sgpmetE13.b1.tar.gz'
+    with tarfile.open(tar_file, 'w:gz') as tar:
+        for met_file in met_files:
+            tar.add(met_file, arcname=Path(met_file).name)
+    reads.clear()
+    sizes = []
+    file_dates = []
+    for ds in act.io.armfiles.iter_netcdf(tar_file, window='1D', overlap='10min'):
+        sizes.append(ds['time'].size)
+        file_dates.append(ds.attrs['_file_dates'])
+        ds.close()
+    assert sizes == [1450, 1460, 1460, 1450]
+    assert file_dates[0] == ['20190101', '20190102']
+    assert file_dates[-1] == ['20190103', '20190104']
+    assert isinstance(reads[0], tarfile.TarFile) and all(files is reads[0] for files in reads)
+    assert reads[0].closed
+
+
+def test_io_lazy_metadata():
+    from dask.callbacks import Callback
+
+    class TaskCounter(Callback):
+        def __init__(self):
+            self.tasks = 0
+
+        def _pretask(self, key, dsk, state):
+            self.tasks += 1
+
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))[:2]
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filenames = []
+        for ii, met_file in enumerate(met_files):
+            filename = Path(tmpdirname, f'met_{ii}.nc')
+            Path(filename).write_bytes(Path(met_file).read_bytes())
+            filenames.append(filename)
+
+        counter = TaskCounter()
+        with counter:
+            ds = act.io.armfiles.read_netcdf(filenames, chunks={'time': 720})
+
+        assert counter.tasks == 0
+        assert ds['temp_mean'].chunks is not None
+        assert ds['time_offset'].chunks is not None
+        assert ds.attrs['_file_dates'] == ['20190101', '20190102']
+        assert ds.attrs['_file_times'] == ['000000', '000000']
+        ds.close()
+
+
+def test_io_tar_stream(monkeypatch):
+    open_tar_gz_members = act.io.armfiles.open_tar_gz_members
+    met_files = sorted(glob.glob(act.tests.EXAMPLE_MET_WILDCARD))
+    ds_ref = act.io.armfiles.read_netcdf(
+        met_files, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for mode, extension in [('w', 'tar'), ('w:gz', 'tar.gz')]:
+            tar_file = Path(tmpdirname, f'sgpmetE13.b1.{extension}')
+            with tarfile.open(tar_file, mode) as tar:
+                for met_file in met_files:
+                    tar.add(met_file, arcname=Path(met_file).name)
+
+            # Members larger than the buffer size are decompressed to temporary files
+            names, members, engine, tar = act.io.open_tar_gz_members(
+                tar_file, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00',
+                buffer_size=300000)
+            assert names == ['sgpmetE13.b1.20190102.000000.cdf', 'sgpmetE13.b1.20190103.000000.cdf']
+            assert engine == 'scipy'
+            if mode == 'w:gz':
+                assert tar is None
+                assert [isinstance(member, io.BytesIO) for member in members] == [True, False]
+            ds = xr.open_mfdataset(members, engine=engine)
+            assert ds['time'].size == 2880
+            ds.close()
+            for member in members + [tar]:
+                if member is not None:
+                    member.close()
+
+            opened = []
+
+            def record_open_tar_gz_members(*args, **kwargs):
+                opened.append(open_tar_gz_members(*args, **kwargs))
+                return opened[-1]
+
+            monkeypatch.setattr(act.io.armfiles, 'open_tar_gz_members', record_open_tar_gz_members)
+            ds = act.io.armfiles.read_netcdf(
+                tar_file, start_time='2019-01-02T12:00:00', end_time='2019-01-03T06:00:00')
+            monkeypatch.undo()
+            assert ds.attrs['_file_dates'] == ['20190102', '20190103']
+            xr.testing.assert_identical(ds, ds_ref)
+            # The archive is closed with the Dataset
+            ds.close()
+            names, members, engine, tar = opened[0]
+            assert all(member.closed for member in members)
+            assert tar is None or tar.closed
+
+            ds = act.io.armfiles.read_netcdf(tar_file, keep_variables='temp_mean')
+            assert list(ds.data_vars) == ['temp_mean']
+            assert ds['time'].size == 10080
+
+        # Nothing extracted next to the archives or left in a temporary directory
+        assert len(list(Path(tmpdirname).iterdir())) == 2
+
+
 def test_io_csv():
     headers = [
         'day',
@@ -189,6 +737,49 @@ def test_io_csv():
     assert '_datastream' in ds.attrs
 
 
+def test_io_csv_engine(tmp_path):
+    assert act.io.csvfiles._csv_engine(',', 0, {}) == 'c'
+    assert act.io.csvfiles._csv_engine(r'\s+', 0, {}) == 'c'
+    assert act.io.csvfiles._csv_engine(',', 2, {}) == 'python'
+    assert act.io.csvfiles._csv_engine(r'\s*,\s*', 0, {}) == 'python'
+
+    # The second file does not fit the data types of the first file so is
+    # read again with inference.
+    filenames = [tmp_path / 'test.20210401.csv', tmp_path / 'test.20210402.csv',
+                 tmp_path / 'test.20210403.csv']
+    filenames[0].write_text('a,b,c\n1,2.5,x\n2,3.5,y\n')
+    filenames[1].write_text('a,b,c\n1.5,2,x\n2.5,3,y\n')
+    filenames[2].write_text('a,d,c\n1,2,x\n2,3,y\n')
+    key = act.io.csvfiles._dtype_schema_key(str(filenames[1]), {
+        'sep': ',', 'names': None, 'skipfooter': 0, 'engine': 'c'})
+
+    # The data type cache is only used when requested
+    act.io.csvfiles._DTYPE_SCHEMAS.clear()
+    ds = act.io.csvfiles.read_csv(filenames[0])
+    assert key not in act.io.csvfiles._DTYPE_SCHEMAS
+
+    ds = act.io.csvfiles.read_csv(filenames[0], dtype_cache=True)
+    assert ds['a'].dtype == np.int64
+    assert act.io.csvfiles._DTYPE_SCHEMAS[key] == (('a', 'b', 'c'), {'a': np.int64, 'b': np.float64})
+
+    # The second file does not fit the data types of the first file so is
+    # read again with inference.
+    ds = act.io.csvfiles.read_csv(filenames[1], dtype_cache=True)
+    np.testing.assert_array_equal(ds['a'].values, [1.5, 2.5])
+    assert ds['b'].dtype == np.int64
+    assert list(ds['c'].values) == ['x', 'y']
+    assert act.io.csvfiles._DTYPE_SCHEMAS[key] == (('a', 'b', 'c'), {'a': np.float64, 'b': np.int64})
+
+    # Data types are not used for a file with different columns
+    ds = act.io.csvfiles.read_csv(filenames[2], dtype_cache=True)
+    assert ds['a'].dtype == np.int64
+    assert act.io.csvfiles._DTYPE_SCHEMAS[key][0] == ('a', 'd', 'c')
+
+    ds = act.io.csvfiles.read_csv(filenames[:2], engine='python')
+    np.testing.assert_array_equal(ds['a'].values, [1, 2, 1.5, 2.5])
+    act.io.csvfiles._DTYPE_SCHEMAS.clear()
+
+
 def test_io_dod():
     dims = {'time': 1440, 'drop_diameter': 50}
 
@@ -218,6 +809,51 @@ def test_io_dod():
     ds2.close()
 
 
+def test_io_dod_cache():
+    dims = {'time': 1440, 'drop_diameter': 50}
+    dod_url = act.io.armfiles.DOD_URL
+    act.io.armfiles.clear_dod_cache()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            # Serve the example DOD from a local directory in place of PCM
+            act.io.armfiles.DOD_URL = Path(sample_files.EXAMPLE_DOD).parent.as_uri() + '/'
+            cache_dir = Path(tmpdirname, 'dods')
+            files = act.io.armfiles.prefetch_dods('vdis.b1', cache_dir)
+            assert files == [str(Path(cache_dir, 'vdis.b1.json'))]
+            act.io.armfiles.clear_dod_cache()
+
+            # PCM is not reachable so only the cache can be used
+            act.io.armfiles.DOD_URL = Path(tmpdirname, 'missing').as_uri() + '/'
+            ds = act.io.armfiles.create_ds_from_arm_dod(
+                'vdis.b1', dims, version='1.2', scalar_fill_dim='time',
+                cache_dir=cache_dir, offline=True)
+            assert 'moment1' in ds
+            assert len(ds['base_time'].values) == 1440
+            assert len(ds['drop_diameter'].values) == 50
+
+            # Memoized Dataset is copied so changes are not returned again
+            ds['moment1'].values[:] = 1.0
+            set_dims = {'time': 1440, 'drop_diameter': 50}
+            ds2 = act.io.armfiles.create_ds_from_arm_dod(
+                'vdis.b1', set_dims, version='1.2', scalar_fill_dim='time', cache_dir=cache_dir)
+            assert np.all(ds2['moment1'].values == -9999.0)
+            assert ds2.attrs == ds.attrs
+
+            # Stale cache for the latest version is used with a warning when PCM is not reachable
+            act.io.armfiles.clear_dod_cache()
+            with pytest.warns(UserWarning, match='using cached DOD'):
+                ds = act.io.armfiles.create_ds_from_arm_dod(
+                    'vdis.b1', dims, cache_dir=cache_dir, cache_ttl=0)
+            assert 'moment1' in ds
+
+            with np.testing.assert_raises(FileNotFoundError):
+                act.io.armfiles.create_ds_from_arm_dod(
+                    'kazrge.a1', {'time': 10}, cache_dir=cache_dir, offline=True)
+    finally:
+        act.io.armfiles.DOD_URL = dod_url
+        act.io.armfiles.clear_dod_cache()
+
+
 def test_io_write():
     sonde_ds = act.io.armfiles.read_netcdf(sample_files.EXAMPLE_SONDE1)
     sonde_ds.clean.cleanup()
@@ -354,6 +990,122 @@ def test_io_mpldataset():
     mpl_ds.close()
 
 
+@pytest.mark.skipif(not act.io.mpl.MPLIMPORT, reason='mpl2nc is not installed.')
+def test_io_mpl_multiple_files(tmp_path):
+    # A second file with a shorter range is concatenated with an outer join on range
+    with open(act.tests.EXAMPLE_SIGMA_MPLV5, 'rb') as fh:
+        buf = fh.read()
+    header_dtype = act.io.mpl._mpl_header_dtype()
+    header = np.frombuffer(buf, dtype=header_dtype, count=1).copy()
+    number_bins = int(header['number_bins'][0])
+    channels = np.frombuffer(buf, dtype='<f4', count=2 * number_bins, offset=header_dtype.itemsize)
+    header['number_bins'] = 500
+    short_file = tmp_path / '201509021600.bi'
+    short_file.write_bytes(
+        header.tobytes() + channels[:500].tobytes() + channels[number_bins:number_bins + 500].tobytes())
+
+    ds = act.io.mpl.read_sigma_mplv5(
+        [act.tests.EXAMPLE_SIGMA_MPLV5, act.tests.EXAMPLE_SIGMA_MPLV5], save_nc=True,
+        out_nc_path=str(tmp_path))
+    assert ds['channel_1'].shape == (204, 1000)
+    assert ds['c'].dims == ('time',)
+    assert (tmp_path / '201509021500.nc').is_file()
+
+    ds_single = act.io.mpl.read_sigma_mplv5(act.tests.EXAMPLE_SIGMA_MPLV5)
+    np.testing.assert_array_equal(ds['nrb_copol'].values[102:], ds_single['nrb_copol'].values)
+    np.testing.assert_array_equal(ds['range'].values, ds_single['range'].values)
+
+    ds = act.io.mpl.read_sigma_mplv5([act.tests.EXAMPLE_SIGMA_MPLV5, str(short_file)])
+    assert ds['channel_1'].shape == (103, 1000)
+    assert np.isnan(ds['channel_1'].values[-1, 500:]).all()
+    np.testing.assert_array_equal(ds['channel_1'].values[-1, :500], ds_single['channel_1'].values[0, :500])
+
+
+def test_gml_assemble_time():
+    year = np.array([2020, 2020, 2021])
+    time = act.io.noaagml._assemble_time(
+        year, month=np.array([2, 12, 1]), day=np.array([29, 31, 1]), hour=np.array([0, 23, 12]),
+        minute=np.array([0, 59, 30]), second=np.array([0, 59.5, 1]))
+    expected = np.array(['2020-02-29T00:00:00', '2020-12-31T23:59:59.5', '2021-01-01T12:30:01'],
+                        dtype='datetime64[ns]')
+    np.testing.assert_array_equal(time, expected)
+
+    time = act.io.noaagml._assemble_time(year, day_of_year=np.array([60, 366, 1]))
+    np.testing.assert_array_equal(time, expected.astype('datetime64[D]').astype('datetime64[ns]'))
+
+    time = act.io.noaagml._assemble_time(year, month=np.array([2, 12, 1]))
+    assert time[1] == np.datetime64('2020-12-01')
+
+    with np.testing.assert_raises(ValueError):
+        act.io.noaagml._assemble_time(year, month=np.array([2, 13, 1]))
+    with np.testing.assert_raises(ValueError):
+        act.io.noaagml._assemble_time(np.array([2021]), month=np.array([2]), day=np.array([29]))
+    with np.testing.assert_raises(ValueError):
+        act.io.noaagml._assemble_time(np.array([2021]), day_of_year=np.array([366]))
+
+
+def test_read_gml_multi_file(monkeypatch):
+    ds = act.io.noaagml.read_gml_radiation(sample_files.EXAMPLE_GML_RADIATION)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filenames = []
+        for day in ['001', '002']:
+            filenames.append(Path(tmpdirname, f'brw21{day}.dat'))
+            shutil.copy(sample_files.EXAMPLE_GML_RADIATION, filenames[-1])
+
+        ds_multi = act.io.noaagml.read_gml_radiation(filenames, num_workers=2)
+        assert ds_multi['time'].size == 2 * ds['time'].size
+        assert ds_multi.attrs['location'] == 'Barrow'
+        np.testing.assert_array_equal(
+            ds_multi['downwelling_global_solar'].values[ds['time'].size:], ds['downwelling_global_solar'].values)
+        assert ds_multi['qc_downwelling_global_solar'].dtype == ds['qc_downwelling_global_solar'].dtype
+
+        cache_dir = Path(tmpdirname, 'cache')
+        parse_gml_file = act.io.noaagml._parse_gml_file
+        parsed = []
+
+        def parse_spy(filename, *args, **kwargs):
+            parsed.append(Path(filename).name)
+            return parse_gml_file(filename, *args, **kwargs)
+
+        monkeypatch.setattr(act.io.noaagml, '_parse_gml_file', parse_spy)
+
+        # Reading a subset adds to the station-year cache file
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames[:1], cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds)
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames, cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds_multi)
+        cache_files = list(cache_dir.glob('*.nc'))
+        assert len(cache_files) == 1
+        assert cache_files[0].name.startswith('gml_radiation_brw_2021.')
+        assert parsed == ['brw21001.dat', 'brw21002.dat']
+
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames, cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds_multi)
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames[1:], cache_dir=cache_dir)
+        np.testing.assert_array_equal(
+            ds_cache['downwelling_global_solar'].values, ds['downwelling_global_solar'].values)
+        assert len(parsed) == 2
+
+        # Parse keywords are part of the cache file name
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames[:1], cache_dir=cache_dir, nrows=10)
+        assert ds_cache['time'].size == 10
+        assert len(list(cache_dir.glob('*.nc'))) == 2
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames[:1], cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds)
+        assert len(parsed) == 3
+
+        # Modified files are parsed again
+        os.utime(filenames[0], (0, 0))
+        ds_cache = act.io.noaagml.read_gml_radiation(filenames, cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds_multi)
+        assert parsed[3:] == ['brw21001.dat']
+
+        ds = act.io.noaagml.read_gml_met(sample_files.EXAMPLE_GML_MET, cache_dir=cache_dir)
+        ds_cache = act.io.noaagml.read_gml_met(sample_files.EXAMPLE_GML_MET, cache_dir=cache_dir)
+        xr.testing.assert_identical(ds_cache, ds)
+        assert len(list(cache_dir.glob('gml_met_brw_hour_2020.*.nc'))) == 1
+
+
 def test_read_gml():
     # Test Radiation
     ds = read_gml(sample_files.EXAMPLE_GML_RADIATION, datatype='RADIATION')
@@ -546,6 +1298,31 @@ def test_read_psl_wind_profiler():
     test_ds_low.close()
 
 
+def test_read_psl_wind_profiler_sections(tmp_path):
+    # Repeat the first two sections with fewer range gates in the mode one
+    # section so the sections of mode one do not have the same heights
+    with open(act.tests.EXAMPLE_NOAA_PSL) as fh:
+        lines = fh.read().splitlines()
+    end = lines.index('$', 1)
+    section = lines[1:end]
+    section[4] = section[4].replace('49', '45')
+    section[3] = section[3].replace('15 00 01', '14 00 01')
+    lines = lines[:1] + section[:-4] + ['$'] + lines[end + 1:lines.index('$', end + 1) + 1] + lines[1:]
+    filename = tmp_path / 'ctd21125.16w'
+    filename.write_text('\n'.join(lines))
+
+    mode_one_ds, mode_two_ds = act.io.noaapsl.read_psl_wind_profiler(filename)
+    test_ds_low, test_ds_hi = act.io.noaapsl.read_psl_wind_profiler(act.tests.EXAMPLE_NOAA_PSL)
+    assert mode_one_ds['SPD'].dims == ('HT', 'time')
+    assert mode_one_ds.sizes == {'HT': 49, 'time': 5}
+    assert mode_one_ds['HT'].attrs['units'] == 'km'
+    assert mode_one_ds.attrs['number_of_range_gates'] == 45
+    assert np.all(np.isnan(mode_one_ds['SPD'].values[45:, 0]))
+    np.testing.assert_array_equal(mode_one_ds['SPD'].values[:45, 0], test_ds_low['SPD'].values[:45, 0])
+    xr.testing.assert_equal(mode_one_ds.isel(time=slice(1, None)), test_ds_low)
+    xr.testing.assert_identical(mode_two_ds.isel(time=slice(1, None)), test_ds_hi)
+
+
 def test_read_psl_wind_profiler_temperature():
     ds = read_psl_wind_profiler_temperature(
         act.tests.EXAMPLE_NOAA_PSL_TEMPERATURE)
@@ -593,7 +1370,33 @@ def test_read_psl_fmcw_moment():
     np.testing.assert_almost_equal(
         ds['reflectivity_uncalibrated'].mean(), 2.37, decimal=2)
     assert ds['range'].max() == 10040.
-    assert len(ds['time'].values) == 115
+    assert len(ds['time'].values) == 116
+
+
+def test_read_psl_radar_moment_parse():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filenames = []
+        for ii, n_profiles in enumerate([3, 2]):
+            lines = [' kps  3976 -10510  2848    0']
+            for jj in range(n_profiles):
+                lines.append(f'   0.0  90.0  1 22 227 06 0{ii} {jj * 30:02d}')
+                lines.append('   50.0   70.0   100.0   40.0    5   1   2  256   1')
+                for kk in range(5):
+                    lines.append(f'  {jj}.5  {kk + 10}.0  -3.0  0.2  -40.1  {kk % 2}')
+            filenames.append(Path(tmpdirname, f'kps2222706{ii}.txt'))
+            filenames[-1].write_text('\n'.join(lines) + '\n')
+
+        ds = act.io.noaapsl.read_psl_radar_fmcw_moment(filenames, num_workers=2)
+        assert ds['time'].size == 5
+        assert ds['time'].values[1] == np.datetime64('2022-08-15T06:00:30')
+        assert ds['time'].values[-1] == np.datetime64('2022-08-15T06:01:30')
+        np.testing.assert_array_equal(ds['range'].values, [100., 140., 180., 220.])
+        np.testing.assert_array_equal(ds['radial_velocity'].values[:, 0], [0.5, 1.5, 2.5, 0.5, 1.5])
+        assert ds['qc_variable'].dtype == np.int64
+        assert ds['n_gates'].values[0] == 5
+        np.testing.assert_allclose(
+            ds['reflectivity_uncalibrated'].values[0], np.arange(10, 14) + 40 * np.log10(ds['range'].values / 1000.))
+        assert list(ds['site'].values) == ['kps', 'kps']
 
 
 def test_read_psl_sband_moment():
@@ -606,7 +1409,7 @@ def test_read_psl_sband_moment():
     np.testing.assert_almost_equal(
         ds['reflectivity_uncalibrated'].mean(), 1.00, decimal=2)
     assert ds['range'].max() == 9997.
-    assert len(ds['time'].values) == 37
+    assert len(ds['time'].values) == 38
 
 
 @pytest.mark.skipif(not act.io.icartt._ICARTT_AVAILABLE,
@@ -833,6 +1636,40 @@ def test_read_mmcr():
     np.testing.assert_almost_equal(
         ds['MeanDopplerVelocity_Receiver1'].max(), 9.98, decimal=2)
 
+    # Files with the original heights dimension are read without modifying the file
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        filename = Path(tmpdirname, 'sgpmmcrC1.b1.20090101.000000.cdf')
+        with netCDF4.Dataset(filename, 'w', format='NETCDF3_CLASSIC') as nc:
+            nc.createDimension('time', None)
+            nc.createDimension('mode', 3)
+            nc.createDimension('namelength', 12)
+            nc.createDimension('heights', 4)
+            nc.createVariable('time', 'f8', ('time',), fill_value=False)
+            nc['time'].units = 'seconds since 2009-01-01 00:00:00 0:00'
+            nc['time'][:] = np.arange(6) * 10.
+            nc.createVariable('ModeNum', 'i2', ('time',), fill_value=False)
+            nc['ModeNum'][:] = [1, 2, 1, 2, 1, 2]
+            nc.createVariable('ModeDescription', 'S1', ('mode', 'namelength'), fill_value=False)
+            nc['ModeDescription'][:] = netCDF4.stringtochar(
+                np.array(['Reserved', 'Mode01_BL', 'Mode02_GE']), n_strlen=12)
+            nc.createVariable('heights', 'f4', ('mode', 'heights'), fill_value=-9999.)
+            nc['heights'][:] = [[-9999.] * 4, [100., 200., -9999., -9999.], [100., 200., 300., 400.]]
+            nc.createVariable('Reflectivity', 'f4', ('time', 'heights'), fill_value=False)
+            nc['Reflectivity'][:] = np.arange(24).reshape(6, 4)
+        filename.chmod(0o444)
+
+        checksum = filename.read_bytes()
+        ds = act.io.armfiles.read_mmcr(str(filename))
+        assert 'heights' not in ds.dims
+        assert ds['heights'].dims == ('mode', 'range')
+        assert ds['Reflectivity_BL'].chunks is not None
+        assert ds['Reflectivity_BL'].dims == ('time_BL', 'range_BL')
+        np.testing.assert_array_equal(ds['range_BL'].values, [100., 200.])
+        np.testing.assert_array_equal(ds['Reflectivity_BL'].values, [[0, 1], [8, 9], [16, 17]])
+        np.testing.assert_array_equal(ds['Reflectivity_GE'].values[:, -1], [7, 15, 23])
+        assert filename.read_bytes() == checksum
+        ds.close()
+
 
 def test_read_neon():
     data_file = glob.glob(act.tests.EXAMPLE_NEON)
@@ -852,6 +1689,44 @@ def test_read_neon():
     assert ds['lat'].values == 71.282425
 
 
+def test_read_neon_positions(tmp_path):
+    variable_file = act.tests.EXAMPLE_NEON_VARIABLE
+    position_file = act.tests.EXAMPLE_NEON_POSITION
+
+    files = []
+    for hor_ver, month in [('000.010', '2022-10'), ('000.010', '2022-11'), ('000.020', '2022-10')]:
+        time = pd.date_range(month + '-01', periods=120, freq='1min')
+        df = pd.DataFrame({
+            'startDateTime': time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'endDateTime': (time + pd.Timedelta('1min')).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'tempSingleMean': np.arange(time.size) + float(hor_ver[-3:-1]),
+            'finalQF': np.zeros(time.size, dtype=int),
+        })
+        hor, ver = hor_ver.split('.')
+        filename = tmp_path / f'NEON.D18.BARR.DP1.00002.001.{hor}.{ver}.001.SAAT_1min.{month}.basic.csv'
+        df.to_csv(filename, index=False)
+        files.append(str(filename))
+
+    ds = act.io.neon.read_neon_csv(files[:2], variable_files=variable_file,
+                                   position_files=position_file, num_workers=2)
+    assert ds['tempSingleMean'].dims == ('time',)
+    assert ds['time'].size == 240
+    assert ds['time'].values[0] == np.datetime64('2022-10-01T00:00:00')
+    assert ds.attrs['HOR.VER'] == '000.010'
+    assert ds['tempSingleMean'].attrs['units'] == 'celsius'
+    assert ds['lat'].values == 71.282425
+
+    ds = act.io.neon.read_neon_csv(files, variable_files=variable_file, position_files=position_file)
+    assert ds['tempSingleMean'].dims == ('position', 'time')
+    assert list(ds['position'].values) == ['000.010', '000.020']
+    assert ds['time'].size == 240
+    np.testing.assert_array_equal(ds['zOffset'].values, [0.21, 2.05])
+    np.testing.assert_array_equal(ds['tempSingleMean'].values[:, 0], [1., 2.])
+    assert np.all(np.isnan(ds['tempSingleMean'].values[1, 120:]))
+    assert ds['tempSingleMean'].attrs['long_name'] == 'Arithmetic mean of single aspirated air temperature'
+    assert 'HOR.VER' not in ds.attrs
+
+
 def test_read_sodar():
     ds = act.io.read_mfas_sodar(act.tests.EXAMPLE_MFAS_SODAR)
 
@@ -885,6 +1760,30 @@ def test_read_sodar():
     assert ds.attrs['instrument_type'] == 'MFAS'
 
 
+def test_read_sodar_profile_blocks(tmp_path):
+    # Remove the last three heights of the last profile
+    with open(act.tests.EXAMPLE_MFAS_SODAR) as fh:
+        lines = fh.read().splitlines()
+    filename = tmp_path / 'sodar.20230405.mnd'
+    filename.write_text('\n'.join(lines[:-4] + lines[-1:]))
+
+    ds = act.io.read_mfas_sodar(act.tests.EXAMPLE_MFAS_SODAR)
+    ds_short = act.io.read_mfas_sodar(filename)
+    assert ds_short['dir'].shape == (96, 58)
+    assert ds_short['PGz'].dtype == ds['PGz'].dtype
+    np.testing.assert_array_equal(ds_short['height'].values, ds['height'].values)
+    assert np.all(np.isnan(ds_short['W'].values[-1, -3:]))
+    assert np.all(ds_short['PGz'].values[-1, -3:] == 0)
+    xr.testing.assert_identical(ds_short.isel(time=slice(0, -1)), ds.isel(time=slice(0, -1)))
+    xr.testing.assert_identical(ds_short.isel(time=-1, height=slice(0, -3)),
+                                ds.isel(time=-1, height=slice(0, -3)))
+
+    ds_multi = act.io.read_mfas_sodar([act.tests.EXAMPLE_MFAS_SODAR, filename], num_workers=2)
+    assert ds_multi['dir'].shape == (192, 58)
+    assert ds_multi.attrs['instrument_type'] == 'MFAS'
+    np.testing.assert_array_equal(ds_multi['W'].values[96:], ds_short['W'].values)
+
+
 def test_metadata_retrieval():
     # Read the file and lines.
     file = fsspec.open(act.tests.EXAMPLE_MFAS_SODAR).open()
@@ -925,3 +1824,35 @@ def test_read_surfrad():
     assert ds['temperature'].values[0] == 2.0
     assert 'standard_name' in ds['temperature'].attrs
     assert ds['temperature'].attrs['standard_name'] == 'air_temperature'
+
+
+def test_read_sp2_mmap(tmp_path):
+    # Records of 2 columns and 3 channels, 0.5 s apart, with times since 1904
+    num_cols, num_channels, num_records = 2, 3, 10
+    seconds_1904 = (np.datetime64('2019-12-16T13:00:00') - np.datetime64('1904-01-01')).astype(int)
+    record_bytes = b''
+    for i in range(num_records):
+        utc = seconds_1904 + 0.5 * i
+        record_bytes += np.array([num_cols, num_channels], dtype='>u4').tobytes()
+        record_bytes += np.append(np.arange(num_cols * num_channels), i).astype('>i2').tobytes()
+        record_bytes += np.array([47000 + 0.5 * i, 1, i, utc // 10000, utc % 10000, 5, 6, 0],
+                                 dtype='>f4').tobytes()
+        record_bytes += np.array([7, 0], dtype='>f8').tobytes()
+    file_name = tmp_path / 'mosaossp2M1.00.20191216.130601.raw.20191216x193.sp2b'
+    file_name.write_bytes(record_bytes)
+
+    ds = act.io.pysp2.read_sp2_mmap(str(file_name))
+    assert ds['Data_ch0'].chunks is not None
+    assert ds['Data_ch0'].shape == (num_records, num_cols)
+    np.testing.assert_array_equal(ds['Data_ch1'].values[0], [1, 4])
+    np.testing.assert_array_equal(ds['Flag'].values, np.arange(num_records))
+    assert ds['time'].values[0] == np.datetime64('2019-12-16T13:00:00')
+
+    ds = act.io.pysp2.read_sp2_mmap(str(file_name), start_record=2, end_record=8,
+                                     start_time='2019-12-16T13:00:01.5', end_time='2019-12-16T13:00:10')
+    np.testing.assert_array_equal(ds['Flag'].values, [3, 4, 5, 6, 7])
+    assert ds['EventIndex'].values[0] == 3
+
+    if act.io.pysp2.PYSP2_AVAILABLE:
+        xr.testing.assert_identical(
+            act.io.pysp2.read_sp2_mmap(str(file_name)).load(), act.io.read_sp2(str(file_name)))
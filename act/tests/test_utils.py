@@ -652,6 +652,50 @@ def test_date_parser_minute_second():
     assert output_format == '2020-01-01T12:00:00.000Z'
 
 
+def test_decode_time_values():
+    factor, reference = act.utils.parse_time_units('seconds since 2019-01-01 00:00:00 0:00')
+    assert factor == 10**9
+    assert reference == np.datetime64('2019-01-01T00:00:00')
+
+    units = {
+        'seconds since 1970-1-1 0:00:00 0:00': np.datetime64('1970-01-01T00:00:00'),
+        'minutes since 2019-05-08 04:00:00': np.datetime64('2019-05-08T04:00:00'),
+        'days since 2016-01-31': np.datetime64('2016-01-31T00:00:00'),
+        'hours since 2019-01-01T00:00:00Z': np.datetime64('2019-01-01T00:00:00'),
+        'hours since 2019-01-01 00:00:00 -06:00': np.datetime64('2019-01-01T06:00:00'),
+        'seconds since 2019-01-01 00:00:00.5 UTC': np.datetime64('2019-01-01T00:00:00.5'),
+    }
+    for unit, expected in units.items():
+        assert act.utils.parse_time_units(unit)[1] == expected
+
+    pytest.raises(ValueError, act.utils.parse_time_units, 'seconds')
+    pytest.raises(ValueError, act.utils.parse_time_units, 'fortnights since 2019-01-01')
+
+    time = act.utils.decode_time_values(
+        np.array([0, 60.5, np.nan, 1546300800]), 'seconds since 1970-1-1 0:00:00 0:00')
+    assert time.dtype == np.dtype('datetime64[ns]')
+    assert time[1] == np.datetime64('1970-01-01T00:01:00.5')
+    assert np.isnat(time[2])
+    assert time[3] == np.datetime64('2019-01-01T00:00:00')
+
+    time = act.utils.decode_time_values(np.array([0, 90], dtype=np.int32), 'minutes since 2019-01-01')
+    assert time[1] == np.datetime64('2019-01-01T01:30:00')
+
+    values = act.utils.encode_time_values(time, 'minutes since 2019-01-01', dtype=np.int32)
+    np.testing.assert_array_equal(values, [0, 90])
+    assert values.dtype == np.int32
+    values = act.utils.encode_time_values(
+        np.array(['1970-01-01T00:01:00.5', 'NaT'], dtype='datetime64[ns]'), 'seconds since 1970-1-1 0:00:00 0:00')
+    np.testing.assert_array_equal(values, [60.5, np.nan])
+
+    ds = act.io.armfiles.read_netcdf(act.tests.EXAMPLE_EBBR1)
+    assert ds['time'].encoding['units'] == 'seconds since 2019-11-25 00:00:00 0:00'
+    assert 'units' not in ds['time'].attrs
+    assert ds['time_bounds'].dtype == np.dtype('datetime64[ns]')
+    assert ds['time_bounds'].values[0, 0] == np.datetime64('2019-11-24T23:30:00')
+    assert ds['base_time'].values == np.datetime64('2019-11-25T00:00:00')
+
+
 def test_adjust_timestamp():
     file = act.tests.sample_files.EXAMPLE_EBBR1
     ds = act.io.armfiles.read_netcdf(file)
@@ -29,7 +29,10 @@ __getattr__, __dir__, __all__ = lazy.attach(
             'numpy_to_arm_date',
             'reduce_time_ranges',
             'date_parser',
-            'adjust_timestamp'
+            'adjust_timestamp',
+            'decode_time_values',
+            'encode_time_values',
+            'parse_time_units',
         ],
         'geo_utils': [
             'add_solar_variable',
@@ -4,6 +4,8 @@ Module that containing utilities involving datetimes.
 """
 
 import datetime as dt
+import functools
+import re
 import warnings
 
 import numpy as np
@@ -274,3 +276,180 @@ def adjust_timestamp(ds, time_bounds='time_bounds', align='left', offset=None):
     ds = ds.assign_coords({'time': time_start})
 
     return ds
+
+
+# Number of nanoseconds in each time unit allowed in a CF units string
+_TIME_UNIT_NANOSECONDS = {
+    'nanoseconds': 1, 'nanosecond': 1, 'ns': 1,
+    'microseconds': 10**3, 'microsecond': 10**3, 'us': 10**3,
+    'milliseconds': 10**6, 'millisecond': 10**6, 'msec': 10**6, 'msecs': 10**6, 'ms': 10**6,
+    'seconds': 10**9, 'second': 10**9, 'secs': 10**9, 'sec': 10**9, 's': 10**9,
+    'minutes': 60 * 10**9, 'minute': 60 * 10**9, 'mins': 60 * 10**9, 'min': 60 * 10**9,
+    'hours': 3600 * 10**9, 'hour': 3600 * 10**9, 'hrs': 3600 * 10**9, 'hr': 3600 * 10**9,
+    'h': 3600 * 10**9,
+    'days': 86400 * 10**9, 'day': 86400 * 10**9, 'd': 86400 * 10**9,
+}
+
+_TIME_UNITS_REGEX = re.compile(
+    r'^\s*(?P<unit>[a-zA-Z]+)\s+since\s+'
+    r'(?P<year>\d{1,4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})'
+    r'(?:[ T]+(?P<hour>\d{1,2}):(?P<minute>\d{1,2})(?::(?P<second>\d{1,2})(?:\.(?P<fraction>\d+))?)?)?'
+    r'\s*(?:(?P<utc>Z|UTC|GMT)|(?P<tz_sign>[+-])?(?P<tz_hour>\d{1,2})(?::?(?P<tz_minute>\d{2}))?)?\s*$'
+)
+
+
+@functools.lru_cache(maxsize=256)
+def parse_time_units(units):
+    """
+    Parses a CF time units string into the number of nanoseconds in each time
+    unit and the reference time. Supports the ARM forms with a timezone offset
+    not preceded by a sign, i.e. 'seconds since 2019-01-01 00:00:00 0:00',
+    which are not correctly parsed by Pandas.
+
+    Parameters
+    ----------
+    units : str
+        Time units string in the form '<unit> since <reference time> [timezone offset]'.
+
+    Returns
+    -------
+    factor : int
+        Number of nanoseconds in one unit.
+    reference : numpy.datetime64
+        Reference time in UTC with nanosecond precision.
+
+    Raises
+    ------
+    ValueError
+        If the units string is not recognized.
+
+    """
+    match = _TIME_UNITS_REGEX.match(units)
+    if match is None or match.group('unit').lower() not in _TIME_UNIT_NANOSECONDS:
+        raise ValueError(f'Unable to parse time units string: {units}')
+
+    factor = _TIME_UNIT_NANOSECONDS[match.group('unit').lower()]
+    parts = match.groupdict()
+    reference = np.datetime64(
+        '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'.format(
+            int(parts['year']), int(parts['month']), int(parts['day']),
+            int(parts['hour'] or 0), int(parts['minute'] or 0), int(parts['second'] or 0)),
+        'ns')
+
+    if parts['fraction'] is not None:
+        reference += np.timedelta64(int(parts['fraction'][:9].ljust(9, '0')), 'ns')
+
+    # Convert timezone offset to UTC
+    if parts['tz_hour'] is not None:
+        offset = np.timedelta64(int(parts['tz_hour']) * 60 + int(parts['tz_minute'] or 0), 'm')
+        if parts['tz_sign'] == '-':
+            offset = -offset
+        reference -= offset
+
+    return factor, reference
+
+
+def decode_time_values(values, units):
+    """
+    Converts numeric time values with a CF time units string to numpy datetime64[ns]
+    values using integer arithmetic. No Python datetime or cftime objects are created.
+    Works with numpy or Dask arrays. Missing values set to NaN are returned as NaT.
+
+    Parameters
+    ----------
+    values : numpy.ndarray or dask.array.Array
+        Numeric time values.
+    units : str
+        Time units string, i.e. 'seconds since 2019-01-01 00:00:00 0:00'.
+
+    Returns
+    -------
+    time : numpy.ndarray or dask.array.Array
+        Time values as datetime64[ns].
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import numpy as np
+        from act.utils.datetime_utils import decode_time_values
+
+        time = decode_time_values(np.array([0, 60.5]), 'seconds since 2019-01-01 00:00:00 0:00')
+
+    """
+    factor, reference = parse_time_units(units)
+
+    return _decode_time_ns(values, factor, reference)
+
+
+def _decode_time_ns(values, factor, reference):
+    """
+    Converts numeric time values to datetime64[ns] values with the number of
+    nanoseconds in each time unit and the reference time. factor and reference
+    can be arrays broadcast with values to decode values with different units.
+
+    """
+    if np.issubdtype(values.dtype, np.integer):
+        time_ns = values.astype(np.int64) * factor
+        return time_ns.astype('timedelta64[ns]') + reference
+
+    # Split float values into whole and fractional units so the large whole part
+    # is converted exactly with integer arithmetic.
+    values = values.astype(np.float64)
+    missing = np.isnan(values)
+    values = np.where(missing, 0.0, values)
+    whole = np.floor(values)
+    time_ns = whole.astype(np.int64) * factor + np.round((values - whole) * factor).astype(np.int64)
+    time = time_ns.astype('timedelta64[ns]') + reference
+
+    return np.where(missing, np.datetime64('NaT', 'ns'), time)
+
+
+def encode_time_values(time, units, dtype=np.float64):
+    """
+    Converts numpy datetime64 values to numeric time values with a CF time units
+    string using integer arithmetic. The inverse of decode_time_values().
+
+    Parameters
+    ----------
+    time : numpy.ndarray
+        Time values as datetime64.
+    units : str
+        Time units string, i.e. 'seconds since 2019-01-01 00:00:00 0:00'.
+    dtype : numpy.dtype
+        Data type of returned values. Values are rounded when an integer data type
+        is requested. NaT values are returned as NaN for floating point data types.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Numeric time values.
+
+    Examples
+    --------
+    .. code-block :: python
+
+        import numpy as np
+        from act.utils.datetime_utils import encode_time_values
+
+        values = encode_time_values(
+            np.array(['2019-01-01T00:01:00'], dtype='datetime64[ns]'),
+            'seconds since 2019-01-01 00:00:00 0:00')
+
+    """
+    factor, reference = parse_time_units(units)
+
+    time = np.asarray(time).astype('datetime64[ns]')
+    missing = np.isnat(time)
+    time_ns = (time - reference).astype(np.int64)
+    whole, remainder = np.divmod(time_ns, factor)
+
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        values = whole + (2 * remainder >= factor)
+        return values.astype(dtype)
+
+    values = whole.astype(np.float64) + remainder / factor
+    values = np.where(missing, np.nan, values)
+
+    return values.astype(dtype)